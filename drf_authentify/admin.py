@@ -1,3 +1,4 @@
+from django.db import transaction
 from django.db.models import Q
 from django.contrib import admin
 from django.utils import timezone
@@ -5,9 +6,16 @@ from django.contrib.auth import get_user_model
 from django.utils.translation import gettext_lazy as _
 from django.contrib.admin.sites import AlreadyRegistered
 
-from drf_authentify.models import get_token_model
+from drf_authentify.models import get_token_model, get_archive_model
+from drf_authentify.cache import token_cache, negative_cache
+from drf_authentify.replica import read_replica
 from drf_authentify.forms import AuthTokenAdminForm
-from drf_authentify.utils.tokens import generate_access_token, generate_refresh_token
+from drf_authentify.settings import authentify_settings
+from drf_authentify.utils.tokens import (
+    generate_access_token,
+    generate_refresh_token,
+    generate_selector_access_token,
+)
 
 
 class ExpirationStatusFilter(admin.SimpleListFilter):
@@ -28,12 +36,38 @@ class ExpirationStatusFilter(admin.SimpleListFilter):
         return queryset
 
 
-class AuthTokenAdmin(admin.ModelAdmin):
+class ReadReplicaAdminMixin:
+    """
+    Serve changelist pages from READ_DATABASE_ALIAS. Change and delete views,
+    bulk actions and list_editable saves (changelist POSTs) keep using the
+    primary, so edits are never made against replicated rows.
+    """
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        alias = authentify_settings.READ_DATABASE_ALIAS
+        match = request.resolver_match
+        if (
+            alias
+            and match
+            and match.url_name.endswith("_changelist")
+            and request.method in ("GET", "HEAD")
+        ):
+            queryset = queryset.using(alias)
+        return queryset
+
+
+class AuthTokenAdmin(ReadReplicaAdminMixin, admin.ModelAdmin):
     form = AuthTokenAdminForm
     raw_id_fields = ("user",)
     list_filter = (ExpirationStatusFilter, "created_at")
     search_fields = (f"user__{get_user_model().USERNAME_FIELD}",)
-    readonly_fields = ("access_token_hash", "refresh_token_hash", "last_refreshed_at")
+    readonly_fields = (
+        "access_token_hash",
+        "access_token_selector",
+        "refresh_token_hash",
+        "last_refreshed_at",
+    )
     list_display = [
         "user",
         "auth_type",
@@ -51,7 +85,11 @@ class AuthTokenAdmin(admin.ModelAdmin):
 
     def save_model(self, request, obj, form, change):
         if not change:
-            raw_token, hashed_token = generate_access_token()
+            if authentify_settings.TOKEN_FORMAT == "selector":
+                raw_token, selector, hashed_token = generate_selector_access_token()
+                obj.access_token_selector = selector
+            else:
+                raw_token, hashed_token = generate_access_token()
             obj.access_token_hash = hashed_token
 
             raw_refresh = None
@@ -63,7 +101,44 @@ class AuthTokenAdmin(admin.ModelAdmin):
             if raw_refresh:
                 self.message_user(request, f"🔄 Refresh Token:\n{raw_refresh}")
 
-        return super().save_model(request, obj, form, change)
+        super().save_model(request, obj, form, change)
+        if not change:
+            negative_cache.record_issued([obj.access_token_hash])
+            read_replica.record_issued([obj.access_token_hash])
+
+    def delete_model(self, request, obj):
+        # The model denies signed tokens; cached copies must go as well.
+        super().delete_model(request, obj)
+        self._invalidate([obj.access_token_hash], obj._state.db)
+
+    def delete_queryset(self, request, queryset):
+        hashes = list(queryset.values_list("access_token_hash", flat=True))
+        super().delete_queryset(request, queryset)
+        self._invalidate(hashes, queryset.db)
+
+    def _invalidate(self, hashes, using):
+        if token_cache.enabled:
+            transaction.on_commit(lambda: token_cache.invalidate(hashes), using=using)
+
+
+class ArchivedAuthTokenAdmin(ReadReplicaAdminMixin, admin.ModelAdmin):
+    raw_id_fields = ("user",)
+    list_filter = ("auth_type", "archived_at")
+    search_fields = (f"user__{get_user_model().USERNAME_FIELD}",)
+    list_display = [
+        "user",
+        "auth_type",
+        "created_at",
+        "expires_at",
+        "revoked_at",
+        "archived_at",
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 def register_token_admin():
@@ -74,5 +149,11 @@ def register_token_admin():
     except AlreadyRegistered:
         pass
 
+    if authentify_settings.ARCHIVE_EXPIRED_TOKENS:
+        try:
+            admin.site.register(get_archive_model(), ArchivedAuthTokenAdmin)
+        except AlreadyRegistered:
+            pass
+
 
 register_token_admin()
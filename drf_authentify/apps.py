@@ -2,5 +2,23 @@ from django.apps import AppConfig
 
 
 class DrfAuthentifyConfig(AppConfig):
-    default_auto_field = 'django.db.models.BigAutoField'
-    name = 'drf_authentify'
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "drf_authentify"
+
+    def ready(self):
+        from django.core.signals import request_started
+
+        from drf_authentify.janitor import JANITOR_LOCK_KEY, start_janitor
+        from drf_authentify.settings import (
+            authentify_settings,
+            validate_token_storage,
+            compile_authentify_handlers,
+        )
+
+        # Handlers and storage engines may import models, so they are resolved
+        # once apps are ready.
+        compile_authentify_handlers()
+        validate_token_storage()
+
+        if authentify_settings.JANITOR_ENABLED:
+            request_started.connect(start_janitor, dispatch_uid=JANITOR_LOCK_KEY)
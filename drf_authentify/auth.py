@@ -1,3 +1,5 @@
+import random
+
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.authentication import BaseAuthentication
 
@@ -5,9 +7,11 @@ from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from drf_authentify.choices import AUTH_TYPES
+from drf_authentify.cache import token_cache
 from drf_authentify.services import TokenService
-from drf_authentify.utils.imports import load_handler
-from drf_authentify.settings import authentify_settings
+from drf_authentify.utils.imports import acall_handler
+from drf_authentify.settings import authentify_settings, get_handler
+from drf_authentify.writebehind import AUTO_REFRESH_FIELDS, auto_refresh_buffer
 
 
 class BaseTokenAuth(BaseAuthentication):
@@ -20,48 +24,160 @@ class BaseTokenAuth(BaseAuthentication):
             return None
 
         # Verify token
-        auth_type = (
-            self.auth_type if authentify_settings.ENABLE_AUTH_RESTRICTION else None
-        )
-        token = TokenService.verify_token(token_str, auth_type)
+        token = TokenService.verify_token(token_str, self._get_auth_type())
         if not token:
             return None
 
-        if not token.user.is_active:
-            raise AuthenticationFailed(_("User account is inactive or deleted."))
-
+        self._check_user(token.user)
         user, token = self._handle_auto_refresh(token.user, token, token_str)
         user, token = self._run_post_auth_handler(user, token, token_str)
         return (user, token)
 
-    def _handle_auto_refresh(self, user, token, token_str):
+    async def aauthenticate(self, request):
+        """
+        Async counterpart of authenticate. Handlers may be sync or async; sync
+        handlers run in a thread so they can use the ORM.
+        """
+        token_str = self._get_token_from_request(request)
+        if not token_str:
+            return None
+
+        # Verify token
+        token = await TokenService.averify_token(token_str, self._get_auth_type())
+        if not token:
+            return None
+
+        self._check_user(token.user)
+        user, token = await self._ahandle_auto_refresh(token.user, token, token_str)
+        user, token = await self._arun_post_auth_handler(user, token, token_str)
+        return (user, token)
+
+    def _get_auth_type(self):
+        return self.auth_type if authentify_settings.ENABLE_AUTH_RESTRICTION else None
+
+    def _check_user(self, user):
+        if not user.is_active:
+            raise AuthenticationFailed(_("User account is inactive or deleted."))
+
+    def _apply_auto_refresh(self, token) -> bool:
+        """
+        Slide the token's expiry forward in memory if it is due for a refresh.
+        Returns True when the token was changed and needs saving.
+        """
         if not authentify_settings.AUTO_REFRESH:
-            return user, token
+            return False
+
+        if auto_refresh_buffer.enabled:
+            auto_refresh_buffer.apply(token)
 
         now = timezone.now()
         elapsed = now - token.last_refreshed_at
-        if elapsed < authentify_settings.AUTO_REFRESH_INTERVAL:
-            return user, token
+        interval = authentify_settings.AUTO_REFRESH_INTERVAL
+        if elapsed < interval and not self._refresh_early(elapsed, interval):
+            return False
 
         new_expiry = now + authentify_settings.TOKEN_TTL
         max_expiry = token.created_at + authentify_settings.AUTO_REFRESH_MAX_TTL
         if new_expiry > max_expiry:
-            return user, token
+            return False
 
         token.last_refreshed_at = now
         token.expires_at = new_expiry
         token.refresh_until = now + authentify_settings.REFRESH_TOKEN_TTL
-        token.save(update_fields=["expires_at", "refresh_until", "last_refreshed_at"])
+        return True
+
+    @staticmethod
+    def _refresh_early(elapsed, interval) -> bool:
+        """
+        Spread refreshes over the last AUTO_REFRESH_JITTER share of the interval:
+        inside that window a token is refreshed with a probability rising
+        linearly from 0 to 1, so tokens issued together stop refreshing in step.
+        """
+        window = interval * authentify_settings.AUTO_REFRESH_JITTER
+        start = interval - window
+        if not window or elapsed < start:
+            return False
+        return random.random() < (elapsed - start) / window
 
-        handler = load_handler(
-            authentify_settings.POST_AUTO_REFRESH_HANDLER,
-            "POST_AUTO_REFRESH_HANDLER",
-            ["user", "token", "token_str"],
+    def _auto_refresh_update(self, token):
+        """
+        Return (queryset, values) writing a refresh applied by _apply_auto_refresh
+        as one conditional UPDATE. The interval and AUTO_REFRESH_MAX_TTL checks are
+        repeated in the database, so of concurrent requests with the same token
+        only the first per interval matches, and revoked tokens never match.
+        """
+        manager = type(token)._default_manager.db_manager(token._state.db)
+        queryset = manager.filter(
+            pk=token.pk,
+            revoked_at__isnull=True,
+            last_refreshed_at__lte=(
+                token.last_refreshed_at
+                - authentify_settings.AUTO_REFRESH_INTERVAL
+                * (1 - authentify_settings.AUTO_REFRESH_JITTER)
+            ),
+            created_at__gte=token.expires_at - authentify_settings.AUTO_REFRESH_MAX_TTL,
+        )
+        values = {field: getattr(token, field) for field in AUTO_REFRESH_FIELDS}
+        return queryset, values
+
+    def _save_auto_refresh(self, token) -> bool:
+        """Write the refresh; returns False if another request already did."""
+        queryset, values = self._auto_refresh_update(token)
+        return queryset.update(**values) == 1
+
+    async def _asave_auto_refresh(self, token) -> bool:
+        queryset, values = self._auto_refresh_update(token)
+        return await queryset.aupdate(**values) == 1
+
+    @staticmethod
+    def _restore_auto_refresh(token, stored: dict) -> None:
+        """Undo an auto-refresh that another request has already written."""
+        for field, value in stored.items():
+            setattr(token, field, value)
+
+    def _handle_auto_refresh(self, user, token, token_str):
+        stored = {field: getattr(token, field) for field in AUTO_REFRESH_FIELDS}
+        if not self._apply_auto_refresh(token):
+            return user, token
+
+        if not auto_refresh_buffer.defer(token, stored["expires_at"]):
+            if not self._save_auto_refresh(token):
+                # Another request refreshed the row first: return the token as
+                # stored and drop its stale cached snapshot, or every later
+                # request would retry the UPDATE. Only this entry is evicted:
+                # bumping the version would flush every worker's local cache.
+                self._restore_auto_refresh(token, stored)
+                token_cache.evict(token.access_token_hash)
+                return user, token
+        token_cache.set(token)
+
+        handler = get_handler(
+            "POST_AUTO_REFRESH_HANDLER", authentify_settings.POST_AUTO_REFRESH_HANDLER
         )
         if handler:
             return handler(user, token, token_str)
         return user, token
 
+    async def _ahandle_auto_refresh(self, user, token, token_str):
+        stored = {field: getattr(token, field) for field in AUTO_REFRESH_FIELDS}
+        if not self._apply_auto_refresh(token):
+            return user, token
+
+        if not auto_refresh_buffer.defer(token, stored["expires_at"]):
+            if not await self._asave_auto_refresh(token):
+                # See _handle_auto_refresh.
+                self._restore_auto_refresh(token, stored)
+                await token_cache.aevict(token.access_token_hash)
+                return user, token
+        await token_cache.aset(token)
+
+        handler = get_handler(
+            "POST_AUTO_REFRESH_HANDLER", authentify_settings.POST_AUTO_REFRESH_HANDLER
+        )
+        if handler:
+            return await acall_handler(handler, user, token, token_str)
+        return user, token
+
     def _get_token_from_request(self, request):
         raise NotImplementedError("Subclasses must implement _get_token_from_request")
 
@@ -78,15 +194,33 @@ class BaseTokenAuth(BaseAuthentication):
         return None
 
     def _run_post_auth_handler(self, user, token, token_str):
-        handler = load_handler(
-            authentify_settings.POST_AUTH_HANDLER,
-            "POST_AUTH_HANDLER",
-            ["user", "token", "token_str"],
+        handler = get_handler(
+            "POST_AUTH_HANDLER", authentify_settings.POST_AUTH_HANDLER
         )
         if handler:
             return handler(user=user, token=token, token_str=token_str)
         return user, token
 
+    async def _arun_post_auth_handler(self, user, token, token_str):
+        handler = get_handler(
+            "POST_AUTH_HANDLER", authentify_settings.POST_AUTH_HANDLER
+        )
+        if handler:
+            return await acall_handler(
+                handler, user=user, token=token, token_str=token_str
+            )
+        return user, token
+
+
+class AsyncTokenAuthMixin:
+    """
+    Makes ``authenticate`` a coroutine, for async-native DRF stacks (such as
+    adrf) that await coroutine authenticators.
+    """
+
+    async def authenticate(self, request):
+        return await self.aauthenticate(request)
+
 
 class AuthorizationHeaderAuthentication(BaseTokenAuth):
     source = "Authorization header"
@@ -120,3 +254,13 @@ class CookieAuthentication(BaseTokenAuth):
             if token:
                 return token
         return None
+
+
+class AsyncAuthorizationHeaderAuthentication(
+    AsyncTokenAuthMixin, AuthorizationHeaderAuthentication
+):
+    pass
+
+
+class AsyncCookieAuthentication(AsyncTokenAuthMixin, CookieAuthentication):
+    pass
@@ -3,17 +3,28 @@ from django.conf import settings
 from django.utils import timezone
 
 from drf_authentify.choices import AUTH_TYPES
+from drf_authentify.fields import HashDigestField
 from drf_authentify.contexts import ContextParams
 from drf_authentify.managers import AuthTokenManager
+from drf_authentify.denylist import signed_token_denylist
 from drf_authentify.validators import validate_context
+from drf_authentify.utils.tokens import get_hash_scheme
 
 
 # Type alias for token model
 class AbstractAuthToken(models.Model):
     access_token_hash = models.CharField(max_length=255, unique=True, db_index=True)
+    access_token_selector = models.CharField(
+        null=True, blank=True, unique=True, editable=False, max_length=12
+    )
     refresh_token_hash = models.CharField(
         null=True, blank=True, unique=True, db_index=True, max_length=255
     )
+    # Scheme of access_token_hash; refresh hashes are matched against all
+    # accepted schemes and replaced on rotation.
+    hash_scheme = models.CharField(
+        max_length=32, default=get_hash_scheme, editable=False
+    )
     auth_type = models.CharField(max_length=12, choices=AUTH_TYPES.choices)
     context = models.JSONField(default=dict, blank=True, validators=[validate_context])
     last_refreshed_at = models.DateTimeField(default=timezone.now)
@@ -23,7 +34,8 @@ class AbstractAuthToken(models.Model):
     revoked_at = models.DateTimeField(null=True, blank=True)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
-        db_index=True,
+        # Served by the (user, expires_at) index below.
+        db_index=False,
         on_delete=models.CASCADE,
         related_name="+",
     )
@@ -35,6 +47,17 @@ class AbstractAuthToken(models.Model):
         ordering = ["-created_at"]
         verbose_name = "Authentication Token"
         verbose_name_plural = "Authentication Tokens"
+        indexes = [
+            # Per-user revocation and cleanup.
+            models.Index(fields=["user", "expires_at"], name="%(class)s_user_exp"),
+            # Expired-token cleanup; tokens that never expire are left out
+            # where partial indexes are supported.
+            models.Index(
+                fields=["expires_at"],
+                condition=models.Q(expires_at__isnull=False),
+                name="%(class)s_exp",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.user} ({self.auth_type})"
@@ -46,3 +69,62 @@ class AbstractAuthToken(models.Model):
     @property
     def context_obj(self) -> ContextParams:
         return ContextParams(self.context)
+
+    def delete(self, *args, **kwargs):
+        # Signed tokens verify without their row, so deny them first.
+        if signed_token_denylist.enabled and not self.is_expired:
+            signed_token_denylist.deny([(self.access_token_selector, self.expires_at)])
+        return super().delete(*args, **kwargs)
+
+
+class AbstractBinaryAuthToken(AbstractAuthToken):
+    """
+    Token model storing hashes as raw digest bytes instead of hex strings, which
+    halves the size of both unique hash indexes.
+    """
+
+    access_token_hash = HashDigestField(unique=True)
+    refresh_token_hash = HashDigestField(null=True, blank=True, unique=True)
+
+    class Meta(AbstractAuthToken.Meta):
+        abstract = True
+
+
+class AbstractArchivedAuthToken(models.Model):
+    """
+    History of expired and revoked tokens, moved out of the token table by
+    ARCHIVE_EXPIRED_TOKENS. Fields other than ``token_id`` and ``archived_at``
+    are copied from the token field of the same name, so an archive model for a
+    custom token model must use matching field types.
+    """
+
+    token_id = models.BigIntegerField(db_index=True)
+    access_token_hash = models.CharField(max_length=255)
+    hash_scheme = models.CharField(max_length=32)
+    auth_type = models.CharField(max_length=12, choices=AUTH_TYPES.choices)
+    context = models.JSONField(default=dict, blank=True)
+    last_refreshed_at = models.DateTimeField()
+    refresh_until = models.DateTimeField(null=True, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    revoked_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField()
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        # Served by the (user, created_at) index below.
+        db_index=False,
+        on_delete=models.CASCADE,
+        related_name="+",
+    )
+
+    class Meta:
+        abstract = True
+        ordering = ["-created_at"]
+        verbose_name = "Archived Authentication Token"
+        verbose_name_plural = "Archived Authentication Tokens"
+        indexes = [
+            models.Index(fields=["user", "created_at"], name="%(class)s_user_cr"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} ({self.auth_type})"
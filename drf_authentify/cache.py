@@ -0,0 +1,623 @@
+import time
+import pickle
+import hashlib
+import logging
+import threading
+from collections import Counter, OrderedDict
+
+from django.db import connections, transaction
+from django.core.cache import caches
+from django.utils import timezone
+
+from drf_authentify.compat import Optional, TYPE_CHECKING
+from drf_authentify.utils.bloom import BloomFilter
+from drf_authentify.sharding import token_shards
+from drf_authentify.settings import authentify_settings
+
+if TYPE_CHECKING:
+    from drf_authentify.models import TokenType
+
+
+TOKEN_KEY_PREFIX = "drf_authentify:token:"
+VERSION_KEY = "drf_authentify:version"
+MISS_KEY_PREFIX = "drf_authentify:miss:"
+BLOOM_SEQ_KEY = "drf_authentify:bloom:seq"
+BLOOM_LOG_PREFIX = "drf_authentify:bloom:log:"
+GRACE_KEY_PREFIX = "drf_authentify:grace:"
+
+NEGATIVE_CACHE_STATS = ("lookups", "bloom_rejections", "miss_cache_hits", "db_misses")
+
+# Beyond this many unseen issuances, rebuilding is cheaper than replaying the log.
+BLOOM_LOG_REPLAY_LIMIT = 1000
+
+logger = logging.getLogger(__name__)
+
+
+class LocalTokenCache:
+    """
+    Bounded, thread-safe LRU of verified tokens held in process memory.
+
+    Entries are stored pickled so every hit hands out a private copy, and each
+    entry expires after LOCAL_CACHE_TTL. Other workers signal revocations by
+    bumping a version stamp in the shared cache; the stamp is polled at most once
+    per LOCAL_CACHE_SYNC_INTERVAL and any change flushes this process's entries.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self._synced_at = 0.0
+
+    @property
+    def sync_due(self) -> bool:
+        interval = authentify_settings.LOCAL_CACHE_SYNC_INTERVAL.total_seconds()
+        return time.monotonic() - self._synced_at >= interval
+
+    def _apply_version(self, version) -> None:
+        with self._lock:
+            self._synced_at = time.monotonic()
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+
+    def get(self, hashed_token: str, backend) -> Optional["TokenType"]:
+        if self.sync_due:
+            self._apply_version(backend.get(VERSION_KEY))
+        return self._lookup(hashed_token)
+
+    async def aget(self, hashed_token: str, backend) -> Optional["TokenType"]:
+        if self.sync_due:
+            self._apply_version(await backend.aget(VERSION_KEY))
+        return self._lookup(hashed_token)
+
+    def _lookup(self, hashed_token: str) -> Optional["TokenType"]:
+        with self._lock:
+            entry = self._entries.get(hashed_token)
+            if entry is None:
+                return None
+
+            payload, expires = entry
+            if time.monotonic() >= expires:
+                del self._entries[hashed_token]
+                return None
+            self._entries.move_to_end(hashed_token)
+
+        return pickle.loads(payload)
+
+    def set(self, token: "TokenType", timeout: float) -> None:
+        ttl = min(timeout, authentify_settings.LOCAL_CACHE_TTL.total_seconds())
+        payload = pickle.dumps(token, pickle.HIGHEST_PROTOCOL)
+        expires = time.monotonic() + ttl
+
+        with self._lock:
+            self._entries[token.access_token_hash] = (payload, expires)
+            self._entries.move_to_end(token.access_token_hash)
+            while len(self._entries) > authentify_settings.LOCAL_CACHE_MAX_SIZE:
+                self._entries.popitem(last=False)
+
+    def delete_many(self, hashed_tokens) -> None:
+        with self._lock:
+            for hashed in hashed_tokens:
+                self._entries.pop(hashed, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+            self._synced_at = 0.0
+
+
+class TokenCache:
+    """
+    Opt-in cache of verified tokens, keyed by access token hash.
+
+    Entries are snapshots of the token row with its user already attached, so a
+    hit skips the verification query entirely. Lookups try the in-process LRU
+    first, then the shared Django cache. Entry lifetimes never exceed the token's
+    own expiry.
+    """
+
+    def __init__(self):
+        self.local = LocalTokenCache()
+
+    @property
+    def enabled(self) -> bool:
+        return self.shared_enabled or self.local_enabled
+
+    @property
+    def shared_enabled(self) -> bool:
+        return authentify_settings.VERIFY_CACHE_ENABLED
+
+    @property
+    def local_enabled(self) -> bool:
+        return authentify_settings.LOCAL_CACHE_ENABLED
+
+    @property
+    def backend(self):
+        return caches[authentify_settings.CACHE_ALIAS]
+
+    @staticmethod
+    def make_key(hashed_token: str) -> str:
+        return f"{TOKEN_KEY_PREFIX}{hashed_token}"
+
+    def get(self, hashed_token: str) -> Optional["TokenType"]:
+        """Return the cached token for a hash, or None on a miss or stale entry."""
+        token = None
+        if self.local_enabled:
+            token = self.local.get(hashed_token, self.backend)
+
+        if token is None and self.shared_enabled:
+            token = self.backend.get(self.make_key(hashed_token))
+            if token is not None and self.local_enabled:
+                self.local.set(token, self._timeout(token))
+
+        if token is None or token.is_expired:
+            return None
+        return token
+
+    async def aget(self, hashed_token: str) -> Optional["TokenType"]:
+        """Async counterpart of get."""
+        token = None
+        if self.local_enabled:
+            token = await self.local.aget(hashed_token, self.backend)
+
+        if token is None and self.shared_enabled:
+            token = await self.backend.aget(self.make_key(hashed_token))
+            if token is not None and self.local_enabled:
+                self.local.set(token, self._timeout(token))
+
+        if token is None or token.is_expired:
+            return None
+        return token
+
+    def set(self, token: "TokenType") -> None:
+        """Cache a verified token, capping the entry lifetime at its expiry."""
+        if not self.enabled:
+            return
+
+        timeout = self._timeout(token)
+        if timeout <= 0:
+            return
+
+        if self.local_enabled:
+            self.local.set(token, timeout)
+        if self.shared_enabled:
+            self.backend.set(self.make_key(token.access_token_hash), token, timeout)
+
+    async def aset(self, token: "TokenType") -> None:
+        """Async counterpart of set."""
+        if not self.enabled:
+            return
+
+        timeout = self._timeout(token)
+        if timeout <= 0:
+            return
+
+        if self.local_enabled:
+            self.local.set(token, timeout)
+        if self.shared_enabled:
+            await self.backend.aset(
+                self.make_key(token.access_token_hash), token, timeout
+            )
+
+    def invalidate(self, hashed_tokens) -> None:
+        """
+        Drop cached entries for the given access token hashes.
+
+        Also bumps the shared version stamp so other workers flush their local
+        caches on their next sync.
+        """
+        if not self.enabled:
+            return
+
+        hashed_tokens = [hashed for hashed in hashed_tokens if hashed]
+        if self.local_enabled:
+            self.local.delete_many(hashed_tokens)
+            self.bump_version()
+        if self.shared_enabled and hashed_tokens:
+            self.backend.delete_many([self.make_key(h) for h in hashed_tokens])
+
+    async def ainvalidate(self, hashed_tokens) -> None:
+        """Async counterpart of invalidate."""
+        if not self.enabled:
+            return
+
+        hashed_tokens = [hashed for hashed in hashed_tokens if hashed]
+        if self.local_enabled:
+            self.local.delete_many(hashed_tokens)
+            await self.abump_version()
+        if self.shared_enabled and hashed_tokens:
+            await self.backend.adelete_many([self.make_key(h) for h in hashed_tokens])
+
+    def evict(self, hashed_token: str) -> None:
+        """
+        Drop one entry from the local and shared caches without bumping the
+        version stamp, for an entry that is stale but whose token is still
+        valid, such as one another request has just refreshed.
+        """
+        if self.local_enabled:
+            self.local.delete_many([hashed_token])
+        if self.shared_enabled:
+            self.backend.delete(self.make_key(hashed_token))
+
+    async def aevict(self, hashed_token: str) -> None:
+        """Async counterpart of evict."""
+        if self.local_enabled:
+            self.local.delete_many([hashed_token])
+        if self.shared_enabled:
+            await self.backend.adelete(self.make_key(hashed_token))
+
+    def bump_version(self) -> None:
+        backend = self.backend
+        backend.add(VERSION_KEY, 0, None)
+        try:
+            backend.incr(VERSION_KEY)
+        except ValueError:
+            # The key was evicted between add() and incr().
+            backend.set(VERSION_KEY, 1, None)
+
+    async def abump_version(self) -> None:
+        backend = self.backend
+        await backend.aadd(VERSION_KEY, 0, None)
+        try:
+            await backend.aincr(VERSION_KEY)
+        except ValueError:
+            await backend.aset(VERSION_KEY, 1, None)
+
+    @staticmethod
+    def _timeout(token: "TokenType") -> float:
+        timeout = authentify_settings.VERIFY_CACHE_TTL.total_seconds()
+        if token.expires_at is not None:
+            remaining = (token.expires_at - timezone.now()).total_seconds()
+            timeout = min(timeout, remaining)
+        return timeout
+
+
+class NegativeTokenCache:
+    """
+    Rejects unknown access token hashes without touching the database.
+
+    Two independent, opt-in layers:
+    - a short-lived miss cache of hashes the database recently failed to find;
+    - a per-process Bloom filter of live hashes, rebuilt in a background thread
+      every BLOOM_FILTER_REFRESH_INTERVAL.
+
+    Issued hashes are appended to a shared log in the cache. Before trusting a
+    negative Bloom answer, a worker replays log entries it has not seen yet, so
+    tokens issued by other workers are never rejected.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._seq = 0
+        self._built_at = None
+        self._rebuilding = False
+        self._stats = Counter()
+
+    @property
+    def backend(self):
+        return caches[authentify_settings.CACHE_ALIAS]
+
+    def stats(self) -> dict:
+        """
+        Return counters for this process: lookups that reached the negative
+        layer, rejections by the Bloom filter and the miss cache, and lookups
+        that fell through to the database and found nothing.
+        """
+        with self._lock:
+            return {key: self._stats[key] for key in NEGATIVE_CACHE_STATS}
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def _incr(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def is_known_miss(self, hashed_token: str, legacy_hashes=()) -> bool:
+        """
+        Return True if the hash definitely does not belong to a live token.
+        ``legacy_hashes`` are the same token hashed with legacy schemes; the
+        Bloom filter only rejects when none of them may be stored either.
+        """
+        bloom_enabled = authentify_settings.BLOOM_FILTER_ENABLED
+        miss_enabled = authentify_settings.NEGATIVE_CACHE_ENABLED
+        if not (bloom_enabled or miss_enabled):
+            return False
+
+        self._incr("lookups")
+        if bloom_enabled and not any(
+            self._bloom_might_contain(hashed)
+            for hashed in (hashed_token, *legacy_hashes)
+        ):
+            self._incr("bloom_rejections")
+            return True
+
+        if miss_enabled and self.backend.get(f"{MISS_KEY_PREFIX}{hashed_token}"):
+            self._incr("miss_cache_hits")
+            return True
+        return False
+
+    async def ais_known_miss(self, hashed_token: str, legacy_hashes=()) -> bool:
+        """Async counterpart of is_known_miss."""
+        bloom_enabled = authentify_settings.BLOOM_FILTER_ENABLED
+        miss_enabled = authentify_settings.NEGATIVE_CACHE_ENABLED
+        if not (bloom_enabled or miss_enabled):
+            return False
+
+        self._incr("lookups")
+        if bloom_enabled:
+            for hashed in (hashed_token, *legacy_hashes):
+                if await self._abloom_might_contain(hashed):
+                    break
+            else:
+                self._incr("bloom_rejections")
+                return True
+
+        if miss_enabled and await self.backend.aget(f"{MISS_KEY_PREFIX}{hashed_token}"):
+            self._incr("miss_cache_hits")
+            return True
+        return False
+
+    def record_miss(self, hashed_token: str) -> None:
+        """Remember that the database holds no live token for this hash."""
+        timeout = self._record_miss()
+        if timeout is not None:
+            self.backend.set(f"{MISS_KEY_PREFIX}{hashed_token}", True, timeout)
+
+    async def arecord_miss(self, hashed_token: str) -> None:
+        """Async counterpart of record_miss."""
+        timeout = self._record_miss()
+        if timeout is not None:
+            await self.backend.aset(f"{MISS_KEY_PREFIX}{hashed_token}", True, timeout)
+
+    def _record_miss(self) -> Optional[float]:
+        """Count a database miss; returns the miss cache TTL, if it is enabled."""
+        if not (
+            authentify_settings.BLOOM_FILTER_ENABLED
+            or authentify_settings.NEGATIVE_CACHE_ENABLED
+        ):
+            return None
+
+        self._incr("db_misses")
+        if not authentify_settings.NEGATIVE_CACHE_ENABLED:
+            return None
+        return authentify_settings.NEGATIVE_CACHE_TTL.total_seconds()
+
+    def record_issued(self, hashed_tokens) -> None:
+        """
+        Add newly issued hashes to the local filter immediately, and to the
+        shared log once the surrounding transaction commits.
+        """
+        hashed_tokens = self._add_issued(hashed_tokens)
+        if hashed_tokens:
+            transaction.on_commit(lambda: self._append_log(hashed_tokens))
+
+    async def arecord_issued(self, hashed_tokens) -> None:
+        """
+        Async counterpart of record_issued, for rows that are already committed.
+        """
+        hashed_tokens = self._add_issued(hashed_tokens)
+        if hashed_tokens:
+            await self._aappend_log(hashed_tokens)
+
+    def _add_issued(self, hashed_tokens) -> list:
+        if not authentify_settings.BLOOM_FILTER_ENABLED:
+            return []
+
+        hashed_tokens = list(hashed_tokens)
+        with self._lock:
+            if self._bloom is not None:
+                for hashed in hashed_tokens:
+                    self._bloom.add(hashed)
+        return hashed_tokens
+
+    def _append_log(self, hashed_tokens) -> None:
+        if not hashed_tokens:
+            return
+
+        backend = self.backend
+        backend.add(BLOOM_SEQ_KEY, 0, None)
+        end = backend.incr(BLOOM_SEQ_KEY, len(hashed_tokens))
+        backend.set_many(*self._log_entries(hashed_tokens, end))
+
+    async def _aappend_log(self, hashed_tokens) -> None:
+        backend = self.backend
+        await backend.aadd(BLOOM_SEQ_KEY, 0, None)
+        end = await backend.aincr(BLOOM_SEQ_KEY, len(hashed_tokens))
+        await backend.aset_many(*self._log_entries(hashed_tokens, end))
+
+    @staticmethod
+    def _log_entries(hashed_tokens, end: int) -> tuple[dict, float]:
+        start = end - len(hashed_tokens) + 1
+        timeout = 2 * authentify_settings.BLOOM_FILTER_REFRESH_INTERVAL.total_seconds()
+        entries = {
+            f"{BLOOM_LOG_PREFIX}{seq}": hashed
+            for seq, hashed in zip(range(start, end + 1), hashed_tokens)
+        }
+        return entries, timeout
+
+    def _current_bloom(self) -> Optional[BloomFilter]:
+        """Return the current filter, scheduling a rebuild if it is stale."""
+        interval = authentify_settings.BLOOM_FILTER_REFRESH_INTERVAL.total_seconds()
+        with self._lock:
+            bloom = self._bloom
+            stale = (
+                self._built_at is None or time.monotonic() - self._built_at >= interval
+            )
+        if stale:
+            self.schedule_rebuild()
+        return bloom
+
+    def _bloom_might_contain(self, hashed_token: str) -> bool:
+        bloom = self._current_bloom()
+        if bloom is None or hashed_token in bloom:
+            return True
+
+        # Only a negative answer needs the log: replay issuances from other
+        # workers, and fail open if the log has gaps.
+        if not self._replay_log():
+            return True
+        return hashed_token in bloom
+
+    async def _abloom_might_contain(self, hashed_token: str) -> bool:
+        bloom = self._current_bloom()
+        if bloom is None or hashed_token in bloom:
+            return True
+        if not await self._areplay_log():
+            return True
+        return hashed_token in bloom
+
+    def _replay_log(self) -> bool:
+        backend = self.backend
+        pending = self._pending_log(backend.get(BLOOM_SEQ_KEY) or 0)
+        if pending is None:
+            return False
+        start, keys = pending
+        if not keys:
+            return True
+        return self._apply_log(start, keys, backend.get_many(keys))
+
+    async def _areplay_log(self) -> bool:
+        backend = self.backend
+        pending = self._pending_log(await backend.aget(BLOOM_SEQ_KEY) or 0)
+        if pending is None:
+            return False
+        start, keys = pending
+        if not keys:
+            return True
+        return self._apply_log(start, keys, await backend.aget_many(keys))
+
+    def _pending_log(self, seq: int) -> Optional[tuple[int, list]]:
+        """
+        Return the position of the local filter in the log and the keys of the
+        entries it has not seen, or None if rebuilding is cheaper.
+        """
+        with self._lock:
+            start = self._seq
+        if seq - start > BLOOM_LOG_REPLAY_LIMIT:
+            self.schedule_rebuild()
+            return None
+        return start, [f"{BLOOM_LOG_PREFIX}{n}" for n in range(start + 1, seq + 1)]
+
+    def _apply_log(self, start: int, keys: list, entries: dict) -> bool:
+        if len(entries) != len(keys):
+            self.schedule_rebuild()
+            return False
+
+        seq = start + len(keys)
+        with self._lock:
+            if self._bloom is not None and self._seq == start:
+                for hashed in entries.values():
+                    self._bloom.add(hashed)
+                self._seq = seq
+        return True
+
+    def rebuild(self) -> None:
+        """
+        Rebuild the Bloom filter from the live tokens in the database, on
+        every shard with TOKEN_SHARDS.
+        """
+        from drf_authentify.models import get_token_model
+
+        # Read the log position first: anything issued after this point is
+        # either picked up by the scan or replayed from the log.
+        seq = self.backend.get(BLOOM_SEQ_KEY) or 0
+        bloom = BloomFilter(
+            authentify_settings.BLOOM_FILTER_CAPACITY,
+            authentify_settings.BLOOM_FILTER_ERROR_RATE,
+        )
+        for alias in token_shards.all():
+            hashes = (
+                get_token_model()
+                .objects.using(alias)
+                .active()
+                .values_list("access_token_hash", flat=True)
+                .iterator(chunk_size=2000)
+            )
+            for hashed in hashes:
+                bloom.add(hashed)
+
+        with self._lock:
+            self._bloom = bloom
+            self._seq = seq
+            self._built_at = time.monotonic()
+
+    def schedule_rebuild(self) -> None:
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+
+        threading.Thread(target=self._rebuild_in_background, daemon=True).start()
+
+    def _rebuild_in_background(self) -> None:
+        try:
+            self.rebuild()
+        except Exception:
+            logger.exception("drf_authentify: Bloom filter rebuild failed.")
+        finally:
+            with self._lock:
+                self._rebuilding = False
+            connections.close_all()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._bloom = None
+            self._seq = 0
+            self._built_at = None
+            self._stats.clear()
+
+
+class RefreshGraceCache:
+    """
+    Remembers, for REFRESH_GRACE_PERIOD, the successor issued for each rotated
+    refresh token, so concurrent refreshes that lose the rotation race can be
+    issued a sibling of it instead of failing.
+
+    Entries are keyed by a digest of the used refresh token and hold only the
+    successor's primary key, never raw tokens.
+    """
+
+    @property
+    def enabled(self) -> bool:
+        return authentify_settings.REFRESH_GRACE_PERIOD is not None
+
+    @property
+    def backend(self):
+        return caches[authentify_settings.CACHE_ALIAS]
+
+    @staticmethod
+    def make_key(raw_refresh_token: str) -> str:
+        digest = hashlib.blake2b(
+            raw_refresh_token.encode("utf-8"), person=b"authentify-grace"
+        )
+        return f"{GRACE_KEY_PREFIX}{digest.hexdigest()}"
+
+    def set(self, raw_refresh_token: str, token_pk) -> None:
+        """Record the successor issued for a rotated refresh token."""
+        if not self.enabled:
+            return
+
+        self.backend.set(
+            self.make_key(raw_refresh_token),
+            token_pk,
+            authentify_settings.REFRESH_GRACE_PERIOD.total_seconds(),
+        )
+
+    def get(self, raw_refresh_token: str):
+        """
+        Return the primary key of the successor issued for a recently rotated
+        refresh token, or None.
+        """
+        if not self.enabled:
+            return None
+        return self.backend.get(self.make_key(raw_refresh_token))
+
+
+token_cache = TokenCache()
+negative_cache = NegativeTokenCache()
+refresh_grace = RefreshGraceCache()
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class DrfAuthentifyBinaryConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "drf_authentify.contrib.binary"
+    label = "drf_authentify_binary"
+    verbose_name = "DRF Authentify (binary hashes)"
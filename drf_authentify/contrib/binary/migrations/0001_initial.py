@@ -0,0 +1,100 @@
+# Generated by Django 4.2 on 2026-10-17 02:23
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import drf_authentify.fields
+import drf_authentify.utils.tokens
+import drf_authentify.validators
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BinaryAuthToken",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "access_token_selector",
+                    models.CharField(
+                        blank=True,
+                        editable=False,
+                        max_length=12,
+                        null=True,
+                        unique=True,
+                    ),
+                ),
+                (
+                    "hash_scheme",
+                    models.CharField(
+                        default=drf_authentify.utils.tokens.get_hash_scheme,
+                        editable=False,
+                        max_length=32,
+                    ),
+                ),
+                (
+                    "auth_type",
+                    models.CharField(
+                        choices=[("header", "Header"), ("cookie", "Cookie")],
+                        max_length=12,
+                    ),
+                ),
+                (
+                    "context",
+                    models.JSONField(
+                        blank=True,
+                        default=dict,
+                        validators=[drf_authentify.validators.validate_context],
+                    ),
+                ),
+                (
+                    "last_refreshed_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("refresh_until", models.DateTimeField(blank=True, null=True)),
+                ("expires_at", models.DateTimeField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("revoked_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "access_token_hash",
+                    drf_authentify.fields.HashDigestField(max_length=64, unique=True),
+                ),
+                (
+                    "refresh_token_hash",
+                    drf_authentify.fields.HashDigestField(
+                        blank=True, max_length=64, null=True, unique=True
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Authentication Token",
+                "verbose_name_plural": "Authentication Tokens",
+                "ordering": ["-created_at"],
+                "abstract": False,
+            },
+        ),
+    ]
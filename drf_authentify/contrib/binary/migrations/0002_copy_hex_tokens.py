@@ -0,0 +1,106 @@
+import logging
+
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+from django.core.management.color import no_style
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+COPIED_FIELDS = (
+    "id",
+    "user_id",
+    "access_token_hash",
+    "access_token_selector",
+    "refresh_token_hash",
+    "hash_scheme",
+    "auth_type",
+    "context",
+    "last_refreshed_at",
+    "refresh_until",
+    "expires_at",
+    "created_at",
+    "revoked_at",
+)
+
+
+def _is_hex(value):
+    if value is None:
+        return True
+    try:
+        bytes.fromhex(value)
+    except ValueError:
+        return False
+    return True
+
+
+def copy_hex_tokens(apps, schema_editor):
+    """
+    Copy rows from the hex-digest token table in primary-key chunks, keeping
+    ids and timestamps so already issued tokens keep working. Rows whose hashes
+    are not hex digests cannot be converted; they are skipped and logged.
+    """
+    AuthToken = apps.get_model("drf_authentify", "AuthToken")
+    BinaryAuthToken = apps.get_model("drf_authentify_binary", "BinaryAuthToken")
+    connection = schema_editor.connection
+    db_alias = connection.alias
+
+    copied = skipped = 0
+    last_pk = 0
+    while True:
+        rows = list(
+            AuthToken.objects.using(db_alias)
+            .filter(pk__gt=last_pk)
+            .order_by("pk")
+            .values(*COPIED_FIELDS)[:BATCH_SIZE]
+        )
+        if not rows:
+            break
+
+        first_pk, last_pk = rows[0]["id"], rows[-1]["id"]
+        # Only digests produced by hash_token_string can be stored.
+        tokens = [
+            BinaryAuthToken(**row)
+            for row in rows
+            if _is_hex(row["access_token_hash"]) and _is_hex(row["refresh_token_hash"])
+        ]
+        BinaryAuthToken.objects.using(db_alias).bulk_create(tokens)
+        # auto_now_add stamps "now" on insert; restore the original issue time.
+        BinaryAuthToken.objects.using(db_alias).filter(
+            pk__gte=first_pk, pk__lte=last_pk
+        ).update(
+            created_at=Subquery(
+                AuthToken.objects.using(db_alias)
+                .filter(pk=OuterRef("pk"))
+                .values("created_at")[:1]
+            )
+        )
+        copied += len(tokens)
+        skipped += len(rows) - len(tokens)
+
+    if skipped:
+        logger.warning(
+            "drf_authentify: skipped %d token(s) whose hashes are not hex digests; "
+            "they cannot be stored in the binary token table.",
+            skipped,
+        )
+
+    if copied:
+        sequence_sql = connection.ops.sequence_reset_sql(no_style(), [BinaryAuthToken])
+        with connection.cursor() as cursor:
+            for sql in sequence_sql:
+                cursor.execute(sql)
+
+    return copied, skipped
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("drf_authentify", "0005_authtoken_hash_scheme"),
+        ("drf_authentify_binary", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_hex_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,6 @@
+from drf_authentify.base.models import AbstractBinaryAuthToken
+
+
+class BinaryAuthToken(AbstractBinaryAuthToken):
+    class Meta(AbstractBinaryAuthToken.Meta):
+        pass
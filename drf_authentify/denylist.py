@@ -0,0 +1,117 @@
+import time
+import threading
+
+from django.utils import timezone
+
+from drf_authentify.settings import authentify_settings
+
+
+class SignedTokenDenylist:
+    """
+    Process-local copy of the selectors of revoked, unexpired signed tokens.
+
+    The copy is reloaded from the RevokedToken table at most once per
+    SIGNED_TOKEN_DENYLIST_SYNC_INTERVAL, so a revocation made in another process
+    takes effect within that interval. Revocations made in this process apply
+    immediately.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._selectors = None
+        self._synced_at = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return authentify_settings.TOKEN_FORMAT == "signed"
+
+    @property
+    def stale(self) -> bool:
+        interval = authentify_settings.SIGNED_TOKEN_DENYLIST_SYNC_INTERVAL
+        return (
+            self._selectors is None
+            or time.monotonic() - self._synced_at >= interval.total_seconds()
+        )
+
+    def sync(self) -> None:
+        """
+        Reload the denylist if it is stale. While one thread reloads, others keep
+        using the previous copy; only the very first load is waited for.
+        """
+        if not self.stale:
+            return
+        if not self._sync_lock.acquire(blocking=self._selectors is None):
+            return
+
+        try:
+            if not self.stale:
+                return
+            from drf_authentify.models import RevokedToken
+
+            selectors = set(
+                RevokedToken.objects.filter(expires_at__gt=timezone.now()).values_list(
+                    "selector", flat=True
+                )
+            )
+            with self._lock:
+                self._selectors = selectors
+                self._synced_at = time.monotonic()
+        finally:
+            self._sync_lock.release()
+
+    def contains(self, selector: str) -> bool:
+        """
+        Return True if the signed token with this selector was revoked. Call
+        sync() first; before the first load every token counts as revoked.
+        """
+        with self._lock:
+            return self._selectors is None or selector in self._selectors
+
+    def deny(self, entries) -> None:
+        """Record (selector, expires_at) pairs of revoked signed tokens."""
+        from drf_authentify.models import RevokedToken
+
+        entries = [
+            (selector, expires_at)
+            for selector, expires_at in entries
+            if selector and expires_at is not None
+        ]
+        if not entries:
+            return
+
+        RevokedToken.objects.bulk_create(
+            [
+                RevokedToken(selector=selector, expires_at=expires_at)
+                for selector, expires_at in entries
+            ],
+            ignore_conflicts=True,
+        )
+        with self._lock:
+            if self._selectors is not None:
+                self._selectors.update(selector for selector, _ in entries)
+
+    def deny_queryset(self, queryset) -> None:
+        """Deny the unexpired tokens in a token queryset, before it is revoked."""
+        self.deny(
+            queryset.filter(
+                access_token_selector__isnull=False, expires_at__gt=timezone.now()
+            ).values_list("access_token_selector", "expires_at")
+        )
+
+    def prune(self) -> int:
+        """Delete entries whose tokens have expired anyway."""
+        from drf_authentify.models import RevokedToken
+
+        deleted, _ = RevokedToken.objects.filter(
+            expires_at__lte=timezone.now()
+        ).delete()
+        return deleted
+
+    def clear(self) -> None:
+        with self._lock:
+            self._selectors = None
+            self._synced_at = 0.0
+
+
+signed_token_denylist = SignedTokenDenylist()
@@ -0,0 +1,40 @@
+from django.db import models
+
+
+class HashDigestField(models.BinaryField):
+    """
+    Stores a hex digest as raw bytes in a fixed-width binary column.
+
+    Python code keeps working with hex strings (lookups, comparisons, cache keys);
+    conversion happens at the database boundary, halving the stored bytes and
+    the size of any index on the column.
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("max_length", 64)
+        kwargs.setdefault("editable", False)
+        super().__init__(*args, **kwargs)
+
+    def db_type(self, connection):
+        # MySQL cannot put a unique index on a BLOB column.
+        if connection.vendor == "mysql":
+            return f"varbinary({self.max_length})"
+        return super().db_type(connection)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return bytes(value).hex()
+
+    def to_python(self, value):
+        if isinstance(value, (bytes, memoryview)):
+            return bytes(value).hex()
+        return value
+
+    def get_prep_value(self, value):
+        if isinstance(value, str):
+            value = bytes.fromhex(value)
+        return super().get_prep_value(value)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
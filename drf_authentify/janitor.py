@@ -0,0 +1,192 @@
+import uuid
+import random
+import logging
+import threading
+from datetime import timedelta
+
+from django.db import connections
+from django.db.models import Max, Min
+from django.core.cache import caches
+from django.utils import timezone
+
+from drf_authentify.compat import Optional
+from drf_authentify.types import PurgeResult
+from drf_authentify.storage import ORMTokenStorage, get_token_storage
+from drf_authentify.sharding import token_shards
+from drf_authentify.settings import authentify_settings
+
+JANITOR_LOCK_KEY = "drf_authentify:janitor:lock"
+
+logger = logging.getLogger(__name__)
+
+
+class TokenJanitor:
+    """
+    Background thread that keeps expired tokens out of the token table.
+
+    Every cycle it samples a window of rows and, when the share of expired
+    tokens is at least JANITOR_EXPIRED_RATIO, purges them in small batches.
+    With TOKEN_SHARDS, every shard is sampled and purged on its own; other
+    TOKEN_STORAGE engines are purged every cycle, unsampled. A lock in
+    the shared cache ensures only one process purges at a time. Idle
+    cycles double the sleep interval, up to JANITOR_MAX_INTERVAL; a cycle that
+    finds work resets it to JANITOR_INTERVAL.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.interval = None
+
+    @property
+    def backend(self):
+        return caches[authentify_settings.CACHE_ALIAS]
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self.interval = authentify_settings.JANITOR_INTERVAL
+            self._thread = threading.Thread(
+                target=self._run, name="drf-authentify-janitor", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stop.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval.total_seconds()):
+            try:
+                result = self.run_once()
+            except Exception:
+                logger.exception("drf_authentify: token janitor cycle failed.")
+                result = None
+            finally:
+                connections.close_all()
+            self.interval = self._next_interval(result)
+
+    def _next_interval(self, result: Optional[PurgeResult]) -> timedelta:
+        if result is not None and result.deleted:
+            return authentify_settings.JANITOR_INTERVAL
+        return min(self.interval * 2, authentify_settings.JANITOR_MAX_INTERVAL)
+
+    def _cutoff(self):
+        retention = authentify_settings.JANITOR_RETENTION or timedelta(0)
+        return timezone.now() - retention
+
+    def sample_expired_ratio(self, using: Optional[str] = None) -> Optional[float]:
+        """
+        Estimate the share of purgeable tokens from JANITOR_SAMPLE_SIZE rows
+        starting at a random primary key. Returns None for an empty table.
+        """
+        from drf_authentify.models import get_token_model
+
+        queryset = get_token_model().objects.using(using).order_by("pk")
+        bounds = queryset.aggregate(low=Min("pk"), high=Max("pk"))
+        if bounds["low"] is None:
+            return None
+
+        size = authentify_settings.JANITOR_SAMPLE_SIZE
+        start = bounds["low"]
+        if isinstance(start, int):
+            start = random.randint(start, bounds["high"])
+
+        fields = ("expires_at", "refresh_until")
+        sample = list(queryset.filter(pk__gte=start).values_list(*fields)[:size])
+        if len(sample) < size:
+            # Wrap around to the start of the table.
+            sample += queryset.filter(pk__lt=start).values_list(*fields)[
+                : size - len(sample)
+            ]
+
+        # Same condition as AuthTokenQuerySet.dead(): a token that can still
+        # be refreshed is not purgeable.
+        cutoff = self._cutoff()
+        expired = sum(
+            1
+            for expires_at, refresh_until in sample
+            if expires_at is not None
+            and expires_at <= cutoff
+            and (refresh_until is None or refresh_until <= cutoff)
+        )
+        return expired / len(sample)
+
+    def run_once(self) -> Optional[PurgeResult]:
+        """
+        Run a single cycle. Returns the purge result, or None when another process
+        holds the lock or the expired ratio is below the threshold (on every
+        shard).
+        """
+        from drf_authentify.models import get_token_model
+
+        owner = uuid.uuid4().hex
+        time_budget = authentify_settings.JANITOR_TIME_BUDGET
+        lock_timeout = (time_budget + timedelta(minutes=1)).total_seconds()
+        if not self.backend.add(JANITOR_LOCK_KEY, owner, lock_timeout):
+            return None
+
+        try:
+            storage = get_token_storage()
+            if not isinstance(storage, ORMTokenStorage):
+                # Only the database table can be sampled for expired tokens.
+                return storage.purge(older_than=authentify_settings.JANITOR_RETENTION)
+
+            total = None
+            for alias in token_shards.all():
+                budget = time_budget
+                if total is not None:
+                    budget -= timedelta(seconds=total.elapsed)
+                    if budget <= timedelta(0):
+                        break
+
+                ratio = self.sample_expired_ratio(alias)
+                if ratio is None or ratio < authentify_settings.JANITOR_EXPIRED_RATIO:
+                    continue
+
+                result = (
+                    get_token_model()
+                    .objects.using(alias)
+                    .purge_expired(
+                        batch_size=authentify_settings.JANITOR_BATCH_SIZE,
+                        sleep=authentify_settings.JANITOR_BATCH_SLEEP.total_seconds(),
+                        time_budget=budget,
+                        older_than=authentify_settings.JANITOR_RETENTION,
+                    )
+                )
+                logger.info(
+                    "drf_authentify: janitor purged %d expired tokens from %r "
+                    "(sampled ratio %.2f).",
+                    result.deleted,
+                    alias,
+                    ratio,
+                )
+                total = result if total is None else total.merge(result)
+            return total
+        finally:
+            if self.backend.get(JANITOR_LOCK_KEY) == owner:
+                self.backend.delete(JANITOR_LOCK_KEY)
+
+
+janitor = TokenJanitor()
+
+
+def start_janitor(**kwargs) -> None:
+    """
+    request_started receiver: start the janitor in processes that serve
+    requests, rather than in every process that loads the app (e.g. migrate).
+    """
+    from django.core.signals import request_started
+
+    request_started.disconnect(dispatch_uid=JANITOR_LOCK_KEY)
+    janitor.start()
@@ -0,0 +1,55 @@
+import secrets
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from drf_authentify.settings import is_valid_hash_scheme
+from drf_authentify.utils.tokens import hash_token_string, _get_hasher
+
+DEFAULT_SCHEMES = ["sha256", "sha512", "blake2b", "hmac-sha256", "blake2b-keyed"]
+
+
+class Command(BaseCommand):
+    help = "Compare the per-token cost of the supported token hashing schemes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "schemes",
+            nargs="*",
+            default=DEFAULT_SCHEMES,
+            help="Schemes to compare (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--number",
+            type=int,
+            default=100_000,
+            help="Hashes per scheme (default: %(default)s).",
+        )
+
+    def handle(self, *args, **options):
+        number = options["number"]
+        invalid = [s for s in options["schemes"] if not is_valid_hash_scheme(s)]
+        if invalid:
+            raise CommandError(f"Unknown hash schemes: {', '.join(invalid)}")
+        if number <= 0:
+            raise CommandError("--number must be positive.")
+        token = secrets.token_urlsafe(32)
+
+        self.stdout.write(f"{'scheme':<16}{'ns/hash':>10}{'uncached ns/hash':>20}")
+        for scheme in options["schemes"]:
+            hash_token_string(token, scheme)  # Warm the per-process hasher cache.
+            cached = timeit.timeit(
+                lambda: hash_token_string(token, scheme), number=number
+            )
+
+            def uncached():
+                _get_hasher.cache_clear()
+                hash_token_string(token, scheme)
+
+            uncached_number = max(1, number // 10)
+            uncached_time = timeit.timeit(uncached, number=uncached_number)
+            self.stdout.write(
+                f"{scheme:<16}{cached / number * 1e9:>10.0f}"
+                f"{uncached_time / uncached_number * 1e9:>20.0f}"
+            )
+        _get_hasher.cache_clear()
@@ -0,0 +1,97 @@
+from argparse import BooleanOptionalAction
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from drf_authentify.services import TokenService
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired and revoked tokens in small batches, pausing between "
+        "batches, so cleanup can run against a live table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Maximum rows deleted per batch (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0.1,
+            help="Seconds to pause between batches (default: %(default)s).",
+        )
+        parser.add_argument(
+            "--time-budget",
+            type=float,
+            default=None,
+            help="Stop after this many seconds; rerun to continue.",
+        )
+        parser.add_argument(
+            "--older-than",
+            type=float,
+            default=None,
+            help="Only delete tokens expired for at least this many seconds.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report how many tokens would be deleted.",
+        )
+        parser.add_argument(
+            "--archive",
+            action=BooleanOptionalAction,
+            default=None,
+            help="Move tokens to ARCHIVE_MODEL instead of only deleting them "
+            "(default: ARCHIVE_EXPIRED_TOKENS).",
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options["verbosity"]
+        if options["batch_size"] <= 0:
+            raise CommandError("--batch-size must be positive.")
+        for name in ("sleep", "time_budget", "older_than"):
+            if options[name] is not None and options[name] < 0:
+                raise CommandError(f"--{name.replace('_', '-')} cannot be negative.")
+
+        result = TokenService.purge_expired_tokens(
+            batch_size=options["batch_size"],
+            sleep=options["sleep"],
+            time_budget=self._seconds(options["time_budget"]),
+            older_than=self._seconds(options["older_than"]),
+            dry_run=options["dry_run"],
+            progress=self._report_progress,
+            archive=options["archive"],
+        )
+
+        action = "archived" if result.archived else "deleted"
+        if result.dry_run:
+            self.stdout.write(f"{result.deleted} expired tokens would be {action}.")
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{action.capitalize()} {result.deleted} expired tokens in "
+                f"{result.batches} batches ({result.elapsed:.1f}s)."
+            )
+        )
+        if not result.completed:
+            self.stdout.write(
+                self.style.WARNING("Time budget reached; rerun to continue.")
+            )
+
+    @staticmethod
+    def _seconds(value):
+        return timedelta(seconds=value) if value is not None else None
+
+    def _report_progress(self, result):
+        if self.verbosity > 1:
+            self.stdout.write(
+                f"Batch {result.batches}: {result.deleted} "
+                f"{'archived' if result.archived else 'deleted'} "
+                f"({result.elapsed:.1f}s)"
+            )
@@ -0,0 +1,108 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from drf_authentify.services import TokenService
+from drf_authentify.sharding import token_shards
+from drf_authentify.partitions import TokenPartitioner
+
+
+class Command(BaseCommand):
+    help = (
+        "Maintain a PostgreSQL token table partitioned by TOKEN_PARTITION_KEY: "
+        "create upcoming partitions and drop partitions whose tokens have all "
+        "expired, on every shard. On other databases, purges expired tokens in "
+        "batches instead."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sql",
+            action="store_true",
+            help="Print the DDL that creates the partitioned token table and exit.",
+        )
+        parser.add_argument(
+            "--premake",
+            type=int,
+            default=None,
+            help="Future partitions to keep created (default: TOKEN_PARTITION_PREMAKE).",
+        )
+        parser.add_argument(
+            "--older-than",
+            type=float,
+            default=None,
+            help="Only drop partitions expired for at least this many seconds.",
+        )
+        parser.add_argument(
+            "--detach-only",
+            action="store_true",
+            help="Detach expired partitions but keep their tables.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report what would be created and dropped.",
+        )
+
+    def handle(self, *args, **options):
+        if options["premake"] is not None and options["premake"] < 0:
+            raise CommandError("--premake cannot be negative.")
+        if options["older_than"] is not None and options["older_than"] < 0:
+            raise CommandError("--older-than cannot be negative.")
+        older_than = (
+            timedelta(seconds=options["older_than"])
+            if options["older_than"] is not None
+            else None
+        )
+
+        partitioners = [TokenPartitioner(using=alias) for alias in token_shards.all()]
+        if not all(partitioner.supported for partitioner in partitioners):
+            if options["sql"]:
+                raise CommandError("Token table partitioning requires PostgreSQL.")
+            self._purge(older_than, options["dry_run"])
+            return
+
+        if options["sql"]:
+            for statement in partitioners[0].create_table_sql():
+                self.stdout.write(f"{statement};")
+            return
+
+        for partitioner in partitioners:
+            self._maintain(partitioner, older_than, options)
+
+    def _maintain(self, partitioner, older_than, options):
+        # Every shard has partitions of the same names.
+        where = f" on {partitioner.using}" if token_shards.enabled else ""
+
+        prefix = "Would create" if options["dry_run"] else "Created"
+        for partition in partitioner.create_partitions(
+            options["premake"], dry_run=options["dry_run"]
+        ):
+            self.stdout.write(f"{prefix} partition {partition.name}{where}.")
+
+        if options["dry_run"]:
+            prefix = "Would detach" if options["detach_only"] else "Would drop"
+        else:
+            prefix = "Detached" if options["detach_only"] else "Dropped"
+        for partition in partitioner.drop_expired(
+            older_than=older_than,
+            detach_only=options["detach_only"],
+            dry_run=options["dry_run"],
+        ):
+            self.stdout.write(f"{prefix} partition {partition.name}{where}.")
+
+    def _purge(self, older_than, dry_run):
+        self.stdout.write(
+            self.style.WARNING(
+                "Token table partitioning requires PostgreSQL; purging expired "
+                "tokens in batches instead."
+            )
+        )
+        result = TokenService.purge_expired_tokens(
+            older_than=older_than, dry_run=dry_run
+        )
+        action = "archived" if result.archived else "deleted"
+        if dry_run:
+            self.stdout.write(f"{result.deleted} expired tokens would be {action}.")
+        else:
+            self.stdout.write(f"{action.capitalize()} {result.deleted} expired tokens.")
@@ -1,15 +1,26 @@
+import time
 from datetime import timedelta
 
-from django.db.models import Q
+from asgiref.sync import sync_to_async
+from django.db.models import DateTimeField, F, Q, Value
 from django.utils import timezone
-from django.db import models, transaction
+from django.db import connections, models, router, transaction
 
 from drf_authentify.compat import Self
-from drf_authentify.compat import Optional
+from drf_authentify.cache import token_cache, negative_cache
+from drf_authentify.replica import read_replica
+from drf_authentify.sharding import token_shards
+from drf_authentify.denylist import signed_token_denylist
+from drf_authentify.compat import Optional, Callable
 from drf_authentify.choices import AUTH_TYPES
-from drf_authentify.types import IssuedTokens
+from drf_authentify.types import IssuedTokens, PurgeResult
 from drf_authentify.settings import authentify_settings
-from drf_authentify.utils.tokens import generate_access_token, generate_refresh_token
+from drf_authentify.utils.tokens import (
+    generate_access_token,
+    generate_refresh_token,
+    generate_signed_access_token,
+    generate_selector_access_token,
+)
 
 
 class AuthTokenQuerySet(models.QuerySet):
@@ -28,15 +39,193 @@ class AuthTokenQuerySet(models.QuerySet):
         """Return expired tokens."""
         return self.filter(expires_at__lte=timezone.now())
 
+    def dead(self, cutoff=None) -> Self:
+        """
+        Return tokens that have expired and can no longer be refreshed as of
+        ``cutoff`` (default: now), i.e. the tokens that are safe to delete.
+        """
+        cutoff = cutoff or timezone.now()
+        return self.filter(
+            Q(refresh_until__isnull=True) | Q(refresh_until__lte=cutoff),
+            expires_at__lte=cutoff,
+        )
+
     def for_user(self, user) -> Self:
         """Filter tokens for a specific user."""
         return self.filter(user=user)
 
+    def on_replica(self) -> Self:
+        """Read from READ_DATABASE_ALIAS, if one is configured."""
+        alias = authentify_settings.READ_DATABASE_ALIAS
+        return self.using(alias) if alias else self
+
     def delete_expired(self) -> int:
         """Delete all expired tokens and return count."""
         deleted, _ = self.expired().delete()
         return deleted
 
+    def delete(self):
+        """
+        Delete the tokens. In signed-token mode, unexpired ones are added to the
+        denylist first, since signed tokens verify without their row.
+        """
+        if signed_token_denylist.enabled:
+            signed_token_denylist.deny_queryset(self)
+        return super().delete()
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def revoke(self) -> int:
+        """
+        Revoke every token in the queryset with a single statement and return
+        the number of affected rows: an UPDATE in KEEP_EXPIRED_TOKENS mode,
+        otherwise a DELETE (Django only collects rows first when signal
+        receivers or related objects need it). Cached tokens are left for the
+        caller to invalidate. In signed-token mode, unexpired tokens are also
+        added to the denylist.
+        """
+        if authentify_settings.KEEP_EXPIRED_TOKENS:
+            if signed_token_denylist.enabled:
+                signed_token_denylist.deny_queryset(self)
+            now = timezone.now()
+            old_date = now - timedelta(days=1)
+            return self.filter(revoked_at__isnull=True).update(
+                revoked_at=now, expires_at=old_date, refresh_until=old_date
+            )
+
+        deleted, _ = self.delete()
+        return deleted
+
+    def archive(self) -> int:
+        """
+        Copy every token in the queryset into ARCHIVE_MODEL with a single
+        INSERT ... SELECT and return the number of copied rows. The tokens are
+        left in place; the caller deletes them in the same transaction.
+        """
+        from drf_authentify.models import get_archive_model
+
+        archive_model = get_archive_model()
+        columns, sources = [], []
+        for field in archive_model._meta.concrete_fields:
+            if field.primary_key or field.name == "archived_at":
+                continue
+            columns.append(field.column)
+            sources.append("pk" if field.name == "token_id" else field.attname)
+
+        archived_at = Value(timezone.now(), output_field=DateTimeField())
+        select = (
+            self.order_by()
+            .annotate(_archived_at=archived_at)
+            .values_list(*sources, "_archived_at")
+        )
+        select_sql, params = select.query.get_compiler(using=self.db).as_sql()
+
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        target = ", ".join(
+            quote(column)
+            for column in columns
+            + [archive_model._meta.get_field("archived_at").column]
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {quote(archive_model._meta.db_table)} ({target}) "
+                f"{select_sql}",
+                params,
+            )
+            return cursor.rowcount
+
+    def purge_expired(
+        self,
+        batch_size: int = 1000,
+        sleep: float = 0,
+        time_budget: Optional[timedelta] = None,
+        older_than: Optional[timedelta] = None,
+        dry_run: bool = False,
+        progress: Optional[Callable[[PurgeResult], None]] = None,
+        archive: Optional[bool] = None,
+    ) -> PurgeResult:
+        """
+        Delete dead tokens (expired and past their refresh window, as revoked
+        tokens are) in batches of at most ``batch_size`` rows. Each batch deletes
+        one primary-key range in its own short transaction, so locks and
+        replication lag stay bounded.
+
+        With ``archive`` (default: ARCHIVE_EXPIRED_TOKENS), each batch is first
+        copied into ARCHIVE_MODEL in the same transaction, so history is kept
+        without keeping the token table large.
+
+        Stops early once ``time_budget`` is spent; rerunning picks up where it
+        left off. With ``dry_run``, only counts the matching tokens.
+        """
+        if archive is None:
+            archive = authentify_settings.ARCHIVE_EXPIRED_TOKENS
+        started = time.monotonic()
+        cutoff = timezone.now() - (older_than or timedelta(0))
+        queryset = self.dead(cutoff)
+
+        if dry_run:
+            return PurgeResult(
+                deleted=queryset.count(),
+                batches=0,
+                elapsed=time.monotonic() - started,
+                completed=True,
+                dry_run=True,
+                archived=archive,
+            )
+
+        deadline = started + time_budget.total_seconds() if time_budget else None
+        label = self.model._meta.label
+        deleted = batches = 0
+        last_pk = None
+
+        while True:
+            pending = queryset.order_by("pk")
+            if last_pk is not None:
+                pending = pending.filter(pk__gt=last_pk)
+            pks = list(pending.values_list("pk", flat=True)[:batch_size])
+            if not pks:
+                completed = True
+                break
+
+            batch = queryset.filter(pk__gte=pks[0], pk__lte=pks[-1])
+            with transaction.atomic(using=self.db):
+                if archive:
+                    batch.archive()
+                _, per_model = batch.delete()
+            deleted += per_model.get(label, 0)
+            batches += 1
+            last_pk = pks[-1]
+
+            if progress:
+                progress(
+                    PurgeResult(
+                        deleted,
+                        batches,
+                        time.monotonic() - started,
+                        False,
+                        archived=archive,
+                    )
+                )
+
+            if len(pks) < batch_size:
+                completed = True
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                completed = False
+                break
+            if sleep:
+                time.sleep(sleep)
+
+        return PurgeResult(
+            deleted,
+            batches,
+            time.monotonic() - started,
+            completed,
+            archived=archive,
+        )
+
 
 class AuthTokenManager(models.Manager):
     def get_queryset(self) -> Self:
@@ -54,30 +243,32 @@ class AuthTokenManager(models.Manager):
     def for_user(self, user) -> Self:
         return self.get_queryset().for_user(user)
 
+    def on_replica(self) -> Self:
+        return self.get_queryset().on_replica()
+
     def delete_expired(self) -> int:
         return self.get_queryset().delete_expired()
 
-    @transaction.atomic
-    def create_token(
+    def purge_expired(self, **kwargs) -> PurgeResult:
+        return self.get_queryset().purge_expired(**kwargs)
+
+    @property
+    def _write_db(self) -> str:
+        return self._db or router.db_for_write(self.model)
+
+    def _build_token(
         self,
         user,
         auth_type: AUTH_TYPES,
+        now,
         context: Optional[dict] = None,
         access_expires_in: Optional[timedelta] = None,
         refresh_expires_in: Optional[timedelta] = None,
-    ) -> IssuedTokens:
-        now = timezone.now()
-        context = context or {}
-
-        # Single-login enforcement
-        if authentify_settings.ENFORCE_SINGLE_LOGIN:
-            qs = self.filter(user=user)
-            if authentify_settings.KEEP_EXPIRED_TOKENS:
-                old_date = now - timedelta(days=1)
-                qs.update(revoked_at=now, expires_at=old_date, refresh_until=old_date)
-            else:
-                qs.delete()
-
+    ) -> tuple[dict, str, Optional[str]]:
+        """
+        Generate raw tokens and return (token_data, raw_token, raw_refresh_token),
+        where token_data holds the field values for the new row.
+        """
         # Compute expiration times
         ttl = access_expires_in or authentify_settings.TOKEN_TTL
         refresh_ttl = refresh_expires_in or authentify_settings.REFRESH_TOKEN_TTL
@@ -86,16 +277,25 @@ class AuthTokenManager(models.Manager):
         refresh_until = now + refresh_ttl if refresh_ttl else None
 
         # Generate tokens
-        raw_token, hashed_token = generate_access_token()
-        raw_refresh_token, hashed_refresh_token = (None, None)
+        selector = None
+        if authentify_settings.TOKEN_FORMAT == "selector":
+            raw_token, selector, hashed_token = generate_selector_access_token()
+        elif authentify_settings.TOKEN_FORMAT == "signed":
+            raw_token, selector, hashed_token = generate_signed_access_token(
+                user.pk, auth_type, expires_at, context or {}
+            )
+        else:
+            raw_token, hashed_token = generate_access_token()
+        raw_refresh_token = None
 
         token_data = {
             "user": user,
-            "context": context,
+            "context": context or {},
             "auth_type": auth_type,
             "expires_at": expires_at,
             "last_refreshed_at": now,
             "access_token_hash": hashed_token,
+            "access_token_selector": selector,
         }
 
         if refresh_ttl is not None:
@@ -105,6 +305,244 @@ class AuthTokenManager(models.Manager):
                 refresh_token_hash=hashed_refresh_token,
             )
 
-        # Create token
+        return (
+            token_data,
+            token_shards.embed(self._write_db, raw_token),
+            token_shards.embed(self._write_db, raw_refresh_token),
+        )
+
+    def revoke(self) -> int:
+        return self.get_queryset().revoke()
+
+    def _lock_users(self, users) -> None:
+        """
+        Serialize single-login issuance per user: lock the users' rows, in
+        primary-key order, until the surrounding transaction ends. On PostgreSQL
+        the wait is bounded by SINGLE_LOGIN_LOCK_TIMEOUT.
+        """
+        db = self._write_db
+        connection = connections[db]
+        user_model = self.model._meta.get_field("user").related_model
+        queryset = (
+            user_model._default_manager.using(db)
+            .filter(pk__in=sorted({user.pk for user in users}))
+            .order_by("pk")
+        )
+
+        if not connection.features.has_select_for_update:
+            # SQLite has no row locks. A no-op write takes the database write
+            # lock up front, so concurrent logins queue on the busy timeout
+            # instead of failing to upgrade a read lock.
+            pk_name = user_model._meta.pk.attname
+            queryset.update(**{pk_name: F(pk_name)})
+            return
+
+        if connection.vendor == "postgresql":
+            timeout = authentify_settings.SINGLE_LOGIN_LOCK_TIMEOUT
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT current_setting('lock_timeout'), "
+                    "set_config('lock_timeout', %s, true)",
+                    [f"{int(timeout.total_seconds() * 1000)}ms"],
+                )
+                previous = cursor.fetchone()[0]
+                list(queryset.select_for_update().values_list("pk", flat=True))
+                cursor.execute(
+                    "SELECT set_config('lock_timeout', %s, true)", [previous]
+                )
+        else:
+            list(queryset.select_for_update().values_list("pk", flat=True))
+
+    def _revoke_and_invalidate(self, qs) -> int:
+        """Revoke ``qs`` and drop its tokens from the cache once committed."""
+        if token_cache.enabled:
+            hashes = list(qs.values_list("access_token_hash", flat=True))
+            transaction.on_commit(lambda: token_cache.invalidate(hashes), using=qs.db)
+        return qs.revoke()
+
+    def _revoke_user_tokens(self, **lookup) -> None:
+        """
+        Single-login revocation: the users' tokens in this database, within the
+        current transaction, then any left on other shards.
+        """
+        self._revoke_and_invalidate(self.filter(**lookup))
+        for alias in token_shards.all():
+            if alias != self._write_db:
+                other = self.db_manager(alias)
+                other._revoke_and_invalidate(other.filter(**lookup))
+
+    def revoke_tokens(self, users=None, token_ids=None) -> int:
+        """
+        Revoke all tokens of ``users`` and/or the tokens with ``token_ids`` in one
+        statement, returning the number of revoked tokens.
+        """
+        condition = Q(pk__in=[])
+        if users is not None:
+            condition |= Q(user__in=users)
+        if token_ids is not None:
+            condition |= Q(pk__in=token_ids)
+        with transaction.atomic(using=self._write_db):
+            return self._revoke_and_invalidate(self.filter(condition))
+
+    def create_token(
+        self,
+        user,
+        auth_type: AUTH_TYPES,
+        context: Optional[dict] = None,
+        access_expires_in: Optional[timedelta] = None,
+        refresh_expires_in: Optional[timedelta] = None,
+    ) -> IssuedTokens:
+        """
+        Issue a token for ``user`` in one transaction. With TOKEN_SHARDS, it is
+        stored on the user's shard.
+        """
+        if token_shards.enabled and self._db is None:
+            return self.db_manager(token_shards.for_user(user)).create_token(
+                user,
+                auth_type,
+                context=context,
+                access_expires_in=access_expires_in,
+                refresh_expires_in=refresh_expires_in,
+            )
+
+        with transaction.atomic(using=self._write_db):
+            # Single-login enforcement
+            if authentify_settings.ENFORCE_SINGLE_LOGIN:
+                self._lock_users([user])
+                self._revoke_user_tokens(user=user)
+
+            return self._insert_token(
+                user, auth_type, context, access_expires_in, refresh_expires_in
+            )
+
+    def _insert_token(
+        self, user, auth_type, context, access_expires_in, refresh_expires_in
+    ) -> IssuedTokens:
+        """Insert a new token, without single-login enforcement."""
+        token_data, raw_token, raw_refresh_token = self._build_token(
+            user,
+            auth_type,
+            timezone.now(),
+            context,
+            access_expires_in,
+            refresh_expires_in,
+        )
         token = self.create(**token_data)
+        negative_cache.record_issued([token.access_token_hash])
+        read_replica.record_issued([token.access_token_hash])
+        return IssuedTokens(raw_token, raw_refresh_token, token)
+
+    async def acreate_token(
+        self,
+        user,
+        auth_type: AUTH_TYPES,
+        context: Optional[dict] = None,
+        access_expires_in: Optional[timedelta] = None,
+        refresh_expires_in: Optional[timedelta] = None,
+    ) -> IssuedTokens:
+        """Async counterpart of create_token."""
+        if token_shards.enabled and self._db is None:
+            return await self.db_manager(token_shards.for_user(user)).acreate_token(
+                user,
+                auth_type,
+                context=context,
+                access_expires_in=access_expires_in,
+                refresh_expires_in=refresh_expires_in,
+            )
+
+        if authentify_settings.ENFORCE_SINGLE_LOGIN:
+            # Revoke-then-insert must be atomic, and the async ORM cannot open
+            # transactions, so this path runs the transactional sync version.
+            return await sync_to_async(self.create_token)(
+                user,
+                auth_type,
+                context=context,
+                access_expires_in=access_expires_in,
+                refresh_expires_in=refresh_expires_in,
+            )
+
+        token_data, raw_token, raw_refresh_token = self._build_token(
+            user,
+            auth_type,
+            timezone.now(),
+            context,
+            access_expires_in,
+            refresh_expires_in,
+        )
+
+        token = await self.acreate(**token_data)
+        await negative_cache.arecord_issued([token.access_token_hash])
+        await read_replica.arecord_issued([token.access_token_hash])
         return IssuedTokens(raw_token, raw_refresh_token, token)
+
+    def bulk_create_tokens(
+        self,
+        users,
+        auth_type: AUTH_TYPES,
+        context: Optional[dict] = None,
+        access_expires_in: Optional[timedelta] = None,
+        refresh_expires_in: Optional[timedelta] = None,
+        batch_size: int = 1000,
+    ) -> list[IssuedTokens]:
+        """
+        Issue one token per user with batched INSERTs, in a single transaction.
+        Tokens are returned in the order of ``users``. Primary keys are only set
+        on databases that return them from bulk inserts (not MySQL).
+
+        With TOKEN_SHARDS, users are grouped by shard and each group is issued
+        in a transaction on its shard.
+        """
+        if token_shards.enabled and self._db is None:
+            users = list(users)
+            by_shard = {}
+            for index, user in enumerate(users):
+                by_shard.setdefault(token_shards.for_user(user), []).append(index)
+
+            issued = [None] * len(users)
+            for alias, indexes in by_shard.items():
+                tokens = self.db_manager(alias).bulk_create_tokens(
+                    [users[index] for index in indexes],
+                    auth_type,
+                    context=context,
+                    access_expires_in=access_expires_in,
+                    refresh_expires_in=refresh_expires_in,
+                    batch_size=batch_size,
+                )
+                for index, token in zip(indexes, tokens):
+                    issued[index] = token
+            return issued
+
+        with transaction.atomic(using=self._write_db):
+            users = list(users)
+            now = timezone.now()
+
+            if authentify_settings.ENFORCE_SINGLE_LOGIN:
+                if len({user.pk for user in users}) != len(users):
+                    raise ValueError(
+                        "Duplicate users cannot be issued tokens while "
+                        "ENFORCE_SINGLE_LOGIN is enabled."
+                    )
+                self._lock_users(users)
+                self._revoke_user_tokens(user__in=users)
+
+            tokens, raw_tokens = [], []
+            for user in users:
+                # Each token gets its own copy of the shared context.
+                token_data, raw_token, raw_refresh_token = self._build_token(
+                    user,
+                    auth_type,
+                    now,
+                    dict(context or {}),
+                    access_expires_in,
+                    refresh_expires_in,
+                )
+                tokens.append(self.model(**token_data))
+                raw_tokens.append((raw_token, raw_refresh_token))
+
+            self.bulk_create(tokens, batch_size=batch_size)
+            negative_cache.record_issued(token.access_token_hash for token in tokens)
+            read_replica.record_issued(token.access_token_hash for token in tokens)
+            return [
+                IssuedTokens(raw_token, raw_refresh_token, token)
+                for token, (raw_token, raw_refresh_token) in zip(tokens, raw_tokens)
+            ]
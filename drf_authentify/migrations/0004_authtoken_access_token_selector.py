@@ -0,0 +1,20 @@
+# Generated by Django 4.2 on 2026-10-17 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("drf_authentify", "0003_alter_authtoken_user"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="authtoken",
+            name="access_token_selector",
+            field=models.CharField(
+                blank=True, editable=False, max_length=12, null=True, unique=True
+            ),
+        ),
+    ]
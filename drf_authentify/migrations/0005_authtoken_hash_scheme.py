@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-17 02:23
+
+from django.db import migrations, models
+import drf_authentify.utils.tokens
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("drf_authentify", "0004_authtoken_access_token_selector"),
+    ]
+
+    # The callable default is evaluated once for existing rows, labelling them
+    # with the algorithm configured when the migration runs.
+    operations = [
+        migrations.AddField(
+            model_name="authtoken",
+            name="hash_scheme",
+            field=models.CharField(
+                default=drf_authentify.utils.tokens.get_hash_scheme,
+                editable=False,
+                max_length=32,
+            ),
+        ),
+    ]
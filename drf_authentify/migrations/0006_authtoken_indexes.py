@@ -0,0 +1,43 @@
+# Generated by Django 4.2 on 2026-10-17 02:26
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("drf_authentify", "0005_authtoken_hash_scheme"),
+    ]
+
+    # The new indexes are created before the foreign key's own index is
+    # dropped, as MySQL requires an index on the constrained column.
+    operations = [
+        migrations.AddIndex(
+            model_name="authtoken",
+            index=models.Index(
+                fields=["user", "expires_at"],
+                name="authtoken_user_exp",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="authtoken",
+            index=models.Index(
+                condition=models.Q(("expires_at__isnull", False)),
+                fields=["expires_at"],
+                name="authtoken_exp",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="authtoken",
+            name="user",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+    ]
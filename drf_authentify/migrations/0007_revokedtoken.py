@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-17 02:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("drf_authentify", "0006_authtoken_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RevokedToken",
+            fields=[
+                (
+                    "selector",
+                    models.CharField(max_length=12, primary_key=True, serialize=False),
+                ),
+                ("expires_at", models.DateTimeField(db_index=True)),
+            ],
+            options={
+                "verbose_name": "Revoked Signed Token",
+                "verbose_name_plural": "Revoked Signed Tokens",
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2 on 2026-10-17 02:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("drf_authentify", "0007_revokedtoken"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedAuthToken",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("token_id", models.BigIntegerField(db_index=True)),
+                ("access_token_hash", models.CharField(max_length=255)),
+                ("hash_scheme", models.CharField(max_length=32)),
+                (
+                    "auth_type",
+                    models.CharField(
+                        choices=[("header", "Header"), ("cookie", "Cookie")],
+                        max_length=12,
+                    ),
+                ),
+                ("context", models.JSONField(blank=True, default=dict)),
+                ("last_refreshed_at", models.DateTimeField()),
+                ("refresh_until", models.DateTimeField(blank=True, null=True)),
+                ("expires_at", models.DateTimeField(blank=True, null=True)),
+                ("created_at", models.DateTimeField()),
+                ("revoked_at", models.DateTimeField(blank=True, null=True)),
+                ("archived_at", models.DateTimeField()),
+                (
+                    "user",
+                    models.ForeignKey(
+                        db_index=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Archived Authentication Token",
+                "verbose_name_plural": "Archived Authentication Tokens",
+                "ordering": ["-created_at"],
+                "abstract": False,
+            },
+        ),
+        migrations.AddIndex(
+            model_name="archivedauthtoken",
+            index=models.Index(
+                fields=["user", "created_at"], name="archivedauthtoken_user_cr"
+            ),
+        ),
+    ]
@@ -1,11 +1,14 @@
 from django.apps import apps
+from django.db import models
 from django.utils.module_loading import import_string
 
 from drf_authentify.compat import Type
 from drf_authentify.settings import authentify_settings
-from drf_authentify.base.models import AbstractAuthToken
-
-
+from drf_authentify.base.models import (
+    AbstractAuthToken,
+    AbstractBinaryAuthToken,
+    AbstractArchivedAuthToken,
+)
 
 # Type alias for token model
 TokenType = Type["AuthToken"]
@@ -24,7 +27,35 @@ def get_token_model() -> TokenType:
     return import_string(model_path)
 
 
+def get_archive_model():
+    """Return the model expired tokens are archived into (ARCHIVE_MODEL)."""
+    app_label, model_name = authentify_settings.ARCHIVE_MODEL.rsplit(".", 1)
+    return apps.get_model(app_label, model_name)
+
 
 class AuthToken(AbstractAuthToken):
     class Meta(AbstractAuthToken.Meta):
         swappable = "drf_authentify.AuthToken"
+
+
+class ArchivedAuthToken(AbstractArchivedAuthToken):
+    class Meta(AbstractArchivedAuthToken.Meta):
+        pass
+
+
+class RevokedToken(models.Model):
+    """
+    Denylist entry for a revoked signed token, kept until the token's own expiry.
+    Signed tokens are verified without reading the token table, so revoking
+    one must also be recorded here.
+    """
+
+    selector = models.CharField(max_length=12, primary_key=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = "Revoked Signed Token"
+        verbose_name_plural = "Revoked Signed Tokens"
+
+    def __str__(self):
+        return self.selector
@@ -0,0 +1,232 @@
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.db import connections, router, transaction
+
+from drf_authentify.compat import Optional
+from drf_authentify.types import TokenPartition
+from drf_authentify.settings import authentify_settings
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+PARTITION_BOUND_RE = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+
+class TokenPartitioner:
+    """
+    Tooling for a PostgreSQL token table declaratively partitioned by range on
+    TOKEN_PARTITION_KEY, one partition per TOKEN_PARTITION_INTERVAL.
+
+    Partitions are created ahead of time, and a partition holding only expired
+    tokens is detached and dropped as a whole, so cleanup is a catalog change
+    instead of a row-by-row DELETE. Rows outside every range (tokens that never
+    expire, or revoked tokens whose expiry was moved into the past) land in a
+    DEFAULT partition, which purge_expired() cleans as before.
+    """
+
+    def __init__(self, model=None, using: Optional[str] = None):
+        from drf_authentify.models import get_token_model
+
+        self.model = model or get_token_model()
+        self.using = using or router.db_for_write(self.model)
+
+    @property
+    def connection(self):
+        return connections[self.using]
+
+    @property
+    def supported(self) -> bool:
+        return self.connection.vendor == "postgresql"
+
+    @property
+    def table(self) -> str:
+        return self.model._meta.db_table
+
+    @property
+    def key(self):
+        return self.model._meta.get_field(authentify_settings.TOKEN_PARTITION_KEY)
+
+    def quote(self, name: str) -> str:
+        return self.connection.ops.quote_name(name)
+
+    def floor(self, moment: datetime) -> datetime:
+        """Return the start of the partition range containing ``moment``."""
+        interval = authentify_settings.TOKEN_PARTITION_INTERVAL
+        return EPOCH + (moment - EPOCH) // interval * interval
+
+    def partition_for(self, start: datetime) -> TokenPartition:
+        end = start + authentify_settings.TOKEN_PARTITION_INTERVAL
+        return TokenPartition(f"{self.table}_p{start:%Y%m%d}", start, end)
+
+    def create_table_sql(self) -> list[str]:
+        """
+        Return the statements that create the token table partitioned by
+        TOKEN_PARTITION_KEY, with a DEFAULT partition and the model's indexes.
+
+        PostgreSQL requires unique constraints on a partitioned table to include
+        the partition key. The primary key becomes (pk, key), or a plain index
+        when the key is nullable, and the unique token hash columns become plain
+        indexes: hashes of random tokens do not collide, and lookups stay
+        indexed.
+        """
+        model, connection = self.model, self.connection
+        editor = connection.schema_editor(collect_sql=True)
+        pk, key = model._meta.pk, self.key
+
+        columns, indexed = [], []
+        for field in model._meta.local_concrete_fields:
+            definition = f"{self.quote(field.column)} {field.db_type(connection)}"
+            suffix = field.db_type_suffix(connection=connection)
+            if suffix:
+                definition += f" {suffix}"
+            definition += " NULL" if field.null else " NOT NULL"
+
+            check = field.db_parameters(connection=connection)["check"]
+            if check:
+                definition += f" CHECK ({check})"
+            if (
+                field.remote_field
+                and field.db_constraint
+                and editor.sql_create_inline_fk
+            ):
+                target = field.target_field
+                definition += " " + editor.sql_create_inline_fk % {
+                    "to_table": self.quote(target.model._meta.db_table),
+                    "to_column": self.quote(target.column),
+                }
+            columns.append(definition)
+
+            if field.unique and not field.primary_key:
+                indexed.append(field)
+
+        if key.null:
+            indexed.insert(0, pk)
+        else:
+            columns.append(
+                f"PRIMARY KEY ({self.quote(pk.column)}, {self.quote(key.column)})"
+            )
+
+        table = self.quote(self.table)
+        statements = [
+            f"CREATE TABLE {table} ({', '.join(columns)}) "
+            f"PARTITION BY RANGE ({self.quote(key.column)})",
+            f"CREATE TABLE {self.quote(self.table + '_default')} "
+            f"PARTITION OF {table} DEFAULT",
+        ]
+        statements += [
+            str(editor._create_index_sql(model, fields=[field])) for field in indexed
+        ]
+        statements += [str(sql) for sql in editor._model_indexes_sql(model)]
+        return statements
+
+    def list_partitions(self) -> list[TokenPartition]:
+        """Return the range partitions of the token table, oldest first."""
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) "
+                "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = %s::regclass",
+                [self.quote(self.table)],
+            )
+            rows = cursor.fetchall()
+
+        partitions = []
+        for name, bound in rows:
+            match = PARTITION_BOUND_RE.search(bound or "")
+            if match:
+                start, end = (parse_datetime(value) for value in match.groups())
+                partitions.append(TokenPartition(name, start, end))
+        return sorted(partitions, key=lambda partition: partition.start)
+
+    def create_partitions(
+        self,
+        count: Optional[int] = None,
+        dry_run: bool = False,
+    ) -> list[TokenPartition]:
+        """
+        Create the partition for the current interval and the next ``count``
+        (default: TOKEN_PARTITION_PREMAKE) that do not exist yet, and return them.
+        """
+        if count is None:
+            count = authentify_settings.TOKEN_PARTITION_PREMAKE
+        interval = authentify_settings.TOKEN_PARTITION_INTERVAL
+        current = self.floor(timezone.now())
+        existing = {partition.start for partition in self.list_partitions()}
+
+        missing = [
+            self.partition_for(current + interval * i)
+            for i in range(count + 1)
+            if current + interval * i not in existing
+        ]
+        if dry_run:
+            return missing
+
+        with self.connection.cursor() as cursor:
+            for partition in missing:
+                cursor.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.quote(partition.name)} "
+                    f"PARTITION OF {self.quote(self.table)} "
+                    f"FOR VALUES FROM ('{partition.start.isoformat()}') "
+                    f"TO ('{partition.end.isoformat()}')"
+                )
+        return missing
+
+    def _rows(self, partition: TokenPartition):
+        return self.model._default_manager.using(self.using).filter(
+            **{
+                f"{self.key.name}__gte": partition.start,
+                f"{self.key.name}__lt": partition.end,
+            }
+        )
+
+    def _has_live_tokens(self, partition: TokenPartition, cutoff: datetime) -> bool:
+        """Whether any row can still be used, or refreshed, after ``cutoff``."""
+        refreshable = Q(refresh_until__gt=cutoff)
+        if self.key.name == "expires_at":
+            # Every row in the range expired before the partition end, but
+            # its refresh window may still be open.
+            return self._rows(partition).filter(refreshable).exists()
+        return (
+            self._rows(partition)
+            .filter(Q(expires_at__gt=cutoff) | Q(expires_at__isnull=True) | refreshable)
+            .exists()
+        )
+
+    def drop_expired(
+        self,
+        older_than: Optional[timedelta] = None,
+        detach_only: bool = False,
+        dry_run: bool = False,
+    ) -> list[TokenPartition]:
+        """
+        Detach and drop every partition whose range ended, and whose tokens all
+        expired and stopped being refreshable, at least ``older_than`` ago.
+        Returns the affected partitions.
+
+        With ARCHIVE_EXPIRED_TOKENS, the rows are archived in the same
+        transaction first. With ``detach_only``, detached tables are kept.
+        """
+        cutoff = timezone.now() - (older_than or timedelta(0))
+        expired = [
+            partition
+            for partition in self.list_partitions()
+            if partition.end <= cutoff and not self._has_live_tokens(partition, cutoff)
+        ]
+        if dry_run:
+            return expired
+
+        for partition in expired:
+            with transaction.atomic(using=self.using):
+                if authentify_settings.ARCHIVE_EXPIRED_TOKENS:
+                    self._rows(partition).archive()
+                with self.connection.cursor() as cursor:
+                    cursor.execute(
+                        f"ALTER TABLE {self.quote(self.table)} "
+                        f"DETACH PARTITION {self.quote(partition.name)}"
+                    )
+                    if not detach_only:
+                        cursor.execute(f"DROP TABLE {self.quote(partition.name)}")
+        return expired
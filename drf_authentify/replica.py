@@ -0,0 +1,99 @@
+from django.db import router, transaction
+from django.core.cache import caches
+from django.utils import timezone
+
+from drf_authentify.compat import Optional, TYPE_CHECKING
+from drf_authentify.settings import authentify_settings
+
+if TYPE_CHECKING:
+    from drf_authentify.models import TokenType
+
+RECENT_KEY_PREFIX = "drf_authentify:recent:"
+
+
+class ReadReplica:
+    """
+    Routes token verification reads to READ_DATABASE_ALIAS.
+
+    A replica can lag behind the primary, so a token missing there is only
+    rejected outright if it cannot be that new: issued hashes are marked in the
+    shared cache for READ_REPLICA_MAX_LAG, and a miss on a marked hash, or on a
+    token whose replicated expiry passed within that window (it may have been
+    auto-refreshed since), is retried on the primary.
+    """
+
+    @property
+    def alias(self) -> Optional[str]:
+        return authentify_settings.READ_DATABASE_ALIAS
+
+    @property
+    def enabled(self) -> bool:
+        return self.alias is not None
+
+    @property
+    def backend(self):
+        return caches[authentify_settings.CACHE_ALIAS]
+
+    @property
+    def max_lag(self):
+        return authentify_settings.READ_REPLICA_MAX_LAG
+
+    def record_issued(self, hashed_tokens) -> None:
+        """
+        Mark newly issued hashes as possibly not replicated yet, once the
+        surrounding transaction commits.
+        """
+        keys = self._recent_keys(hashed_tokens)
+        if keys:
+            transaction.on_commit(
+                lambda: self.backend.set_many(keys, self.max_lag.total_seconds())
+            )
+
+    async def arecord_issued(self, hashed_tokens) -> None:
+        """
+        Async counterpart of record_issued, for rows that are already committed.
+        """
+        keys = self._recent_keys(hashed_tokens)
+        if keys:
+            await self.backend.aset_many(keys, self.max_lag.total_seconds())
+
+    def _recent_keys(self, hashed_tokens) -> dict:
+        if not self.enabled:
+            return {}
+        return {f"{RECENT_KEY_PREFIX}{hashed}": True for hashed in hashed_tokens}
+
+    def should_retry(self, token: Optional["TokenType"], hashed_tokens) -> bool:
+        """
+        Return True if a replica result that is missing or expired may be stale.
+        ``hashed_tokens`` are the hashes of the presented token.
+        """
+        if token is not None:
+            return self._recently_lapsed(token)
+        keys = [f"{RECENT_KEY_PREFIX}{hashed}" for hashed in hashed_tokens]
+        return bool(self.backend.get_many(keys))
+
+    async def ashould_retry(self, token: Optional["TokenType"], hashed_tokens) -> bool:
+        """Async counterpart of should_retry."""
+        if token is not None:
+            return self._recently_lapsed(token)
+        keys = [f"{RECENT_KEY_PREFIX}{hashed}" for hashed in hashed_tokens]
+        return bool(await self.backend.aget_many(keys))
+
+    def _recently_lapsed(self, token: "TokenType") -> bool:
+        return (
+            token.expires_at is not None
+            and token.expires_at > timezone.now() - self.max_lag
+        )
+
+    @staticmethod
+    def to_primary(*instances) -> None:
+        """
+        Point instances read from the replica at the primary, so saving them
+        never writes to the replica.
+        """
+        for instance in instances:
+            # No instance hint: the default router would return the replica.
+            instance._state.db = router.db_for_write(instance.__class__)
+
+
+read_replica = ReadReplica()
@@ -1,17 +1,12 @@
 from datetime import timedelta
 
-from django.utils import timezone
+from asgiref.sync import sync_to_async
 
 from drf_authentify.choices import AUTH_TYPES
-from drf_authentify.types import IssuedTokens
-from drf_authentify.compat import Union, Optional
-from drf_authentify.settings import authentify_settings
-from drf_authentify.utils.tokens import hash_token_string
-from drf_authentify.models import TokenType, get_token_model
-
-
-# Get the current token model
-AuthToken = get_token_model()
+from drf_authentify.types import IssuedTokens, PurgeResult
+from drf_authentify.storage import get_token_storage
+from drf_authentify.compat import Union, Optional, Callable
+from drf_authentify.models import TokenType
 
 
 class TokenService:
@@ -27,7 +22,7 @@ class TokenService:
         Generate and return a token and refresh token (if applicable), based on the auth type and expiration settings.
         Accepts expires_in as a timedelta object.
         """
-        return AuthToken.objects.create_token(
+        return get_token_storage().issue(
             user,
             auth_type,
             context=context,
@@ -79,6 +74,32 @@ class TokenService:
             ),
         )
 
+    @staticmethod
+    def generate_tokens_bulk(
+        users,
+        auth_type: AUTH_TYPES,
+        context: Optional[dict] = None,
+        access_expires_in: Optional[int] = None,
+        refresh_expires_in: Optional[int] = None,
+        batch_size: int = 1000,
+    ) -> list[IssuedTokens]:
+        """
+        Generate one token per user with batched inserts, returning the issued
+        tokens in the same order. Expiration times are in seconds.
+        """
+        access_ttl = timedelta(seconds=access_expires_in) if access_expires_in else None
+        refresh_ttl = (
+            timedelta(seconds=refresh_expires_in) if refresh_expires_in else None
+        )
+        return get_token_storage().issue_many(
+            users,
+            auth_type,
+            context=context,
+            access_expires_in=access_ttl,
+            refresh_expires_in=refresh_ttl,
+            batch_size=batch_size,
+        )
+
     @staticmethod
     def verify_token(
         token: str, auth_type: AUTH_TYPES = None
@@ -86,44 +107,90 @@ class TokenService:
         """
         Verify if the provided token is valid and not expired.
         """
-        hashed_token = hash_token_string(token)
-        filters = {"access_token_hash": hashed_token}
-
-        if auth_type:
-            filters["auth_type"] = auth_type
+        token_instance = get_token_storage().verify(token)
+        if token_instance is None:
+            return None
+        return TokenService._match_auth_type(token_instance, auth_type)
 
-        return (
-            AuthToken.objects.active().filter(**filters).select_related("user").first()
-        )
+    @staticmethod
+    def _match_auth_type(
+        token: TokenType, auth_type: Optional[AUTH_TYPES]
+    ) -> Optional[TokenType]:
+        if auth_type and token.auth_type != auth_type:
+            return None
+        return token
 
     @staticmethod
     def revoke_token(token: TokenType) -> None:
         """
         Revoke a single token.
         """
-        AuthToken.objects.filter(id=token.id).delete()
+        get_token_storage().revoke(token)
 
     @staticmethod
     def revoke_all_user_tokens(user) -> None:
         """
         Revoke all tokens for a specific user.
         """
-        if user and user.is_authenticated:
-            AuthToken.objects.filter(user=user).delete()
+        if not (user and user.is_authenticated):
+            return
+
+        get_token_storage().revoke_user(user)
+
+    @staticmethod
+    def revoke_tokens_bulk(users=None, token_ids=None) -> int:
+        """
+        Revoke all tokens of the given users and/or the tokens with the given ids
+        in a single statement (per shard). Returns the number of revoked tokens;
+        storage engines that cannot count revocations add nothing to it.
+        """
+        return get_token_storage().revoke_many(users=users, token_ids=token_ids)
 
     @staticmethod
     def revoke_all_expired_user_tokens(user) -> None:
         """
         Revoke all expired tokens for a specific user.
         """
-        AuthToken.objects.for_user(user).expired().delete()
+        get_token_storage().purge(user=user)
 
     @staticmethod
     def revoke_expired_tokens() -> None:
         """
         Revoke all expired tokens.
         """
-        AuthToken.objects.delete_expired()
+        get_token_storage().delete_expired()
+
+    @staticmethod
+    def purge_expired_tokens(
+        batch_size: int = 1000,
+        sleep: float = 0,
+        time_budget: Optional[timedelta] = None,
+        older_than: Optional[timedelta] = None,
+        dry_run: bool = False,
+        progress: Optional[Callable[[PurgeResult], None]] = None,
+        archive: Optional[bool] = None,
+        user=None,
+    ) -> PurgeResult:
+        """
+        Delete expired and revoked tokens in bounded batches. Unlike
+        revoke_expired_tokens, this is safe to run against a large, live table.
+        With ARCHIVE_EXPIRED_TOKENS (or ``archive``), they are moved to
+        ARCHIVE_MODEL instead. Also drops denylist entries of signed tokens
+        that have expired. With TOKEN_SHARDS, shards are purged one after the
+        other, sharing ``time_budget``, and the result covers all of them.
+        With ``user``, only that user's tokens are purged.
+        Other storage engines purge in one go, ignoring the batching arguments.
+        """
+        return get_token_storage().purge(
+            older_than=older_than,
+            dry_run=dry_run,
+            user=user,
+            batch_size=batch_size,
+            sleep=sleep,
+            time_budget=time_budget,
+            progress=progress,
+            archive=archive,
+        )
 
     @staticmethod
     def refresh_token(
@@ -134,39 +201,78 @@ class TokenService:
         """
         Refresh an auth token using a valid refresh token.
         Returns (raw_token, raw_refresh_token, new_token_instance), or None if invalid.
-        """
-        hashed_refresh = hash_token_string(refresh_token)
 
-        # Find the token with the given refresh token that is still valid
-        token = (
-            AuthToken.objects.refreshable()
-            .filter(refresh_token_hash=hashed_refresh)
-            .first()
+        The engine revokes the old token, so a refresh token can be used once.
+        """
+        return get_token_storage().refresh(
+            refresh_token,
+            access_expires_in=(
+                timedelta(seconds=access_expires_in) if access_expires_in else None
+            ),
+            refresh_expires_in=(
+                timedelta(seconds=refresh_expires_in) if refresh_expires_in else None
+            ),
         )
 
-        if not token:
-            return None  # Invalid or expired refresh token
-
-        user = token.user
-        context = token.context
-        auth_type = token.auth_type
-
-        # Delete old token
-        if authentify_settings.KEEP_EXPIRED_TOKENS:
-            now = timezone.now()
-            old_date = now - timedelta(days=1)
-            token.revoked_at = now
-            token.expires_at = old_date
-            token.refresh_until = old_date
-            token.save(update_fields=["revoked_at", "expires_at", "refresh_until"])
-        else:
-            token.delete()
-
-        # Create new token
-        return TokenService._generate_auth_token(
+    # Async API
+    #
+    # Counterparts of the methods above for async views. They call the async
+    # methods of the storage engine; the ORM engine uses Django's async ORM and
+    # the async methods of the cache layers, so no cache round trip blocks the
+    # event loop.
+
+    @staticmethod
+    async def _agenerate_auth_token(
+        user,
+        auth_type: AUTH_TYPES,
+        context: Optional[dict] = None,
+        access_expires_in: Optional[timedelta] = None,
+        refresh_expires_in: Optional[timedelta] = None,
+    ) -> IssuedTokens:
+        return await get_token_storage().aissue(
             user,
             auth_type,
             context=context,
+            access_expires_in=access_expires_in,
+            refresh_expires_in=refresh_expires_in,
+        )
+
+    @staticmethod
+    async def agenerate_cookie_token(
+        user,
+        context: Optional[dict] = None,
+        access_expires_in: Optional[int] = None,
+        refresh_expires_in: Optional[int] = None,
+    ) -> IssuedTokens:
+        """
+        Async counterpart of generate_cookie_token.
+        """
+        return await TokenService._agenerate_auth_token(
+            user,
+            AUTH_TYPES.COOKIE,
+            context=context,
+            access_expires_in=(
+                timedelta(seconds=access_expires_in) if access_expires_in else None
+            ),
+            refresh_expires_in=(
+                timedelta(seconds=refresh_expires_in) if refresh_expires_in else None
+            ),
+        )
+
+    @staticmethod
+    async def agenerate_header_token(
+        user,
+        context: Optional[dict] = None,
+        access_expires_in: Optional[int] = None,
+        refresh_expires_in: Optional[int] = None,
+    ) -> IssuedTokens:
+        """
+        Async counterpart of generate_header_token.
+        """
+        return await TokenService._agenerate_auth_token(
+            user,
+            AUTH_TYPES.HEADER,
+            context=context,
             access_expires_in=(
                 timedelta(seconds=access_expires_in) if access_expires_in else None
             ),
@@ -174,3 +280,49 @@ class TokenService:
                 timedelta(seconds=refresh_expires_in) if refresh_expires_in else None
             ),
         )
+
+    @staticmethod
+    async def averify_token(
+        token: str, auth_type: AUTH_TYPES = None
+    ) -> Union[TokenType, None]:
+        """
+        Async counterpart of verify_token.
+        """
+        token_instance = await get_token_storage().averify(token)
+        if token_instance is None:
+            return None
+        return TokenService._match_auth_type(token_instance, auth_type)
+
+    @staticmethod
+    async def arevoke_token(token: TokenType) -> None:
+        """
+        Async counterpart of revoke_token.
+        """
+        await get_token_storage().arevoke(token)
+
+    @staticmethod
+    async def arevoke_all_user_tokens(user) -> None:
+        """
+        Async counterpart of revoke_all_user_tokens.
+        """
+        if not (user and user.is_authenticated):
+            return
+
+        await get_token_storage().arevoke_user(user)
+
+    @staticmethod
+    async def arefresh_token(
+        refresh_token: str,
+        access_expires_in: Optional[int] = None,
+        refresh_expires_in: Optional[int] = None,
+    ) -> Optional[IssuedTokens]:
+        """
+        Async counterpart of refresh_token.
+        """
+        # Rotation must be atomic, and the async ORM cannot open transactions,
+        # so this runs the transactional sync version.
+        return await sync_to_async(TokenService.refresh_token)(
+            refresh_token,
+            access_expires_in=access_expires_in,
+            refresh_expires_in=refresh_expires_in,
+        )
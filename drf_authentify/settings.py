@@ -2,49 +2,158 @@ import hashlib
 from datetime import timedelta
 from rest_framework.settings import APISettings
 
+from django.apps import apps
 from django.conf import settings
 from django.test.signals import setting_changed
+from django.utils.module_loading import import_string
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ImproperlyConfigured
 
+from drf_authentify.compat import Optional, Callable
+from drf_authentify.utils.imports import compile_handlers
 
 DEFAULTS = {
     "TOKEN_TTL": timedelta(hours=24),
     "REFRESH_TOKEN_TTL": timedelta(days=7),
+    "REFRESH_GRACE_PERIOD": None,
     "AUTO_REFRESH": False,
     "AUTO_REFRESH_MAX_TTL": None,
     "AUTO_REFRESH_INTERVAL": None,
+    "AUTO_REFRESH_JITTER": 0.0,
+    "AUTO_REFRESH_WRITE_BEHIND": False,
+    "AUTO_REFRESH_FLUSH_INTERVAL": timedelta(seconds=5),
+    "AUTO_REFRESH_FLUSH_SIZE": 500,
     "TOKEN_MODEL": "drf_authentify.AuthToken",
     "AUTH_COOKIE_NAMES": ["token"],
     "AUTH_HEADER_PREFIXES": ["Bearer", "Token"],
     "SECURE_HASH_ALGORITHM": "sha256",
+    "LEGACY_HASH_ALGORITHMS": [],
+    "TOKEN_HASH_PEPPER": None,
+    "TOKEN_FORMAT": "opaque",
+    "SIGNED_TOKEN_DENYLIST_SYNC_INTERVAL": timedelta(seconds=30),
     "ENFORCE_SINGLE_LOGIN": False,
+    "SINGLE_LOGIN_LOCK_TIMEOUT": timedelta(seconds=5),
     "STRICT_CONTEXT_ACCESS": False,
     "ENABLE_AUTH_RESTRICTION": True,
     "KEEP_EXPIRED_TOKENS": False,
+    "ARCHIVE_EXPIRED_TOKENS": False,
+    "ARCHIVE_MODEL": "drf_authentify.ArchivedAuthToken",
     "POST_AUTH_HANDLER": None,
     "POST_AUTO_REFRESH_HANDLER": None,
+    "CACHE_ALIAS": "default",
+    "VERIFY_CACHE_ENABLED": False,
+    "VERIFY_CACHE_TTL": timedelta(minutes=5),
+    "LOCAL_CACHE_ENABLED": False,
+    "LOCAL_CACHE_MAX_SIZE": 1024,
+    "LOCAL_CACHE_TTL": timedelta(seconds=30),
+    "LOCAL_CACHE_SYNC_INTERVAL": timedelta(seconds=1),
+    "NEGATIVE_CACHE_ENABLED": False,
+    "NEGATIVE_CACHE_TTL": timedelta(seconds=60),
+    "BLOOM_FILTER_ENABLED": False,
+    "BLOOM_FILTER_CAPACITY": 1_000_000,
+    "BLOOM_FILTER_ERROR_RATE": 0.01,
+    "BLOOM_FILTER_REFRESH_INTERVAL": timedelta(minutes=15),
+    "JANITOR_ENABLED": False,
+    "JANITOR_INTERVAL": timedelta(minutes=5),
+    "JANITOR_MAX_INTERVAL": timedelta(hours=1),
+    "JANITOR_EXPIRED_RATIO": 0.1,
+    "JANITOR_SAMPLE_SIZE": 1000,
+    "JANITOR_BATCH_SIZE": 500,
+    "JANITOR_BATCH_SLEEP": timedelta(milliseconds=100),
+    "JANITOR_TIME_BUDGET": timedelta(seconds=30),
+    "JANITOR_RETENTION": None,
+    "TOKEN_PARTITION_KEY": "created_at",
+    "TOKEN_PARTITION_INTERVAL": timedelta(days=1),
+    "TOKEN_PARTITION_PREMAKE": 7,
+    "READ_DATABASE_ALIAS": None,
+    "READ_REPLICA_MAX_LAG": timedelta(seconds=5),
+    "TOKEN_SHARDS": [],
+    "TOKEN_STORAGE": "drf_authentify.storage.ORMTokenStorage",
 }
 
 EXPECTED_TYPES = {
     "TOKEN_TTL": (timedelta, type(None)),
     "REFRESH_TOKEN_TTL": (timedelta, type(None)),
+    "REFRESH_GRACE_PERIOD": (timedelta, type(None)),
     "AUTO_REFRESH": bool,
     "AUTO_REFRESH_MAX_TTL": (timedelta, type(None)),
     "AUTO_REFRESH_INTERVAL": (timedelta, type(None)),
+    "AUTO_REFRESH_JITTER": float,
+    "AUTO_REFRESH_WRITE_BEHIND": bool,
+    "AUTO_REFRESH_FLUSH_INTERVAL": timedelta,
+    "AUTO_REFRESH_FLUSH_SIZE": int,
     "TOKEN_MODEL": str,
     "AUTH_COOKIE_NAMES": list,
     "AUTH_HEADER_PREFIXES": list,
     "SECURE_HASH_ALGORITHM": str,
+    "LEGACY_HASH_ALGORITHMS": list,
+    "TOKEN_HASH_PEPPER": (str, type(None)),
+    "TOKEN_FORMAT": str,
+    "SIGNED_TOKEN_DENYLIST_SYNC_INTERVAL": timedelta,
     "ENFORCE_SINGLE_LOGIN": bool,
+    "SINGLE_LOGIN_LOCK_TIMEOUT": timedelta,
     "STRICT_CONTEXT_ACCESS": bool,
     "ENABLE_AUTH_RESTRICTION": bool,
     "KEEP_EXPIRED_TOKENS": bool,
-    "POST_AUTH_HANDLER": (str, type(None)),
-    "POST_AUTO_REFRESH_HANDLER": (str, type(None)),
+    "ARCHIVE_EXPIRED_TOKENS": bool,
+    "ARCHIVE_MODEL": str,
+    "POST_AUTH_HANDLER": (str, list, type(None)),
+    "POST_AUTO_REFRESH_HANDLER": (str, list, type(None)),
+    "CACHE_ALIAS": str,
+    "VERIFY_CACHE_ENABLED": bool,
+    "VERIFY_CACHE_TTL": timedelta,
+    "LOCAL_CACHE_ENABLED": bool,
+    "LOCAL_CACHE_MAX_SIZE": int,
+    "LOCAL_CACHE_TTL": timedelta,
+    "LOCAL_CACHE_SYNC_INTERVAL": timedelta,
+    "NEGATIVE_CACHE_ENABLED": bool,
+    "NEGATIVE_CACHE_TTL": timedelta,
+    "BLOOM_FILTER_ENABLED": bool,
+    "BLOOM_FILTER_CAPACITY": int,
+    "BLOOM_FILTER_ERROR_RATE": float,
+    "BLOOM_FILTER_REFRESH_INTERVAL": timedelta,
+    "JANITOR_ENABLED": bool,
+    "JANITOR_INTERVAL": timedelta,
+    "JANITOR_MAX_INTERVAL": timedelta,
+    "JANITOR_EXPIRED_RATIO": float,
+    "JANITOR_SAMPLE_SIZE": int,
+    "JANITOR_BATCH_SIZE": int,
+    "JANITOR_BATCH_SLEEP": timedelta,
+    "JANITOR_TIME_BUDGET": timedelta,
+    "JANITOR_RETENTION": (timedelta, type(None)),
+    "TOKEN_PARTITION_KEY": str,
+    "TOKEN_PARTITION_INTERVAL": timedelta,
+    "TOKEN_PARTITION_PREMAKE": int,
+    "READ_DATABASE_ALIAS": (str, type(None)),
+    "READ_REPLICA_MAX_LAG": timedelta,
+    "TOKEN_SHARDS": list,
+    "TOKEN_STORAGE": str,
 }
 
 
+TOKEN_FORMATS = ("opaque", "selector", "signed")
+TOKEN_PARTITION_KEYS = ("created_at", "expires_at")
+
+# Keyed hash schemes, accepted alongside plain hashlib algorithm names.
+HMAC_SCHEME_PREFIX = "hmac-"
+KEYED_BLAKE2B_SCHEME = "blake2b-keyed"
+
+# Handler settings, and whether their handlers are called with keyword arguments.
+HANDLER_SETTINGS = {
+    "POST_AUTH_HANDLER": True,
+    "POST_AUTO_REFRESH_HANDLER": False,
+}
+
+
+def is_valid_hash_scheme(value: str) -> bool:
+    value = value.lower()
+    if value == KEYED_BLAKE2B_SCHEME:
+        return True
+    if value.startswith(HMAC_SCHEME_PREFIX):
+        value = value[len(HMAC_SCHEME_PREFIX) :]
+    return value in hashlib.algorithms_available
+
+
 USER_SETTINGS = getattr(settings, "DRF_AUTHENTIFY", None)
 authentify_settings = APISettings(USER_SETTINGS, DEFAULTS)
 
@@ -73,14 +182,96 @@ def validate_authentify_settings():
                     _(f"All items in DRF_AUTHENTIFY setting '{key}' must be strings.")
                 )
 
+        if key == "TOKEN_SHARDS":
+            if not all(isinstance(v, str) for v in value):
+                raise ImproperlyConfigured(
+                    _(f"All items in DRF_AUTHENTIFY setting '{key}' must be strings.")
+                )
+            if len(set(value)) != len(value):
+                raise ImproperlyConfigured(
+                    _(f"DRF_AUTHENTIFY setting '{key}' cannot list an alias twice.")
+                )
+            missing = [alias for alias in value if alias not in settings.DATABASES]
+            if missing:
+                raise ImproperlyConfigured(
+                    _(
+                        f"DRF_AUTHENTIFY setting '{key}' names databases not defined "
+                        f"in DATABASES: {', '.join(missing)}."
+                    )
+                )
+
+        if key in HANDLER_SETTINGS and isinstance(value, list):
+            if not all(isinstance(v, str) for v in value):
+                raise ImproperlyConfigured(
+                    _(f"All items in DRF_AUTHENTIFY setting '{key}' must be strings.")
+                )
+
         # 3 Validate hashlib algorithm
-        if key == "SECURE_HASH_ALGORITHM" and value not in hashlib.algorithms_available:
+        if key == "SECURE_HASH_ALGORITHM":
+            values = [value]
+        elif key == "LEGACY_HASH_ALGORITHMS":
+            if not all(isinstance(v, str) for v in value):
+                raise ImproperlyConfigured(
+                    _(f"All items in DRF_AUTHENTIFY setting '{key}' must be strings.")
+                )
+            values = value
+        else:
+            values = []
+        for algorithm in values:
+            if not is_valid_hash_scheme(algorithm):
+                raise ImproperlyConfigured(
+                    _(
+                        f"DRF_AUTHENTIFY setting '{key}' must be a valid hashlib algorithm, "
+                        f"'{HMAC_SCHEME_PREFIX}<algorithm>' or '{KEYED_BLAKE2B_SCHEME}'. "
+                        f"'{algorithm}' is not found in hashlib."
+                    )
+                )
+
+        if key == "TOKEN_FORMAT" and value not in TOKEN_FORMATS:
             raise ImproperlyConfigured(
                 _(
-                    f"DRF_AUTHENTIFY setting '{key}' must be a valid hashlib algorithm. "
-                    f"'{value}' is not found in hashlib."
+                    f"DRF_AUTHENTIFY setting '{key}' must be one of: "
+                    f"{', '.join(TOKEN_FORMATS)}."
                 )
             )
+        if key == "TOKEN_PARTITION_KEY" and value not in TOKEN_PARTITION_KEYS:
+            raise ImproperlyConfigured(
+                _(
+                    f"DRF_AUTHENTIFY setting '{key}' must be one of: "
+                    f"{', '.join(TOKEN_PARTITION_KEYS)}."
+                )
+            )
+
+        # Positive integer validation
+        if (
+            key
+            in (
+                "LOCAL_CACHE_MAX_SIZE",
+                "BLOOM_FILTER_CAPACITY",
+                "JANITOR_SAMPLE_SIZE",
+                "JANITOR_BATCH_SIZE",
+                "AUTO_REFRESH_FLUSH_SIZE",
+                "TOKEN_PARTITION_PREMAKE",
+            )
+            and value <= 0
+        ):
+            raise ImproperlyConfigured(
+                _(f"DRF_AUTHENTIFY setting '{key}' must be positive.")
+            )
+
+        # Probability validation
+        if key == "BLOOM_FILTER_ERROR_RATE" and not 0 < value < 1:
+            raise ImproperlyConfigured(
+                _(f"DRF_AUTHENTIFY setting '{key}' must be between 0 and 1.")
+            )
+        if key == "AUTO_REFRESH_JITTER" and not 0 <= value < 1:
+            raise ImproperlyConfigured(
+                _(f"DRF_AUTHENTIFY setting '{key}' must be at least 0 and below 1.")
+            )
+        if key == "JANITOR_EXPIRED_RATIO" and not 0 < value <= 1:
+            raise ImproperlyConfigured(
+                _(f"DRF_AUTHENTIFY setting '{key}' must be between 0 and 1.")
+            )
 
         # Timedelta validation
         if (
@@ -88,8 +279,22 @@ def validate_authentify_settings():
             in (
                 "TOKEN_TTL",
                 "REFRESH_TOKEN_TTL",
+                "REFRESH_GRACE_PERIOD",
                 "AUTO_REFRESH_MAX_TTL",
                 "AUTO_REFRESH_INTERVAL",
+                "AUTO_REFRESH_FLUSH_INTERVAL",
+                "VERIFY_CACHE_TTL",
+                "LOCAL_CACHE_TTL",
+                "LOCAL_CACHE_SYNC_INTERVAL",
+                "NEGATIVE_CACHE_TTL",
+                "BLOOM_FILTER_REFRESH_INTERVAL",
+                "JANITOR_INTERVAL",
+                "JANITOR_MAX_INTERVAL",
+                "JANITOR_TIME_BUDGET",
+                "JANITOR_RETENTION",
+                "SINGLE_LOGIN_LOCK_TIMEOUT",
+                "SIGNED_TOKEN_DENYLIST_SYNC_INTERVAL",
+                "READ_REPLICA_MAX_LAG",
             )
             and value is not None
         ):
@@ -104,6 +309,13 @@ def validate_authentify_settings():
                     )
                 )
 
+        if key == "TOKEN_PARTITION_INTERVAL" and (
+            value <= timedelta(0) or value % timedelta(days=1)
+        ):
+            raise ImproperlyConfigured(
+                _(f"DRF_AUTHENTIFY setting '{key}' must be a whole number of days.")
+            )
+
     # Logical validations
     token_ttl = authentify_settings.TOKEN_TTL
     auto_refresh = authentify_settings.AUTO_REFRESH
@@ -118,6 +330,63 @@ def validate_authentify_settings():
             )
         )
 
+    if (
+        authentify_settings.VERIFY_CACHE_ENABLED
+        or authentify_settings.LOCAL_CACHE_ENABLED
+        or authentify_settings.NEGATIVE_CACHE_ENABLED
+        or authentify_settings.BLOOM_FILTER_ENABLED
+        or authentify_settings.JANITOR_ENABLED
+        or authentify_settings.REFRESH_GRACE_PERIOD is not None
+        or authentify_settings.READ_DATABASE_ALIAS is not None
+    ) and authentify_settings.CACHE_ALIAS not in settings.CACHES:
+        raise ImproperlyConfigured(
+            _(
+                f"DRF_AUTHENTIFY setting CACHE_ALIAS '{authentify_settings.CACHE_ALIAS}' "
+                "is not defined in CACHES."
+            )
+        )
+
+    read_alias = authentify_settings.READ_DATABASE_ALIAS
+    if read_alias is not None and read_alias not in settings.DATABASES:
+        raise ImproperlyConfigured(
+            _(
+                f"DRF_AUTHENTIFY setting READ_DATABASE_ALIAS '{read_alias}' "
+                "is not defined in DATABASES."
+            )
+        )
+
+    if read_alias is not None and authentify_settings.TOKEN_SHARDS:
+        raise ImproperlyConfigured(
+            _(
+                "DRF_AUTHENTIFY setting READ_DATABASE_ALIAS cannot be combined with "
+                "TOKEN_SHARDS."
+            )
+        )
+
+    if authentify_settings.JANITOR_MAX_INTERVAL < authentify_settings.JANITOR_INTERVAL:
+        raise ImproperlyConfigured(
+            _(
+                "DRF_AUTHENTIFY setting JANITOR_MAX_INTERVAL cannot be shorter than JANITOR_INTERVAL."
+            )
+        )
+
+    if authentify_settings.TOKEN_FORMAT == "signed":
+        if not token_ttl:
+            raise ImproperlyConfigured(
+                _("DRF_AUTHENTIFY setting TOKEN_FORMAT 'signed' requires TOKEN_TTL.")
+            )
+        if auto_refresh:
+            raise ImproperlyConfigured(
+                _(
+                    "DRF_AUTHENTIFY setting AUTO_REFRESH cannot be enabled with "
+                    "TOKEN_FORMAT 'signed': signed tokens carry a fixed expiry."
+                )
+            )
+
+    # Engines may import models, so they are checked once apps are ready.
+    if apps.ready:
+        validate_token_storage()
+
     if auto_refresh:
         missing = []
         if not refresh_ttl:
@@ -134,11 +403,62 @@ def validate_authentify_settings():
             )
 
 
+def validate_token_storage():
+    """Check that the TOKEN_STORAGE engine supports the other settings."""
+    path = authentify_settings.TOKEN_STORAGE
+    try:
+        engine = import_string(path)
+    except ImportError as e:
+        raise ImproperlyConfigured(
+            _(f"DRF_AUTHENTIFY setting TOKEN_STORAGE '{path}' cannot be imported.")
+        ) from e
+
+    incompatible = engine.incompatible_settings(authentify_settings)
+    if incompatible:
+        raise ImproperlyConfigured(
+            _(
+                f"DRF_AUTHENTIFY setting TOKEN_STORAGE '{path}' cannot be combined "
+                f"with: {', '.join(incompatible)}."
+            )
+        )
+
+
+_compiled_handlers = {}
+
+
+def get_handler(name: str, paths) -> Optional[Callable]:
+    """
+    Return the compiled handler (or handler chain) for a handler setting value.
+
+    Handlers are imported and validated once per distinct value, so the request
+    path is a dict lookup followed by a plain call.
+    """
+    key = (name, tuple(paths) if isinstance(paths, list) else paths)
+    try:
+        return _compiled_handlers[key]
+    except KeyError:
+        handler = compile_handlers(paths, name, keywords=HANDLER_SETTINGS[name])
+        _compiled_handlers[key] = handler
+        return handler
+
+
+def compile_authentify_handlers():
+    """Resolve and validate all configured handlers up front."""
+    _compiled_handlers.clear()
+    for name in HANDLER_SETTINGS:
+        get_handler(name, getattr(authentify_settings, name))
+
+
 def reload_authentify_settings(*args, **kwargs):
     global authentify_settings
     if kwargs["setting"] == "DRF_AUTHENTIFY":
         authentify_settings = APISettings(kwargs["value"], DEFAULTS)
         validate_authentify_settings()
+        compile_authentify_handlers()
+
+        from drf_authentify.storage import clear_token_storage
+
+        clear_token_storage()
 
 
 setting_changed.connect(reload_authentify_settings)
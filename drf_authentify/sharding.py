@@ -0,0 +1,90 @@
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections, router
+
+from drf_authentify.compat import Optional, Callable
+from drf_authentify.settings import authentify_settings
+
+SHARD_SEPARATOR = "~"
+
+
+class TokenShards:
+    """
+    Spreads tokens over the TOKEN_SHARDS database aliases.
+
+    A user's tokens are stored on the shard picked from a hash of the user's
+    primary key, and raw tokens are prefixed with the index of their shard,
+    ``<index>~<token>``, so verification and refresh go straight to the right
+    database. Operations over a user's (or all) tokens run on every shard and
+    merge the results, so tokens stored under an earlier shard layout are
+    still found.
+    """
+
+    @property
+    def aliases(self) -> list[str]:
+        return authentify_settings.TOKEN_SHARDS
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.aliases)
+
+    @staticmethod
+    def default_alias() -> str:
+        from drf_authentify.models import get_token_model
+
+        return router.db_for_write(get_token_model())
+
+    def all(self) -> list[str]:
+        """Return the aliases holding tokens: the shards, or the default one."""
+        return list(self.aliases) or [self.default_alias()]
+
+    def for_user(self, user) -> str:
+        """Return the shard new tokens of ``user`` are stored on."""
+        aliases = self.aliases
+        return aliases[zlib.crc32(str(user.pk).encode("utf-8")) % len(aliases)]
+
+    def embed(self, alias: str, raw_token: Optional[str]) -> Optional[str]:
+        """Prefix a raw token stored on ``alias`` with the shard index."""
+        if raw_token is None or alias not in self.aliases:
+            return raw_token
+        return f"{self.aliases.index(alias)}{SHARD_SEPARATOR}{raw_token}"
+
+    def split(self, raw_token: str) -> tuple[Optional[str], str]:
+        """
+        Return (alias, token without prefix) for a presented raw token. Tokens
+        without a prefix, issued before sharding was enabled, belong to the
+        default alias. The alias is None if the prefix names no shard.
+        """
+        prefix, separator, rest = raw_token.partition(SHARD_SEPARATOR)
+        if not separator or not self.enabled:
+            return self.default_alias(), raw_token
+        if prefix.isdigit() and int(prefix) < len(self.aliases):
+            return self.aliases[int(prefix)], rest
+        return None, rest
+
+    def fan_out(self, func: Callable[[str], object]) -> list:
+        """
+        Call ``func(alias)`` for every alias in all() and return the results in
+        the same order. Shards are handled in parallel threads, except inside an
+        atomic block, whose uncommitted rows other threads could not see.
+        """
+        aliases = self.all()
+        if len(aliases) == 1 or any(
+            connections[alias].in_atomic_block for alias in aliases
+        ):
+            return [func(alias) for alias in aliases]
+
+        def run(alias):
+            try:
+                return func(alias)
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(
+            max_workers=len(aliases), thread_name_prefix="drf-authentify-shard"
+        ) as executor:
+            return list(executor.map(run, aliases))
+
+
+token_shards = TokenShards()
@@ -0,0 +1,1152 @@
+import hmac
+import heapq
+import asyncio
+import secrets
+import itertools
+import threading
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from drf_authentify.choices import AUTH_TYPES
+from drf_authentify.cache import token_cache, negative_cache, refresh_grace
+from drf_authentify.types import IssuedTokens, PurgeResult
+from drf_authentify.replica import read_replica
+from drf_authentify.sharding import token_shards
+from drf_authentify.denylist import signed_token_denylist
+from drf_authentify.compat import Optional, Callable
+from drf_authentify.settings import authentify_settings
+from drf_authentify.utils.tokens import (
+    get_hash_scheme,
+    get_hash_schemes,
+    is_signed_token,
+    hash_token_string,
+    load_signed_token,
+    get_token_selector,
+)
+from drf_authentify.models import TokenType, get_token_model
+
+# Get the current token model
+AuthToken = get_token_model()
+
+STORAGE_KEY_PREFIX = "drf_authentify:store:"
+
+# Settings that need the token table; engines without it refuse them.
+ORM_ONLY_SETTINGS = (
+    "AUTO_REFRESH",
+    "REFRESH_GRACE_PERIOD",
+    "KEEP_EXPIRED_TOKENS",
+    "ARCHIVE_EXPIRED_TOKENS",
+    "READ_DATABASE_ALIAS",
+    "TOKEN_SHARDS",
+    "VERIFY_CACHE_ENABLED",
+    "LOCAL_CACHE_ENABLED",
+    "NEGATIVE_CACHE_ENABLED",
+    "BLOOM_FILTER_ENABLED",
+)
+
+
+class BaseTokenStorage:
+    """
+    Interface of a token storage engine, selected with TOKEN_STORAGE.
+
+    TokenService hands every operation to the engine: issuing, verification,
+    refresh, revocation and purging. Raw tokens go in and token instances come
+    out, so callers never see how the engine stores them. The async methods
+    run the sync ones in a thread unless an engine overrides them.
+    """
+
+    @classmethod
+    def incompatible_settings(cls, settings) -> list[str]:
+        """
+        Return the enabled settings this engine cannot honour. Checked when
+        settings are validated, so engines never ignore a setting silently.
+        """
+        return []
+
+    def issue(
+        self,
+        user,
+        auth_type: AUTH_TYPES,
+        context: Optional[dict] = None,
+        access_expires_in: Optional[timedelta] = None,
+        refresh_expires_in: Optional[timedelta] = None,
+    ) -> IssuedTokens:
+        raise NotImplementedError
+
+    async def aissue(
+        self,
+        user,
+        auth_type: AUTH_TYPES,
+        context: Optional[dict] = None,
+        access_expires_in: Optional[timedelta] = None,
+        refresh_expires_in: Optional[timedelta] = None,
+    ) -> IssuedTokens:
+        return await sync_to_async(self.issue)(
+            user,
+            auth_type,
+            context=context,
+            access_expires_in=access_expires_in,
+            refresh_expires_in=refresh_expires_in,
+        )
+
+    def issue_many(
+        self,
+        users,
+        auth_type: AUTH_TYPES,
+        context: Optional[dict] = None,
+        access_expires_in: Optional[timedelta] = None,
+        refresh_expires_in: Optional[timedelta] = None,
+        batch_size: int = 1000,
+    ) -> list[IssuedTokens]:
+        """Issue one token per user, in the same order."""
+        return [
+            self.issue(
+                user,
+                auth_type,
+                context=context,
+                access_expires_in=access_expires_in,
+                refresh_expires_in=refresh_expires_in,
+            )
+            for user in users
+        ]
+
+    def verify(self, token: str) -> Optional[TokenType]:
+        """Return the live token matching the raw ``token``, with its user."""
+        raise NotImplementedError
+
+    async def averify(self, token: str) -> Optional[TokenType]:
+        return await sync_to_async(self.verify)(token)
+
+    def claim_refresh(self, refresh_token: str) -> Optional[TokenType]:
+        """
+        Consume the token a raw refresh token belongs to and return it, or None.
+        Of concurrent claims with the same refresh token, only one succeeds.
+        """
+        raise NotImplementedError
+
+    def refresh(
+        self,
+        refresh_token: str,
+        access_expires_in: Optional[timedelta] = None,
+        refresh_expires_in: Optional[timedelta] = None,
+    ) -> Optional[IssuedTokens]:
+        """
+        Exchange a raw refresh token for a new token with the same user, auth
+        type and context, or return None if it cannot be claimed.
+        """
+        token = self.claim_refresh(refresh_token)
+        if token is None:
+            return None
+        return self.issue(
+            token.user,
+            token.auth_type,
+            context=token.context,
+            access_expires_in=access_expires_in,
+            refresh_expires_in=refresh_expires_in,
+        )
+
+    def revoke(self, token: TokenType) -> None:
+        raise NotImplementedError
+
+    async def arevoke(self, token: TokenType) -> None:
+        await sync_to_async(self.revoke)(token)
+
+    def revoke_user(self, user) -> Optional[int]:
+        """
+        Revoke every token of ``user``. Returns the number of revoked tokens,
+        or None if the engine cannot count them.
+        """
+        raise NotImplementedError
+
+    async def arevoke_user(self, user) -> Optional[int]:
+        return await sync_to_async(self.revoke_user)(user)
+
+    def revoke_many(self, users=None, token_ids=None) -> int:
+        """
+        Revoke the tokens of ``users`` and/or the tokens with ``token_ids``.
+        Returns the number of revoked tokens, counting none for users the
+        engine cannot count.
+        """
+        if token_ids is not None:
+            raise ValueError("token_ids requires the ORM token storage.")
+        return sum(self.revoke_user(user) or 0 for user in users or ())
+
+    def delete_expired(self) -> None:
+        """Drop every expired token at once."""
+        self.purge()
+
+    def purge(
+        self,
+        older_than: Optional[timedelta] = None,
+        dry_run: bool = False,
+        user=None,
+        **options,
+    ) -> PurgeResult:
+        """
+        Drop tokens expired (for at least ``older_than``) or revoked; with
+        ``user``, only that user's. ``options`` are the batching arguments of
+        TokenService.purge_expired_tokens, for engines that purge in batches.
+        """
+        raise NotImplementedError
+
+
+class ORMTokenStorage(BaseTokenStorage):
+    """
+    The default engine: tokens are rows of TOKEN_MODEL, so every database
+    feature applies (verification caches, replicas, shards, signed tokens,
+    auto-refresh and archiving).
+    """
+
+    def issue(
+        self,
+        user,
+        auth_type: AUTH_TYPES,
+        context: Optional[dict] = None,
+        access_expires_in: Optional[timedelta] = None,
+        refresh_expires_in: Optional[timedelta] = None,
+        using: Optional[str] = None,
+    ) -> IssuedTokens:
+        return AuthToken.objects.db_manager(using).create_token(
+            user,
+            auth_type,
+            context=context,
+            access_expires_in=access_expires_in,
+            refresh_expires_in=refresh_expires_in,
+        )
+
+    async def aissue(
+        self,
+        user,
+        auth_type: AUTH_TYPES,
+        context: Optional[dict] = None,
+        access_expires_in: Optional[timedelta] = None,
+        refresh_expires_in: Optional[timedelta] = None,
+    ) -> IssuedTokens:
+        return await AuthToken.objects.acreate_token(
+            user,
+            auth_type,
+            context=context,
+            access_expires_in=access_expires_in,
+            refresh_expires_in=refresh_expires_in,
+        )
+
+    def issue_many(
+        self,
+        users,
+        auth_type: AUTH_TYPES,
+        context: Optional[dict] = None,
+        access_expires_in: Optional[timedelta] = None,
+        refresh_expires_in: Optional[timedelta] = None,
+        batch_size: int = 1000,
+    ) -> list[IssuedTokens]:
+        return AuthToken.objects.bulk_create_tokens(
+            users,
+            auth_type,
+            context=context,
+            access_expires_in=access_expires_in,
+            refresh_expires_in=refresh_expires_in,
+            batch_size=batch_size,
+        )
+
+    def verify(self, token: str) -> Optional[TokenType]:
+        alias, token = token_shards.split(token)
+        if alias is None:
+            return None
+
+        if signed_token_denylist.enabled and is_signed_token(token):
+            signed_token_denylist.sync()
+            payload = self._load_signed_payload(token)
+            if payload is None:
+                return None
+            queryset = self._user_queryset(payload)
+            user = None
+            if read_replica.enabled:
+                user = queryset.using(read_replica.alias).first()
+                if user is not None:
+                    read_replica.to_primary(user)
+            if user is None:
+                user = queryset.first()
+            return self._signed_token_instance(payload, user, alias)
+
+        candidates = self._hash_candidates(token)
+        hashed_token, *legacy_hashes = candidates.values()
+
+        token_instance = token_cache.get(hashed_token)
+        if token_instance is None:
+            if negative_cache.is_known_miss(hashed_token, legacy_hashes):
+                return None
+
+            token_instance = self._lookup_token(token, candidates, alias)
+            if token_instance is None:
+                negative_cache.record_miss(hashed_token)
+                return None
+
+            if token_instance.hash_scheme != get_hash_scheme():
+                self._rehash_queryset(token_instance, hashed_token).update(
+                    access_token_hash=hashed_token,
+                    hash_scheme=get_hash_scheme(),
+                )
+                negative_cache.record_issued([hashed_token])
+            token_cache.set(token_instance)
+
+        return token_instance
+
+    async def averify(self, token: str) -> Optional[TokenType]:
+        # Django's async ORM, and the async methods of the cache layers, so no
+        # cache round trip blocks the event loop.
+        alias, token = token_shards.split(token)
+        if alias is None:
+            return None
+
+        if signed_token_denylist.enabled and is_signed_token(token):
+            if signed_token_denylist.stale:
+                await sync_to_async(signed_token_denylist.sync)()
+            payload = self._load_signed_payload(token)
+            if payload is None:
+                return None
+            queryset = self._user_queryset(payload)
+            user = None
+            if read_replica.enabled:
+                user = await queryset.using(read_replica.alias).afirst()
+                if user is not None:
+                    read_replica.to_primary(user)
+            if user is None:
+                user = await queryset.afirst()
+            return self._signed_token_instance(payload, user, alias)
+
+        candidates = self._hash_candidates(token)
+        hashed_token, *legacy_hashes = candidates.values()
+
+        token_instance = await token_cache.aget(hashed_token)
+        if token_instance is None:
+            if await negative_cache.ais_known_miss(hashed_token, legacy_hashes):
+                return None
+
+            token_instance = await self._alookup_token(token, candidates, alias)
+            if token_instance is None:
+                await negative_cache.arecord_miss(hashed_token)
+                return None
+
+            if token_instance.hash_scheme != get_hash_scheme():
+                await self._rehash_queryset(token_instance, hashed_token).aupdate(
+                    access_token_hash=hashed_token,
+                    hash_scheme=get_hash_scheme(),
+                )
+                await negative_cache.arecord_issued([hashed_token])
+            await token_cache.aset(token_instance)
+
+        return token_instance
+
+    @staticmethod
+    def _load_signed_payload(token: str) -> Optional[dict]:
+        """
+        Check a signed token's signature, expiry and the revocation denylist, all
+        in memory. Returns its payload, or None if the token is not valid.
+        """
+        payload = load_signed_token(token)
+        if payload is None or payload["e"] <= timezone.now().timestamp():
+            return None
+        if signed_token_denylist.contains(payload["s"]):
+            return None
+        return payload
+
+    @staticmethod
+    def _user_queryset(payload: dict):
+        user_model = AuthToken._meta.get_field("user").related_model
+        return user_model._default_manager.filter(pk=payload["u"])
+
+    @staticmethod
+    def _signed_token_instance(payload: dict, user, alias: str) -> Optional[TokenType]:
+        """
+        Build an unsaved token for a verified signed token. It has no primary key
+        (revocation matches it by selector, on the database ``alias`` it was
+        issued from) and no context, only the digest of the context it was
+        issued with, as ``context_digest``.
+        """
+        if user is None:
+            return None
+
+        token = AuthToken(
+            user=user,
+            auth_type=payload["a"],
+            expires_at=datetime.fromtimestamp(payload["e"], tz=dt_timezone.utc),
+            access_token_selector=payload["s"],
+        )
+        token.context_digest = payload["c"]
+        token._state.db = alias
+        return token
+
+    @staticmethod
+    def _token_queryset(token: TokenType):
+        """Return a queryset matching a token, by selector for signed tokens."""
+        tokens = AuthToken.objects.db_manager(token._state.db)
+        if token.pk is not None:
+            return tokens.filter(pk=token.pk)
+        if token.access_token_selector:
+            return tokens.filter(access_token_selector=token.access_token_selector)
+        return tokens.none()
+
+    @staticmethod
+    def _hash_candidates(token: str) -> dict[str, str]:
+        """
+        Return {scheme: hash} for every accepted scheme, current scheme first, so
+        a token can be matched against legacy hashes in a single query.
+        """
+        current, *legacy = get_hash_schemes()
+        candidates = {current: hash_token_string(token)}
+        for scheme in legacy:
+            candidates[scheme] = hash_token_string(token, scheme)
+        return candidates
+
+    @staticmethod
+    def _verify_queryset(token: str, candidates: dict[str, str]):
+        """
+        Selector-format tokens are looked up by their short selector; opaque
+        tokens by their hash under every accepted scheme, in one query.
+        """
+        selector = get_token_selector(token)
+        if selector:
+            lookup = {"access_token_selector": selector}
+        elif len(candidates) == 1:
+            lookup = {"access_token_hash": next(iter(candidates.values()))}
+        else:
+            lookup = {"access_token_hash__in": list(candidates.values())}
+        return AuthToken.objects.filter(**lookup).select_related("user")
+
+    def _lookup_token(
+        self, token: str, candidates: dict[str, str], alias: str
+    ) -> Optional[TokenType]:
+        """
+        Find the live token matching the candidate hashes on the database
+        ``alias``. With READ_DATABASE_ALIAS, the replica is read first, and the
+        primary only when the replica result may be stale because of
+        replication lag.
+        """
+        queryset = self._verify_queryset(token, candidates)
+        if read_replica.enabled:
+            replicated = self._check_hash_match(
+                queryset.using(read_replica.alias).first(), candidates
+            )
+            if replicated is not None and not replicated.is_expired:
+                read_replica.to_primary(replicated, replicated.user)
+                return replicated
+            if not read_replica.should_retry(replicated, candidates.values()):
+                return None
+        return self._on_shard(
+            self._check_hash_match(queryset.using(alias).active().first(), candidates)
+        )
+
+    async def _alookup_token(
+        self, token: str, candidates: dict[str, str], alias: str
+    ) -> Optional[TokenType]:
+        """Async counterpart of _lookup_token."""
+        queryset = self._verify_queryset(token, candidates)
+        if read_replica.enabled:
+            replicated = self._check_hash_match(
+                await queryset.using(read_replica.alias).afirst(), candidates
+            )
+            if replicated is not None and not replicated.is_expired:
+                read_replica.to_primary(replicated, replicated.user)
+                return replicated
+            if not await read_replica.ashould_retry(replicated, candidates.values()):
+                return None
+        return self._on_shard(
+            self._check_hash_match(
+                await queryset.using(alias).active().afirst(), candidates
+            )
+        )
+
+    @staticmethod
+    def _on_shard(token: Optional[TokenType]) -> Optional[TokenType]:
+        """
+        A token read from a shard has its user read through the same
+        connection; point the user back at the users' own database.
+        """
+        if token is not None and token_shards.enabled:
+            read_replica.to_primary(token.user)
+        return token
+
+    @staticmethod
+    def _check_hash_match(
+        token: Optional[TokenType], candidates: dict[str, str]
+    ) -> Optional[TokenType]:
+        """
+        Compare the stored hash, in constant time, with the token hashed under
+        the scheme recorded on the row.
+        """
+        if token is None:
+            return None
+        expected = candidates.get(token.hash_scheme)
+        if expected is None or not hmac.compare_digest(
+            token.access_token_hash, expected
+        ):
+            return None
+        return token
+
+    @staticmethod
+    def _rehash_queryset(token: TokenType, hashed_token: str):
+        """
+        Move a token matched under a legacy scheme to the current one. Returns
+        the queryset to update; it matches nothing if the row changed meanwhile.
+        """
+        queryset = AuthToken.objects.db_manager(token._state.db).filter(
+            pk=token.pk, access_token_hash=token.access_token_hash
+        )
+        token.access_token_hash = hashed_token
+        token.hash_scheme = get_hash_scheme()
+        return queryset
+
+    def claim_refresh(self, refresh_token: str) -> Optional[TokenType]:
+        alias, raw_refresh_token = token_shards.split(refresh_token)
+        if alias is None:
+            return None
+        hashed_refresh = list(self._hash_candidates(raw_refresh_token).values())
+        with transaction.atomic(using=alias):
+            return self._claim_refresh_token(hashed_refresh, alias)
+
+    def _claim_refresh_token(
+        self, hashed_refresh: list[str], using: str
+    ) -> Optional[TokenType]:
+        """
+        Consume a refreshable token and return it with its user, or None if no
+        refreshable token matches (including one a concurrent caller claimed).
+
+        The claim is a conditional UPDATE that runs before any read: only one
+        caller sees an affected row, and on SQLite the write lock is taken up
+        front rather than upgraded from a read lock.
+        """
+        tokens = AuthToken.objects.db_manager(using)
+        now = timezone.now()
+        old_date = now - timedelta(days=1)
+        # A signed access token stays valid until its own expiry unless it is
+        # denylisted, which needs that expiry: then it is overwritten last.
+        deny_signed = signed_token_denylist.enabled
+        fields = {"refresh_until": old_date}
+        if authentify_settings.KEEP_EXPIRED_TOKENS:
+            fields["revoked_at"] = now
+            if not deny_signed:
+                fields["expires_at"] = old_date
+
+        claimed = (
+            tokens.refreshable()
+            .filter(refresh_token_hash__in=hashed_refresh)
+            .update(**fields)
+        )
+        if not claimed:
+            return None
+
+        token = self._on_shard(
+            tokens.select_related("user")
+            .filter(refresh_token_hash__in=hashed_refresh)
+            .first()
+        )
+        if not authentify_settings.KEEP_EXPIRED_TOKENS:
+            tokens.filter(pk=token.pk).revoke()
+        elif deny_signed:
+            signed_token_denylist.deny(
+                [(token.access_token_selector, token.expires_at)]
+            )
+            tokens.filter(pk=token.pk).update(expires_at=old_date)
+        return token
+
+    def refresh(
+        self,
+        refresh_token: str,
+        access_expires_in: Optional[timedelta] = None,
+        refresh_expires_in: Optional[timedelta] = None,
+    ) -> Optional[IssuedTokens]:
+        """
+        The old token is revoked and its successor created in one transaction, so
+        concurrent refreshes with the same refresh token have exactly one winner.
+        With TOKEN_SHARDS, the successor stays on the shard of the old token.
+        """
+        alias, raw_refresh_token = token_shards.split(refresh_token)
+        if alias is None:
+            return None
+
+        with transaction.atomic(using=alias):
+            hashed_refresh = list(self._hash_candidates(raw_refresh_token).values())
+
+            token = self._claim_refresh_token(hashed_refresh, alias)
+            if not token:
+                # Invalid, expired or already used refresh token
+                return self._grace_sibling(
+                    refresh_token, alias, access_expires_in, refresh_expires_in
+                )
+
+            transaction.on_commit(
+                lambda: token_cache.invalidate([token.access_token_hash]), using=alias
+            )
+
+            # Create new token
+            issued = self.issue(
+                token.user,
+                token.auth_type,
+                context=token.context,
+                access_expires_in=access_expires_in,
+                refresh_expires_in=refresh_expires_in,
+                using=alias,
+            )
+
+            # Recorded before commit: concurrent refreshes blocked on the claim
+            # only see it fail once this transaction has committed.
+            if refresh_grace.enabled:
+                refresh_grace.set(refresh_token, issued.token_instance.pk)
+            return issued
+
+    def _grace_sibling(
+        self,
+        refresh_token: str,
+        using: str,
+        access_expires_in: Optional[timedelta],
+        refresh_expires_in: Optional[timedelta],
+    ) -> Optional[IssuedTokens]:
+        """
+        For a refresh token rotated within REFRESH_GRACE_PERIOD, issue a sibling
+        of its successor (same user, auth type and context), provided the
+        successor is still active; otherwise return None. Raw tokens are never
+        kept, so the successor itself cannot be handed out again. The sibling
+        belongs to the same login, so ENFORCE_SINGLE_LOGIN does not revoke the
+        successor for it.
+        """
+        token_pk = refresh_grace.get(refresh_token)
+        if token_pk is None:
+            return None
+
+        tokens = AuthToken.objects.db_manager(using)
+        successor = self._on_shard(
+            tokens.active().filter(pk=token_pk).select_related("user").first()
+        )
+        if successor is None:
+            return None
+        return tokens._insert_token(
+            successor.user,
+            successor.auth_type,
+            successor.context,
+            access_expires_in,
+            refresh_expires_in,
+        )
+
+    def revoke(self, token: TokenType) -> None:
+        queryset = self._token_queryset(token)
+        queryset.revoke()
+        transaction.on_commit(
+            lambda: token_cache.invalidate([token.access_token_hash]), using=queryset.db
+        )
+
+    async def arevoke(self, token: TokenType) -> None:
+        await sync_to_async(self._token_queryset(token).revoke)()
+        await token_cache.ainvalidate([token.access_token_hash])
+
+    def revoke_user(self, user) -> Optional[int]:
+        return self.revoke_many(users=[user])
+
+    async def arevoke_user(self, user) -> Optional[int]:
+        revoked = await asyncio.gather(
+            *(self._arevoke_user_tokens(user, alias) for alias in token_shards.all())
+        )
+        return sum(revoked)
+
+    @staticmethod
+    async def _arevoke_user_tokens(user, using: str) -> int:
+        qs = AuthToken.objects.using(using).filter(user=user)
+        hashes = []
+        if token_cache.enabled:
+            hashes = [h async for h in qs.values_list("access_token_hash", flat=True)]
+        revoked = await sync_to_async(qs.revoke)()
+        await token_cache.ainvalidate(hashes)
+        return revoked
+
+    def revoke_many(self, users=None, token_ids=None) -> int:
+        if token_ids is not None and token_shards.enabled:
+            # Every shard numbers its own tokens.
+            raise ValueError("token_ids cannot be used with TOKEN_SHARDS.")
+        return sum(
+            token_shards.fan_out(
+                lambda alias: AuthToken.objects.db_manager(alias).revoke_tokens(
+                    users=users, token_ids=token_ids
+                )
+            )
+        )
+
+    def delete_expired(self) -> None:
+        token_shards.fan_out(
+            lambda alias: AuthToken.objects.db_manager(alias).delete_expired()
+        )
+
+    def purge(
+        self,
+        older_than: Optional[timedelta] = None,
+        dry_run: bool = False,
+        user=None,
+        batch_size: int = 1000,
+        sleep: float = 0,
+        time_budget: Optional[timedelta] = None,
+        progress: Optional[Callable[[PurgeResult], None]] = None,
+        archive: Optional[bool] = None,
+    ) -> PurgeResult:
+        """
+        Purge in bounded batches, archiving with ARCHIVE_EXPIRED_TOKENS (or
+        ``archive``), and drop denylist entries of expired signed tokens. With
+        TOKEN_SHARDS, shards are purged one after the other, sharing
+        ``time_budget``, and the result covers all of them.
+        """
+        if not dry_run and user is None:
+            signed_token_denylist.prune()
+
+        total = None
+        for alias in token_shards.all():
+            shard_budget = time_budget
+            shard_progress = progress
+            if total is not None:
+                if time_budget is not None:
+                    shard_budget = time_budget - timedelta(seconds=total.elapsed)
+                    if shard_budget <= timedelta(0):
+                        return replace(total, completed=False)
+                if progress is not None:
+                    shard_progress = lambda result, done=total: progress(
+                        done.merge(result)
+                    )
+
+            tokens = AuthToken.objects.using(alias)
+            if user is not None:
+                tokens = tokens.for_user(user)
+            result = tokens.purge_expired(
+                batch_size=batch_size,
+                sleep=sleep,
+                time_budget=shard_budget,
+                older_than=older_than,
+                dry_run=dry_run,
+                progress=shard_progress,
+                archive=archive,
+            )
+            total = result if total is None else total.merge(result)
+            if not result.completed:
+                break
+        return total
+
+
+class TokenRecord:
+    """A token as kept by the engines that store tokens outside the database."""
+
+    __slots__ = (
+        "pk",
+        "user_id",
+        "auth_type",
+        "context",
+        "access_token_hash",
+        "access_token_selector",
+        "hash_scheme",
+        "refresh_token_hash",
+        "created_at",
+        "expires_at",
+        "refresh_until",
+    )
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            setattr(self, name, fields.get(name))
+
+    @property
+    def dead_at(self):
+        """When neither the access nor the refresh token is usable any more."""
+        if self.expires_at is None:
+            return None
+        if self.refresh_until is None:
+            return self.expires_at
+        return max(self.expires_at, self.refresh_until)
+
+    def is_live(self, now) -> bool:
+        return self.expires_at is None or self.expires_at > now
+
+    def is_refreshable(self, now) -> bool:
+        return self.refresh_until is not None and self.refresh_until > now
+
+
+class RecordTokenStorage(BaseTokenStorage):
+    """
+    Shared parts of the engines that keep TokenRecords instead of rows. Only
+    the user is read from the database, and revoked tokens are dropped at once.
+    """
+
+    @classmethod
+    def incompatible_settings(cls, settings) -> list[str]:
+        enabled = [name for name in ORM_ONLY_SETTINGS if getattr(settings, name)]
+        if settings.TOKEN_FORMAT == "signed":
+            enabled.append("TOKEN_FORMAT 'signed'")
+        return enabled
+
+    @staticmethod
+    def _hashes(raw_token: str) -> list[str]:
+        return [hash_token_string(raw_token, scheme) for scheme in get_hash_schemes()]
+
+    @staticmethod
+    def _new_record(
+        pk, user, auth_type, context, access_expires_in, refresh_expires_in
+    ) -> tuple[TokenRecord, str, Optional[str]]:
+        now = timezone.now()
+        manager = AuthToken.objects
+        token_data, raw_token, raw_refresh_token = manager._build_token(
+            user, auth_type, now, context, access_expires_in, refresh_expires_in
+        )
+        token_data.pop("last_refreshed_at")
+        record = TokenRecord(
+            pk=pk,
+            user_id=token_data.pop("user").pk,
+            hash_scheme=get_hash_schemes()[0],
+            created_at=now,
+            **token_data,
+        )
+        return record, raw_token, raw_refresh_token
+
+    @staticmethod
+    def _to_token(record: TokenRecord, user=None) -> TokenType:
+        fields = {name: getattr(record, name) for name in TokenRecord.__slots__}
+        fields["context"] = dict(record.context)
+        fields["last_refreshed_at"] = record.created_at
+        token = AuthToken(**fields)
+        if user is not None:
+            token.user = user
+        return token
+
+    @staticmethod
+    def _user_queryset(record: TokenRecord):
+        user_model = AuthToken._meta.get_field("user").related_model
+        return user_model._default_manager.filter(pk=record.user_id)
+
+    def _find(self, raw_token: str) -> Optional[TokenRecord]:
+        """Return the live record matching the raw token."""
+        raise NotImplementedError
+
+    async def _afind(self, raw_token: str) -> Optional[TokenRecord]:
+        return self._find(raw_token)
+
+    def verify(self, token: str) -> Optional[TokenType]:
+        record = self._find(token)
+        if record is None:
+            return None
+        user = self._user_queryset(record).first()
+        return self._to_token(record, user) if user is not None else None
+
+    async def averify(self, token: str) -> Optional[TokenType]:
+        record = await self._afind(token)
+        if record is None:
+            return None
+        user = await self._user_queryset(record).afirst()
+        return self._to_token(record, user) if user is not None else None
+
+    def _claimed(self, record: Optional[TokenRecord]) -> Optional[TokenType]:
+        if record is None:
+            return None
+        user = self._user_queryset(record).first()
+        return self._to_token(record, user) if user is not None else None
+
+
+class MemoryTokenStorage(RecordTokenStorage):
+    """
+    Keeps tokens in process memory: for tests and single-process deployments.
+    Tokens are lost on restart and not shared between processes. Expired
+    tokens are dropped by purge(), in expiry order, from a heap.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._tokens = {}
+        self._refresh = {}
+        self._by_user = {}
+        self._expiry = []
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._tokens)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tokens.clear()
+            self._refresh.clear()
+            self._by_user.clear()
+            self._expiry.clear()
+
+    def _add(self, record: TokenRecord) -> None:
+        self._tokens[record.access_token_hash] = record
+        if record.refresh_token_hash:
+            self._refresh[record.refresh_token_hash] = record.access_token_hash
+        self._by_user.setdefault(record.user_id, set()).add(record.access_token_hash)
+        if record.dead_at is not None:
+            heapq.heappush(
+                self._expiry, (record.dead_at, record.pk, record.access_token_hash)
+            )
+
+    def _remove(self, access_token_hash: str) -> Optional[TokenRecord]:
+        record = self._tokens.pop(access_token_hash, None)
+        if record is None:
+            return None
+        if record.refresh_token_hash:
+            self._refresh.pop(record.refresh_token_hash, None)
+        hashes = self._by_user.get(record.user_id)
+        if hashes is not None:
+            hashes.discard(access_token_hash)
+            if not hashes:
+                del self._by_user[record.user_id]
+        return record
+
+    def issue(
+        self,
+        user,
+        auth_type: AUTH_TYPES,
+        context: Optional[dict] = None,
+        access_expires_in: Optional[timedelta] = None,
+        refresh_expires_in: Optional[timedelta] = None,
+    ) -> IssuedTokens:
+        record, raw_token, raw_refresh_token = self._new_record(
+            next(self._ids),
+            user,
+            auth_type,
+            context,
+            access_expires_in,
+            refresh_expires_in,
+        )
+        with self._lock:
+            if authentify_settings.ENFORCE_SINGLE_LOGIN:
+                for hashed in list(self._by_user.get(user.pk, ())):
+                    self._remove(hashed)
+            self._add(record)
+        return IssuedTokens(raw_token, raw_refresh_token, self._to_token(record, user))
+
+    def _find(self, raw_token: str) -> Optional[TokenRecord]:
+        now = timezone.now()
+        for hashed in self._hashes(raw_token):
+            record = self._tokens.get(hashed)
+            if record is not None:
+                return record if record.is_live(now) else None
+        return None
+
+    def claim_refresh(self, refresh_token: str) -> Optional[TokenType]:
+        now = timezone.now()
+        record = None
+        with self._lock:
+            for hashed in self._hashes(refresh_token):
+                access_token_hash = self._refresh.get(hashed)
+                if access_token_hash is None:
+                    continue
+                if self._tokens[access_token_hash].is_refreshable(now):
+                    record = self._remove(access_token_hash)
+                break
+        return self._claimed(record)
+
+    def revoke(self, token: TokenType) -> None:
+        with self._lock:
+            self._remove(token.access_token_hash)
+
+    def revoke_user(self, user) -> Optional[int]:
+        with self._lock:
+            hashes = list(self._by_user.get(user.pk, ()))
+            for hashed in hashes:
+                self._remove(hashed)
+        return len(hashes)
+
+    def purge(
+        self,
+        older_than: Optional[timedelta] = None,
+        dry_run: bool = False,
+        user=None,
+        **options,
+    ) -> PurgeResult:
+        started = timezone.now()
+        cutoff = started - (older_than or timedelta(0))
+        deleted = 0
+        with self._lock:
+            if user is not None:
+                # A user's tokens are few: scan them rather than the heap.
+                records = [self._tokens[h] for h in self._by_user.get(user.pk, ())]
+                dead = [
+                    record.access_token_hash
+                    for record in records
+                    if record.dead_at is not None and record.dead_at <= cutoff
+                ]
+                deleted = len(dead)
+                if not dry_run:
+                    for hashed in dead:
+                        self._remove(hashed)
+            elif dry_run:
+                deleted = sum(
+                    1
+                    for dead_at, pk, hashed in self._expiry
+                    if dead_at <= cutoff and self._is_current(pk, hashed)
+                )
+            else:
+                while self._expiry and self._expiry[0][0] <= cutoff:
+                    _, pk, hashed = heapq.heappop(self._expiry)
+                    # Entries of revoked tokens are left behind until they
+                    # reach the top of the heap.
+                    if self._is_current(pk, hashed):
+                        self._remove(hashed)
+                        deleted += 1
+        elapsed = (timezone.now() - started).total_seconds()
+        return PurgeResult(deleted, int(bool(deleted)), elapsed, True, dry_run)
+
+    def _is_current(self, pk, access_token_hash: str) -> bool:
+        record = self._tokens.get(access_token_hash)
+        return record is not None and record.pk == pk
+
+
+class CacheTokenStorage(RecordTokenStorage):
+    """
+    Keeps tokens in the Django cache named by CACHE_ALIAS, so verification is a
+    couple of cache reads. Entries expire with their tokens, so there is
+    nothing to purge. Revoking a user's tokens stores a revocation time that
+    outdates them, so the cache must not evict entries early (e.g. Redis with
+    a ``noeviction`` policy): an evicted revocation would revive tokens.
+    """
+
+    @property
+    def backend(self):
+        return caches[authentify_settings.CACHE_ALIAS]
+
+    @staticmethod
+    def _token_key(hashed: str) -> str:
+        return f"{STORAGE_KEY_PREFIX}token:{hashed}"
+
+    @staticmethod
+    def _refresh_key(hashed: str) -> str:
+        return f"{STORAGE_KEY_PREFIX}refresh:{hashed}"
+
+    @staticmethod
+    def _revoked_key(user_id) -> str:
+        return f"{STORAGE_KEY_PREFIX}revoked:{user_id}"
+
+    @staticmethod
+    def _timeout(until, now) -> Optional[float]:
+        return None if until is None else max((until - now).total_seconds(), 1)
+
+    def issue(
+        self,
+        user,
+        auth_type: AUTH_TYPES,
+        context: Optional[dict] = None,
+        access_expires_in: Optional[timedelta] = None,
+        refresh_expires_in: Optional[timedelta] = None,
+    ) -> IssuedTokens:
+        # Cache backends have no sequences; ids only tell tokens apart.
+        record, raw_token, raw_refresh_token = self._new_record(
+            secrets.randbits(63),
+            user,
+            auth_type,
+            context,
+            access_expires_in,
+            refresh_expires_in,
+        )
+        if authentify_settings.ENFORCE_SINGLE_LOGIN:
+            self._revoke_before(user.pk, record.created_at)
+
+        entries = {
+            self._token_key(record.access_token_hash): record,
+        }
+        timeout = self._timeout(record.dead_at, record.created_at)
+        if record.refresh_token_hash:
+            entries[self._refresh_key(record.refresh_token_hash)] = (
+                record.access_token_hash
+            )
+        self.backend.set_many(entries, timeout)
+        return IssuedTokens(raw_token, raw_refresh_token, self._to_token(record, user))
+
+    def _revoke_before(self, user_id, moment) -> None:
+        # Never expires: a token can outlive the TTL settings via expires_in.
+        self.backend.set(self._revoked_key(user_id), moment, None)
+
+    def _get_record(self, hashes: list[str]) -> Optional[TokenRecord]:
+        """Return the record stored under one of ``hashes``, unless revoked."""
+        found = self.backend.get_many([self._token_key(hashed) for hashed in hashes])
+        if not found:
+            return None
+        record = next(iter(found.values()))
+        revoked_before = self.backend.get(self._revoked_key(record.user_id))
+        if revoked_before is not None and record.created_at < revoked_before:
+            return None
+        return record
+
+    def _find(self, raw_token: str) -> Optional[TokenRecord]:
+        record = self._get_record(self._hashes(raw_token))
+        if record is None or not record.is_live(timezone.now()):
+            return None
+        return record
+
+    async def _afind(self, raw_token: str) -> Optional[TokenRecord]:
+        keys = [self._token_key(hashed) for hashed in self._hashes(raw_token)]
+        found = await self.backend.aget_many(keys)
+        if not found:
+            return None
+        record = next(iter(found.values()))
+        revoked_before = await self.backend.aget(self._revoked_key(record.user_id))
+        if revoked_before is not None and record.created_at < revoked_before:
+            return None
+        if not record.is_live(timezone.now()):
+            return None
+        return record
+
+    def claim_refresh(self, refresh_token: str) -> Optional[TokenType]:
+        keys = [self._refresh_key(hashed) for hashed in self._hashes(refresh_token)]
+        found = self.backend.get_many(keys)
+        if not found:
+            return None
+        refresh_key, access_token_hash = next(iter(found.items()))
+        record = self._get_record([access_token_hash])
+        now = timezone.now()
+        if record is None or not record.is_refreshable(now):
+            return None
+
+        # add() is atomic: only the first concurrent claim creates the key.
+        claim_key = f"{refresh_key}:claimed"
+        if not self.backend.add(
+            claim_key, True, self._timeout(record.refresh_until, now)
+        ):
+            return None
+        self.backend.delete_many([self._token_key(access_token_hash), refresh_key])
+        return self._claimed(record)
+
+    def revoke(self, token: TokenType) -> None:
+        keys = [self._token_key(token.access_token_hash)]
+        if token.refresh_token_hash:
+            keys.append(self._refresh_key(token.refresh_token_hash))
+        self.backend.delete_many(keys)
+
+    def revoke_user(self, user) -> Optional[int]:
+        self._revoke_before(user.pk, timezone.now())
+        return None
+
+    def purge(
+        self,
+        older_than: Optional[timedelta] = None,
+        dry_run: bool = False,
+        user=None,
+        **options,
+    ) -> PurgeResult:
+        return PurgeResult(0, 0, 0.0, True, dry_run)
+
+
+_engines = {}
+
+
+def clear_token_storage() -> None:
+    """Drop the engine instances, e.g. after the settings changed."""
+    _engines.clear()
+
+
+def get_token_storage() -> BaseTokenStorage:
+    """
+    Return the TOKEN_STORAGE engine. One instance is kept per configured path,
+    so engines that hold state share it across callers.
+    """
+    path = authentify_settings.TOKEN_STORAGE
+    try:
+        return _engines[path]
+    except KeyError:
+        engine = _engines[path] = import_string(path)()
+        return engine
@@ -1,4 +1,5 @@
-from dataclasses import dataclass
+from datetime import datetime
+from dataclasses import dataclass, replace
 
 from drf_authentify.compat import TYPE_CHECKING
 
@@ -11,3 +12,30 @@ class IssuedTokens:
     access_token: str
     refresh_token: str
     token_instance: "TokenType"
+
+
+@dataclass(frozen=True)
+class PurgeResult:
+    deleted: int
+    batches: int
+    elapsed: float
+    completed: bool
+    dry_run: bool = False
+    archived: bool = False
+
+    def merge(self, other: "PurgeResult") -> "PurgeResult":
+        """Combine with the result of a purge that ran after this one."""
+        return replace(
+            self,
+            deleted=self.deleted + other.deleted,
+            batches=self.batches + other.batches,
+            elapsed=self.elapsed + other.elapsed,
+            completed=self.completed and other.completed,
+        )
+
+
+@dataclass(frozen=True)
+class TokenPartition:
+    name: str
+    start: datetime
+    end: datetime
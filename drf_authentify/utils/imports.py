@@ -4,7 +4,9 @@ from django.utils.module_loading import import_string
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ImproperlyConfigured
 
-from drf_authentify.compat import Optional, Callable
+from asgiref.sync import sync_to_async
+
+from drf_authentify.compat import Union, Optional, Callable
 
 
 def load_handler(
@@ -41,3 +43,69 @@ def load_handler(
             )
 
     return handler
+
+
+class HandlerChain:
+    """
+    Ordered handlers called as one. Each handler receives the (user, token)
+    returned by the previous one, plus the raw token string.
+    """
+
+    def __init__(self, handlers: list[Callable], keywords: bool = False):
+        self.handlers = tuple(handlers)
+        self.keywords = keywords
+
+    def __call__(self, user, token, token_str):
+        for handler in self.handlers:
+            if self.keywords:
+                user, token = handler(user=user, token=token, token_str=token_str)
+            else:
+                user, token = handler(user, token, token_str)
+        return user, token
+
+    async def acall(self, user, token, token_str):
+        for handler in self.handlers:
+            if self.keywords:
+                user, token = await acall_handler(
+                    handler, user=user, token=token, token_str=token_str
+                )
+            else:
+                user, token = await acall_handler(handler, user, token, token_str)
+        return user, token
+
+
+def compile_handlers(
+    paths: Union[str, list[str], None],
+    name: str,
+    required_params: list[str] = ["user", "token", "token_str"],
+    keywords: bool = False,
+) -> Optional[Callable]:
+    """
+    Import and validate one handler path or a list of them.
+
+    Returns None when nothing is configured, the handler itself for a single
+    path, or a HandlerChain running several in order.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+
+    handlers = [load_handler(path, name, required_params) for path in paths or []]
+    handlers = [handler for handler in handlers if handler]
+
+    if not handlers:
+        return None
+    if len(handlers) == 1:
+        return handlers[0]
+    return HandlerChain(handlers, keywords=keywords)
+
+
+async def acall_handler(handler: Callable, *args, **kwargs):
+    """
+    Call a handler from async code. Coroutine functions are awaited; plain
+    functions run in a thread so they can use the ORM.
+    """
+    if isinstance(handler, HandlerChain):
+        return await handler.acall(*args, **kwargs)
+    if inspect.iscoroutinefunction(handler):
+        return await handler(*args, **kwargs)
+    return await sync_to_async(handler)(*args, **kwargs)
@@ -1,15 +1,70 @@
+import hmac
+import json
 import secrets
 import hashlib
+from datetime import datetime
+from functools import lru_cache
 
-from drf_authentify.settings import authentify_settings
+from django.conf import settings
+from django.core import signing
 
+from drf_authentify.compat import Optional, Callable
+from drf_authentify.settings import (
+    HMAC_SCHEME_PREFIX,
+    KEYED_BLAKE2B_SCHEME,
+    authentify_settings,
+)
 
-def _hash_token(token: str) -> str:
-    """Hash a token using the configured secure hash algorithm."""
-    algorithm = authentify_settings.SECURE_HASH_ALGORITHM.lower()
-    hasher = hashlib.new(algorithm)
-    hasher.update(token.encode("utf-8"))
-    return hasher.hexdigest()
+SELECTOR_BYTES = 9
+SELECTOR_LENGTH = 12  # token_urlsafe(9) always yields 12 characters
+SELECTOR_SEPARATOR = "."
+
+SIGNED_TOKEN_SALT = "drf_authentify.signed_token"
+SIGNED_TOKEN_SEPARATOR = ":"
+
+
+@lru_cache(maxsize=None)
+def _get_hasher(scheme: str, pepper: str) -> Callable[[bytes], str]:
+    """
+    Build a hasher for a scheme once per process. Keyed schemes pay for their
+    key setup here; each call then only copies the prepared state.
+    """
+    key = pepper.encode("utf-8")
+    if scheme == KEYED_BLAKE2B_SCHEME:
+        if len(key) > hashlib.blake2b.MAX_KEY_SIZE:
+            key = hashlib.blake2b(key).digest()
+        prototype = hashlib.blake2b(key=key, digest_size=32)
+    elif scheme.startswith(HMAC_SCHEME_PREFIX):
+        prototype = hmac.new(key, digestmod=scheme[len(HMAC_SCHEME_PREFIX) :])
+    else:
+        prototype = hashlib.new(scheme)
+
+    def hasher(data: bytes) -> str:
+        h = prototype.copy()
+        h.update(data)
+        return h.hexdigest()
+
+    return hasher
+
+
+def get_hash_scheme() -> str:
+    """Return the scheme new tokens are hashed with."""
+    return authentify_settings.SECURE_HASH_ALGORITHM.lower()
+
+
+def get_hash_schemes() -> list[str]:
+    """Return the current scheme followed by accepted legacy schemes."""
+    schemes = [get_hash_scheme()]
+    for scheme in authentify_settings.LEGACY_HASH_ALGORITHMS:
+        if scheme.lower() not in schemes:
+            schemes.append(scheme.lower())
+    return schemes
+
+
+def _hash_token(token: str, scheme: Optional[str] = None) -> str:
+    """Hash a token using the given scheme, or the configured one."""
+    pepper = authentify_settings.TOKEN_HASH_PEPPER or settings.SECRET_KEY
+    return _get_hasher(scheme or get_hash_scheme(), pepper)(token.encode("utf-8"))
 
 
 def _generate_token(nbytes: int) -> tuple[str, str]:
@@ -26,5 +81,71 @@ def generate_refresh_token() -> tuple[str, str]:
     return _generate_token(48)
 
 
-def hash_token_string(raw_token: str) -> str:
-    return _hash_token(raw_token)
+def generate_selector_access_token() -> tuple[str, str, str]:
+    """
+    Generate a ``<selector>.<verifier>`` access token.
+    Returns (raw_token, selector, hashed_token); the hash covers the whole token.
+    """
+    selector = secrets.token_urlsafe(SELECTOR_BYTES)
+    raw = f"{selector}{SELECTOR_SEPARATOR}{secrets.token_urlsafe(32)}"
+    return raw, selector, _hash_token(raw)
+
+
+def get_context_digest(context: dict) -> str:
+    """Short digest of a token context, carried by signed tokens."""
+    payload = json.dumps(context, sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def generate_signed_access_token(
+    user_pk, auth_type: str, expires_at: datetime, context: dict
+) -> tuple[str, str, str]:
+    """
+    Generate a stateless access token: a signed payload carrying a random
+    selector (the token id), the user id, auth type, expiry and a context digest.
+    Returns (raw_token, selector, hashed_token).
+    """
+    selector = secrets.token_urlsafe(SELECTOR_BYTES)
+    payload = {
+        "s": selector,
+        "u": user_pk if isinstance(user_pk, int) else str(user_pk),
+        "a": auth_type,
+        "e": int(expires_at.timestamp()),
+        "c": get_context_digest(context),
+    }
+    raw = signing.Signer(
+        salt=SIGNED_TOKEN_SALT, sep=SIGNED_TOKEN_SEPARATOR
+    ).sign_object(payload)
+    return raw, selector, _hash_token(raw)
+
+
+def is_signed_token(raw_token: str) -> bool:
+    return SIGNED_TOKEN_SEPARATOR in raw_token
+
+
+def load_signed_token(raw_token: str) -> Optional[dict]:
+    """
+    Return the payload of a signed token with a valid signature (under
+    SECRET_KEY or SECRET_KEY_FALLBACKS), or None.
+    """
+    try:
+        payload = signing.Signer(
+            salt=SIGNED_TOKEN_SALT, sep=SIGNED_TOKEN_SEPARATOR
+        ).unsign_object(raw_token)
+    except (signing.BadSignature, ValueError):
+        return None
+    if not isinstance(payload, dict) or not {"s", "u", "a", "e", "c"} <= payload.keys():
+        return None
+    return payload
+
+
+def get_token_selector(raw_token: str) -> Optional[str]:
+    """Return the selector of a selector-format token, or None for opaque tokens."""
+    selector, separator, verifier = raw_token.partition(SELECTOR_SEPARATOR)
+    if separator and verifier and len(selector) == SELECTOR_LENGTH:
+        return selector
+    return None
+
+
+def hash_token_string(raw_token: str, scheme: Optional[str] = None) -> str:
+    return _hash_token(raw_token, scheme)
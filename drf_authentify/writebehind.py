@@ -0,0 +1,183 @@
+import atexit
+import logging
+import threading
+
+from django.db import connections
+from django.db.models import Case, Q, Value, When
+from django.utils import timezone
+
+from drf_authentify.compat import Optional, TYPE_CHECKING
+from drf_authentify.settings import authentify_settings
+
+if TYPE_CHECKING:
+    from datetime import datetime
+
+    from drf_authentify.models import TokenType
+
+AUTO_REFRESH_FIELDS = ["expires_at", "refresh_until", "last_refreshed_at"]
+
+logger = logging.getLogger(__name__)
+
+
+class AutoRefreshBuffer:
+    """
+    Write-behind buffer for AUTO_REFRESH, enabled by AUTO_REFRESH_WRITE_BEHIND.
+
+    Sliding-expiry updates are held in process memory and written by a
+    background thread in batched UPDATEs, every AUTO_REFRESH_FLUSH_INTERVAL or
+    as soon as AUTO_REFRESH_FLUSH_SIZE tokens are pending. Tokens that could
+    expire in the database before the next flush are still written immediately,
+    so a deferred refresh never lets a token lapse.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = {}
+        self._thread = None
+
+    @property
+    def enabled(self) -> bool:
+        return authentify_settings.AUTO_REFRESH_WRITE_BEHIND
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    @staticmethod
+    def _key(token: "TokenType") -> tuple:
+        # Primary keys are only unique per database with TOKEN_SHARDS.
+        return token._state.db, token.pk
+
+    def apply(self, token: "TokenType") -> None:
+        """Overlay a pending refresh that is newer than the token's own."""
+        with self._lock:
+            values = self._pending.get(self._key(token))
+        if values is not None and values[-1] > token.last_refreshed_at:
+            for field, value in zip(AUTO_REFRESH_FIELDS, values):
+                setattr(token, field, value)
+
+    def defer(self, token: "TokenType", stored_expiry: Optional["datetime"]) -> bool:
+        """
+        Queue a refreshed token for the next flush. Returns False, leaving the
+        write to the caller, when buffering is disabled or ``stored_expiry`` (the
+        expiry before this refresh) could pass before the flush lands.
+        """
+        if not self.enabled:
+            return False
+
+        margin = 2 * authentify_settings.AUTO_REFRESH_FLUSH_INTERVAL
+        if stored_expiry is not None and stored_expiry - timezone.now() <= margin:
+            return False
+
+        values = tuple(getattr(token, field) for field in AUTO_REFRESH_FIELDS)
+        key = self._key(token)
+        with self._lock:
+            current = self._pending.get(key)
+            if current is None or current[-1] < values[-1]:
+                self._pending[key] = values
+            size = len(self._pending)
+            self._ensure_thread()
+
+        if size >= authentify_settings.AUTO_REFRESH_FLUSH_SIZE:
+            self._wake.set()
+        return True
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        if self._thread is None:
+            atexit.register(self._flush_at_exit)
+        self._thread = threading.Thread(
+            target=self._run, name="drf-authentify-refresh-flusher", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(
+                authentify_settings.AUTO_REFRESH_FLUSH_INTERVAL.total_seconds()
+            )
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("drf_authentify: auto-refresh flush failed.")
+            finally:
+                connections.close_all()
+
+    def _flush_at_exit(self) -> None:
+        try:
+            self.flush()
+        except Exception:
+            logger.exception("drf_authentify: auto-refresh flush at exit failed.")
+
+    def flush(self) -> int:
+        """
+        Write all pending refreshes, one UPDATE per AUTO_REFRESH_FLUSH_SIZE
+        tokens, and return the number of updated rows. Revoked and deleted
+        tokens are skipped, and so are rows refreshed more recently elsewhere.
+        If an UPDATE fails, the unwritten refreshes are queued again.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        by_db = {}
+        for (db, pk), row in pending.items():
+            by_db.setdefault(db, []).append((pk, row))
+        size = authentify_settings.AUTO_REFRESH_FLUSH_SIZE
+        batches = [
+            (db, items[start : start + size])
+            for db, items in by_db.items()
+            for start in range(0, len(items), size)
+        ]
+
+        updated = 0
+        for index, (db, batch) in enumerate(batches):
+            try:
+                updated += self._write(db, batch)
+            except Exception:
+                self._requeue(batches[index:])
+                raise
+        return updated
+
+    @staticmethod
+    def _write(db: str, batch: list) -> int:
+        from drf_authentify.models import get_token_model
+
+        model = get_token_model()
+        values = {
+            field: Case(
+                *[When(pk=pk, then=Value(row[i])) for pk, row in batch],
+                output_field=model._meta.get_field(field),
+            )
+            for i, field in enumerate(AUTO_REFRESH_FIELDS)
+        }
+        # Each row only moves forward: another process may have written a
+        # newer refresh since this one was buffered.
+        rows = Q()
+        for pk, row in batch:
+            rows |= Q(pk=pk, last_refreshed_at__lt=row[-1])
+        return (
+            model.objects.using(db)
+            .filter(rows, revoked_at__isnull=True)
+            .update(**values)
+        )
+
+    def _requeue(self, batches: list) -> None:
+        """Merge unwritten batches back, unless a newer refresh was queued."""
+        with self._lock:
+            for db, batch in batches:
+                for pk, row in batch:
+                    current = self._pending.get((db, pk))
+                    if current is None or current[-1] < row[-1]:
+                        self._pending[(db, pk)] = row
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending.clear()
+
+
+auto_refresh_buffer = AutoRefreshBuffer()
@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
     # apps
     "drf_authentify",
+    "drf_authentify.contrib.binary",
     # third parties
     "rest_framework",
 ]
@@ -84,7 +85,24 @@ DATABASES = {
         "TEST": {
             "NAME": BASE_DIR / "test_db.sqlite3",
         },
-    }
+    },
+    # Stand-in read replica for the READ_DATABASE_ALIAS tests. It is not a
+    # mirror, so rows only appear in it when a test copies them: lag.
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db_replica.sqlite3",
+        "TEST": {
+            "NAME": BASE_DIR / "test_db_replica.sqlite3",
+        },
+    },
+    # Second token shard for the TOKEN_SHARDS tests.
+    "shard": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db_shard.sqlite3",
+        "TEST": {
+            "NAME": BASE_DIR / "test_db_shard.sqlite3",
+        },
+    },
 }
 
 
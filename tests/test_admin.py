@@ -7,12 +7,14 @@ from django.forms.models import model_to_dict
 from django.contrib.auth import get_user_model
 from django.test import TestCase, RequestFactory
 
-from drf_authentify.models import AuthToken
 from drf_authentify.choices import AUTH_TYPES
+from drf_authentify.services import TokenService
+from drf_authentify.models import AuthToken, RevokedToken
+from drf_authentify.settings import authentify_settings
+from drf_authentify.denylist import signed_token_denylist
 from drf_authentify.admin import AuthTokenAdmin, ExpirationStatusFilter
 from drf_authentify.utils.tokens import generate_access_token, generate_refresh_token
 
-
 User = get_user_model()
 
 
@@ -221,3 +223,25 @@ class AuthTokenAdminTests(TestCase):
 
             mock_gen_access.assert_not_called()
             mock_message_user.assert_not_called()
+
+    def test_delete_denies_signed_tokens(self):
+        admin_instance = AuthTokenAdmin(AuthToken, site)
+        request = self.factory.post("/")
+        request.user = self.user
+        signed_token_denylist.clear()
+        self.addCleanup(signed_token_denylist.clear)
+
+        with patch.object(authentify_settings, "TOKEN_FORMAT", "signed"):
+            first = TokenService.generate_header_token(self.user)
+            second = TokenService.generate_header_token(self.user)
+            third = TokenService.generate_header_token(self.user)
+
+            admin_instance.delete_model(request, first.token_instance)
+            admin_instance.delete_queryset(
+                request, AuthToken.objects.filter(pk=second.token_instance.pk)
+            )
+
+            self.assertIsNone(TokenService.verify_token(first.access_token))
+            self.assertIsNone(TokenService.verify_token(second.access_token))
+            self.assertIsNotNone(TokenService.verify_token(third.access_token))
+        self.assertEqual(RevokedToken.objects.count(), 2)
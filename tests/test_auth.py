@@ -1,13 +1,25 @@
+import inspect
 from datetime import timedelta
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, AsyncMock
 from rest_framework.exceptions import AuthenticationFailed
 
 from django.utils import timezone
+from django.db import connection
 from django.test import TestCase, RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
 
 
+from drf_authentify.models import AuthToken
+from drf_authentify.cache import VERSION_KEY, token_cache
 from drf_authentify.settings import authentify_settings
-from drf_authentify.auth import CookieAuthentication, AuthorizationHeaderAuthentication
+from drf_authentify.services import TokenService
+from drf_authentify.auth import (
+    CookieAuthentication,
+    AsyncCookieAuthentication,
+    AuthorizationHeaderAuthentication,
+    AsyncAuthorizationHeaderAuthentication,
+)
 
 
 class MockUser:
@@ -83,9 +95,9 @@ class AuthTests(TestCase):
     # AUTHENTICATION + AUTO REFRESH
     #
 
-    @patch("drf_authentify.auth.load_handler", return_value=None)
+    @patch("drf_authentify.auth.get_handler", return_value=None)
     @patch("drf_authentify.services.TokenService.verify_token")
-    def test_authenticate_happy_path(self, verify, load_handler):
+    def test_authenticate_happy_path(self, verify, get_handler):
         user = MockUser(True)
         tok = MockToken(
             user, timezone.now(), timezone.now(), timezone.now() + timedelta(minutes=5)
@@ -107,9 +119,10 @@ class AuthTests(TestCase):
     # AUTO REFRESH UPDATES TOKEN
     #
 
-    @patch("drf_authentify.auth.load_handler", return_value=None)
+    @patch("drf_authentify.auth.get_handler", return_value=None)
     @patch("drf_authentify.services.TokenService.verify_token")
-    def test_auto_refresh_updates_token(self, verify, load_handler):
+    @patch("drf_authentify.auth.BaseTokenAuth._save_auto_refresh", return_value=True)
+    def test_auto_refresh_updates_token(self, save, verify, get_handler):
 
         now = timezone.now()
         user = MockUser(True)
@@ -151,7 +164,8 @@ class AuthTests(TestCase):
     #
 
     @patch("drf_authentify.services.TokenService.verify_token")
-    def test_auto_refresh_handler_runs(self, verify):
+    @patch("drf_authentify.auth.BaseTokenAuth._save_auto_refresh", return_value=True)
+    def test_auto_refresh_handler_runs(self, save, verify):
         handler = Mock()
 
         now = timezone.now()
@@ -166,9 +180,9 @@ class AuthTests(TestCase):
 
         handler.return_value = (U1, T1)
 
-        # Fake load_handler: only return `handler` for POST_AUTO_REFRESH_HANDLER
-        def fake_load(name, setting_name, args):
-            if setting_name == "POST_AUTO_REFRESH_HANDLER":
+        # Fake get_handler: only return `handler` for POST_AUTO_REFRESH_HANDLER
+        def fake_get(name, paths):
+            if name == "POST_AUTO_REFRESH_HANDLER":
                 return handler
             return None
 
@@ -182,7 +196,7 @@ class AuthTests(TestCase):
                 authentify_settings, "AUTO_REFRESH_MAX_TTL", timedelta(hours=2)
             ),
             patch.object(authentify_settings, "REFRESH_TOKEN_TTL", timedelta(hours=1)),
-            patch("drf_authentify.auth.load_handler", side_effect=fake_load),
+            patch("drf_authentify.auth.get_handler", side_effect=fake_get),
             patch(
                 "django.utils.timezone.now",
                 return_value=T1.last_refreshed_at + timedelta(seconds=2),
@@ -197,3 +211,263 @@ class AuthTests(TestCase):
             auth.authenticate(req)
 
         handler.assert_called_once_with(U1, T1, "t")
+
+
+class AsyncAuthTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="async_auth_user", password="password"
+        )
+
+    def setUp(self):
+        self.rf = RequestFactory()
+
+    def _header_request(self, token):
+        prefix = authentify_settings.AUTH_HEADER_PREFIXES[0]
+        return self.rf.get("/", HTTP_AUTHORIZATION=f"{prefix} {token}")
+
+    def test_async_classes_expose_coroutine_authenticate(self):
+        for cls in (AsyncAuthorizationHeaderAuthentication, AsyncCookieAuthentication):
+            self.assertTrue(inspect.iscoroutinefunction(cls.authenticate))
+
+    async def test_async_header_authentication(self):
+        issued = await TokenService.agenerate_header_token(self.user)
+
+        auth = AsyncAuthorizationHeaderAuthentication()
+        user, token = await auth.authenticate(self._header_request(issued.access_token))
+
+        self.assertEqual(user, self.user)
+        self.assertEqual(token.pk, issued.token_instance.pk)
+
+    async def test_async_cookie_authentication(self):
+        issued = await TokenService.agenerate_cookie_token(self.user)
+        req = self.rf.get("/")
+        req.COOKIES[authentify_settings.AUTH_COOKIE_NAMES[0]] = issued.access_token
+
+        user, _ = await AsyncCookieAuthentication().authenticate(req)
+        self.assertEqual(user, self.user)
+
+    async def test_aauthenticate_unknown_token(self):
+        auth = AuthorizationHeaderAuthentication()
+        self.assertIsNone(await auth.aauthenticate(self._header_request("unknown")))
+
+    async def test_aauthenticate_awaits_async_handler(self):
+        issued = await TokenService.agenerate_header_token(self.user)
+        handler = AsyncMock(side_effect=lambda user, token, token_str: (user, token))
+
+        with patch("drf_authentify.auth.get_handler", return_value=handler):
+            await AuthorizationHeaderAuthentication().aauthenticate(
+                self._header_request(issued.access_token)
+            )
+
+        handler.assert_awaited_once()
+
+    async def test_aauthenticate_runs_sync_handler(self):
+        issued = await TokenService.agenerate_header_token(self.user)
+        handler = Mock(side_effect=lambda user, token, token_str: (user, token))
+
+        with patch("drf_authentify.auth.get_handler", return_value=handler):
+            await AuthorizationHeaderAuthentication().aauthenticate(
+                self._header_request(issued.access_token)
+            )
+
+        handler.assert_called_once()
+
+    async def test_aauthenticate_auto_refresh_saves(self):
+        issued = await TokenService.agenerate_header_token(self.user)
+        old = issued.token_instance.last_refreshed_at
+
+        with (
+            patch.object(authentify_settings, "AUTO_REFRESH", True),
+            patch.object(
+                authentify_settings, "AUTO_REFRESH_INTERVAL", timedelta(seconds=1)
+            ),
+            patch.object(
+                authentify_settings, "AUTO_REFRESH_MAX_TTL", timedelta(days=30)
+            ),
+            patch("django.utils.timezone.now", return_value=old + timedelta(seconds=2)),
+        ):
+            _, token = await AuthorizationHeaderAuthentication().aauthenticate(
+                self._header_request(issued.access_token)
+            )
+
+        await token.arefresh_from_db()
+        self.assertGreater(token.last_refreshed_at, old)
+
+
+class ConditionalAutoRefreshTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="conditional_user", password="password"
+        )
+
+    def setUp(self):
+        for name, value in (
+            ("AUTO_REFRESH", True),
+            ("AUTO_REFRESH_INTERVAL", timedelta(seconds=1)),
+            ("AUTO_REFRESH_MAX_TTL", timedelta(days=30)),
+        ):
+            patcher = patch.object(authentify_settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.issued = TokenService.generate_header_token(self.user)
+        self.later = self.issued.token_instance.last_refreshed_at + timedelta(seconds=2)
+
+    def _handle(self, token, handler):
+        with (
+            patch(
+                "drf_authentify.auth.get_handler",
+                side_effect=lambda name, paths: (
+                    handler if name == "POST_AUTO_REFRESH_HANDLER" else None
+                ),
+            ),
+            patch("django.utils.timezone.now", return_value=self.later),
+        ):
+            return AuthorizationHeaderAuthentication()._handle_auto_refresh(
+                token.user, token, self.issued.access_token
+            )
+
+    def _load(self):
+        return TokenService.verify_token(self.issued.access_token)
+
+    def test_refresh_is_a_single_update(self):
+        token = self._load()
+
+        with self.assertNumQueries(1):
+            self._handle(token, None)
+
+        token.refresh_from_db()
+        self.assertEqual(token.last_refreshed_at, self.later)
+
+    def test_only_first_concurrent_request_refreshes(self):
+        first, second = self._load(), self._load()
+        handler = Mock(side_effect=lambda user, token, token_str: (user, token))
+
+        self._handle(first, handler)
+        self._handle(second, handler)
+
+        handler.assert_called_once()
+        self.assertIs(handler.call_args[0][1], first)
+
+    def test_losing_request_returns_the_token_as_stored(self):
+        first, second = self._load(), self._load()
+        stored = (second.expires_at, second.refresh_until, second.last_refreshed_at)
+
+        self._handle(first, None)
+        _, token = self._handle(second, None)
+
+        self.assertEqual(
+            (token.expires_at, token.refresh_until, token.last_refreshed_at), stored
+        )
+
+    def test_losing_request_keeps_other_local_cache_entries(self):
+        patcher = patch.object(authentify_settings, "LOCAL_CACHE_ENABLED", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        token_cache.local.clear()
+        self.addCleanup(token_cache.local.clear)
+        other = TokenService.generate_header_token(self.user)
+        TokenService.verify_token(other.access_token)
+        version = token_cache.backend.get(VERSION_KEY)
+
+        first, second = self._load(), self._load()
+        self._handle(first, None)
+        self._handle(second, None)
+
+        self.assertEqual(token_cache.backend.get(VERSION_KEY), version)
+        self.assertIsNone(token_cache.local._lookup(second.access_token_hash))
+        self.assertIsNotNone(
+            token_cache.local._lookup(other.token_instance.access_token_hash)
+        )
+
+    def test_cached_snapshot_refreshed_elsewhere_is_updated_once(self):
+        patcher = patch.object(authentify_settings, "LOCAL_CACHE_ENABLED", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        token_cache.local.clear()
+        self.addCleanup(token_cache.local.clear)
+
+        # Cache a snapshot, then let another worker refresh the row.
+        self._load()
+        AuthToken.objects.filter(pk=self.issued.token_instance.pk).update(
+            last_refreshed_at=self.later
+        )
+
+        request = RequestFactory().get(
+            "/", HTTP_AUTHORIZATION=f"Bearer {self.issued.access_token}"
+        )
+        with (
+            patch("django.utils.timezone.now", return_value=self.later),
+            CaptureQueriesContext(connection) as queries,
+        ):
+            for _ in range(5):
+                AuthorizationHeaderAuthentication().authenticate(request)
+
+        updates = [q for q in queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+
+    def test_revoked_token_is_not_refreshed(self):
+        token = self._load()
+        handler = Mock()
+        with patch.object(authentify_settings, "KEEP_EXPIRED_TOKENS", True):
+            TokenService.revoke_token(self._load())
+
+        self._handle(token, handler)
+
+        handler.assert_not_called()
+        token.refresh_from_db()
+        self.assertTrue(token.is_expired)
+
+
+class JitteredAutoRefreshTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(
+            username="jitter_user", password="password"
+        )
+
+    def setUp(self):
+        for name, value in (
+            ("AUTO_REFRESH", True),
+            ("AUTO_REFRESH_INTERVAL", timedelta(minutes=10)),
+            ("AUTO_REFRESH_MAX_TTL", timedelta(days=30)),
+            ("AUTO_REFRESH_JITTER", 0.5),
+        ):
+            patcher = patch.object(authentify_settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.issued = TokenService.generate_header_token(self.user)
+
+    def _refresh_after(self, elapsed, roll):
+        token = TokenService.verify_token(self.issued.access_token)
+        at = token.last_refreshed_at + elapsed
+        with (
+            patch("drf_authentify.auth.random.random", return_value=roll),
+            patch("django.utils.timezone.now", return_value=at),
+        ):
+            AuthorizationHeaderAuthentication()._handle_auto_refresh(
+                token.user, token, self.issued.access_token
+            )
+        token.refresh_from_db()
+        return token.last_refreshed_at == at
+
+    def test_no_refresh_before_jitter_window(self):
+        self.assertFalse(self._refresh_after(timedelta(minutes=4), 0.0))
+
+    def test_refresh_probability_rises_across_window(self):
+        # 6 of 10 minutes elapsed: 20% into the 5-minute window.
+        self.assertFalse(self._refresh_after(timedelta(minutes=6), 0.3))
+        self.assertTrue(self._refresh_after(timedelta(minutes=6), 0.1))
+
+    def test_refresh_is_certain_once_interval_elapsed(self):
+        self.assertTrue(self._refresh_after(timedelta(minutes=10), 0.999))
+
+    def test_early_refresh_respects_max_ttl(self):
+        with patch.object(
+            authentify_settings, "AUTO_REFRESH_MAX_TTL", timedelta(hours=24)
+        ):
+            self.assertFalse(self._refresh_after(timedelta(minutes=9), 0.0))
@@ -0,0 +1,475 @@
+import asyncio
+import datetime
+import threading
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.utils import timezone
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.contrib.auth import get_user_model
+
+from drf_authentify.models import AuthToken
+from drf_authentify.choices import AUTH_TYPES
+from drf_authentify.cache import (
+    VERSION_KEY,
+    BLOOM_SEQ_KEY,
+    BLOOM_LOG_PREFIX,
+    LocalTokenCache,
+    token_cache,
+    negative_cache,
+    refresh_grace,
+)
+from drf_authentify.services import TokenService
+from drf_authentify.settings import authentify_settings
+from drf_authentify.utils.tokens import hash_token_string
+
+User = get_user_model()
+
+
+class TokenCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="cache_user", password="password")
+
+    def setUp(self):
+        patcher = patch.object(authentify_settings, "VERIFY_CACHE_ENABLED", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        caches[authentify_settings.CACHE_ALIAS].clear()
+        self.addCleanup(caches[authentify_settings.CACHE_ALIAS].clear)
+
+    def _cached(self, raw_token):
+        return token_cache.get(hash_token_string(raw_token))
+
+    def test_disabled_cache_is_bypassed(self):
+        issued = TokenService.generate_header_token(self.user)
+        with patch.object(authentify_settings, "VERIFY_CACHE_ENABLED", False):
+            TokenService.verify_token(issued.access_token)
+            self.assertIsNone(self._cached(issued.access_token))
+
+    def test_verify_populates_and_hits_cache(self):
+        issued = TokenService.generate_header_token(self.user)
+        TokenService.verify_token(issued.access_token, AUTH_TYPES.HEADER)
+
+        with self.assertNumQueries(0):
+            token = TokenService.verify_token(issued.access_token, AUTH_TYPES.HEADER)
+
+        self.assertEqual(token.pk, issued.token_instance.pk)
+        self.assertEqual(token.user, self.user)
+
+    def test_cached_token_respects_auth_type(self):
+        issued = TokenService.generate_header_token(self.user)
+        TokenService.verify_token(issued.access_token)
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(
+                TokenService.verify_token(issued.access_token, AUTH_TYPES.COOKIE)
+            )
+
+    def test_entry_lifetime_capped_by_expiry(self):
+        issued = TokenService.generate_header_token(self.user, access_expires_in=30)
+
+        with patch.object(token_cache.backend, "set") as mock_set:
+            TokenService.verify_token(issued.access_token)
+
+        timeout = mock_set.call_args[0][2]
+        self.assertLessEqual(timeout, 30)
+
+    def test_expired_snapshot_is_ignored(self):
+        issued = TokenService.generate_header_token(self.user)
+        TokenService.verify_token(issued.access_token)
+
+        later = timezone.now() + datetime.timedelta(days=2)
+        with patch("django.utils.timezone.now", return_value=later):
+            self.assertIsNone(self._cached(issued.access_token))
+
+    def test_revoke_token_invalidates(self):
+        issued = TokenService.generate_header_token(self.user)
+        token = TokenService.verify_token(issued.access_token)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TokenService.revoke_token(token)
+
+        self.assertIsNone(self._cached(issued.access_token))
+        self.assertIsNone(TokenService.verify_token(issued.access_token))
+
+    def test_revoke_all_user_tokens_invalidates(self):
+        first = TokenService.generate_header_token(self.user)
+        second = TokenService.generate_cookie_token(self.user)
+        TokenService.verify_token(first.access_token)
+        TokenService.verify_token(second.access_token)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TokenService.revoke_all_user_tokens(self.user)
+
+        self.assertIsNone(self._cached(first.access_token))
+        self.assertIsNone(self._cached(second.access_token))
+
+    def test_refresh_token_invalidates_old_access_token(self):
+        issued = TokenService.generate_header_token(self.user)
+        TokenService.verify_token(issued.access_token)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TokenService.refresh_token(issued.refresh_token)
+
+        self.assertIsNone(self._cached(issued.access_token))
+        self.assertIsNone(TokenService.verify_token(issued.access_token))
+
+    def test_single_login_invalidates_previous_tokens(self):
+        issued = TokenService.generate_header_token(self.user)
+        TokenService.verify_token(issued.access_token)
+
+        with (
+            patch.object(authentify_settings, "ENFORCE_SINGLE_LOGIN", True),
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            TokenService.generate_header_token(self.user)
+
+        self.assertIsNone(self._cached(issued.access_token))
+        self.assertFalse(AuthToken.objects.filter(pk=issued.token_instance.pk).exists())
+
+
+class LocalTokenCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="local_user", password="password")
+
+    def setUp(self):
+        patcher = patch.object(authentify_settings, "LOCAL_CACHE_ENABLED", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.backend = caches[authentify_settings.CACHE_ALIAS]
+        self.backend.clear()
+        token_cache.local.clear()
+        self.addCleanup(self.backend.clear)
+        self.addCleanup(token_cache.local.clear)
+
+    def _issue(self):
+        issued = TokenService.generate_header_token(self.user)
+        TokenService.verify_token(issued.access_token)
+        return issued
+
+    def test_hit_skips_db_and_shared_cache(self):
+        issued = self._issue()
+
+        with (
+            self.assertNumQueries(0),
+            patch.object(token_cache.backend, "get") as mock_get,
+        ):
+            token = TokenService.verify_token(issued.access_token)
+
+        mock_get.assert_not_called()
+        self.assertEqual(token.pk, issued.token_instance.pk)
+
+    def test_hits_return_private_copies(self):
+        issued = self._issue()
+        first = TokenService.verify_token(issued.access_token)
+        first.context["mutated"] = True
+
+        second = TokenService.verify_token(issued.access_token)
+        self.assertIsNot(first, second)
+        self.assertNotIn("mutated", second.context)
+
+    def test_lru_evicts_least_recently_used(self):
+        with patch.object(authentify_settings, "LOCAL_CACHE_MAX_SIZE", 2):
+            first, second = self._issue(), self._issue()
+            TokenService.verify_token(first.access_token)  # first is now MRU
+            third = self._issue()
+
+        local = token_cache.local
+        hashed = hash_token_string
+        self.assertIsNotNone(local.get(hashed(first.access_token), self.backend))
+        self.assertIsNone(local.get(hashed(second.access_token), self.backend))
+        self.assertIsNotNone(local.get(hashed(third.access_token), self.backend))
+
+    def test_entries_expire_after_ttl(self):
+        issued = self._issue()
+        hashed = hash_token_string(issued.access_token)
+
+        with patch("drf_authentify.cache.time.monotonic", return_value=1e12):
+            self.assertIsNone(token_cache.local.get(hashed, self.backend))
+
+    def test_version_bump_from_other_worker_flushes_entries(self):
+        issued = self._issue()
+        hashed = hash_token_string(issued.access_token)
+
+        # Simulate a revocation in another process.
+        token_cache.bump_version()
+        self.assertIsNotNone(self.backend.get(VERSION_KEY))
+
+        with patch.object(
+            authentify_settings,
+            "LOCAL_CACHE_SYNC_INTERVAL",
+            datetime.timedelta(seconds=0),
+        ):
+            self.assertIsNone(token_cache.local.get(hashed, self.backend))
+
+    def test_revoke_bumps_version(self):
+        issued = self._issue()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TokenService.revoke_token(issued.token_instance)
+
+        self.assertEqual(self.backend.get(VERSION_KEY), 1)
+        self.assertIsNone(TokenService.verify_token(issued.access_token))
+
+    def test_concurrent_access_is_thread_safe(self):
+        issued = self._issue()
+        token = TokenService.verify_token(issued.access_token)
+        local = LocalTokenCache()
+        errors = []
+
+        def worker():
+            try:
+                for _ in range(200):
+                    local.set(token, 30)
+                    local.get(token.access_token_hash, self.backend)
+                    local.delete_many([token.access_token_hash])
+            except Exception as e:  # pragma: no cover - surfaced via assertion
+                errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+
+
+class NegativeTokenCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="neg_user", password="password")
+
+    def setUp(self):
+        self.backend = caches[authentify_settings.CACHE_ALIAS]
+        self.backend.clear()
+        negative_cache.clear()
+        self.addCleanup(self.backend.clear)
+        self.addCleanup(negative_cache.clear)
+
+    def _enable(self, setting):
+        patcher = patch.object(authentify_settings, setting, True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_disabled_layers_do_not_count(self):
+        TokenService.verify_token("unknown")
+        self.assertEqual(negative_cache.stats()["lookups"], 0)
+
+    def test_miss_cache_skips_repeat_db_lookups(self):
+        self._enable("NEGATIVE_CACHE_ENABLED")
+
+        self.assertIsNone(TokenService.verify_token("garbage"))
+        with self.assertNumQueries(0):
+            self.assertIsNone(TokenService.verify_token("garbage"))
+
+        stats = negative_cache.stats()
+        self.assertEqual(stats["db_misses"], 1)
+        self.assertEqual(stats["miss_cache_hits"], 1)
+
+    def test_bloom_filter_rejects_unknown_hashes(self):
+        self._enable("BLOOM_FILTER_ENABLED")
+        issued = TokenService.generate_header_token(self.user)
+        negative_cache.rebuild()
+
+        with self.assertNumQueries(0):
+            self.assertIsNone(TokenService.verify_token("garbage"))
+        self.assertIsNotNone(TokenService.verify_token(issued.access_token))
+        self.assertEqual(negative_cache.stats()["bloom_rejections"], 1)
+
+    def test_local_issuance_is_added_to_bloom_filter(self):
+        self._enable("BLOOM_FILTER_ENABLED")
+        negative_cache.rebuild()
+
+        issued = TokenService.generate_header_token(self.user)
+        self.assertIsNotNone(TokenService.verify_token(issued.access_token))
+
+    def test_issuance_in_other_worker_is_replayed_from_log(self):
+        self._enable("BLOOM_FILTER_ENABLED")
+        negative_cache.rebuild()
+
+        # Issue a token as another process would: bypass the local filter and
+        # only publish to the shared log.
+        with patch.object(negative_cache, "_bloom", None):
+            with self.captureOnCommitCallbacks(execute=True):
+                issued = TokenService.generate_header_token(self.user)
+
+        self.assertEqual(self.backend.get(BLOOM_SEQ_KEY), 1)
+        self.assertIsNotNone(TokenService.verify_token(issued.access_token))
+
+    def test_log_gap_fails_open(self):
+        self._enable("BLOOM_FILTER_ENABLED")
+        negative_cache.rebuild()
+        self.backend.set(BLOOM_SEQ_KEY, 5, None)
+
+        with patch.object(negative_cache, "schedule_rebuild") as mock_rebuild:
+            self.assertFalse(negative_cache.is_known_miss(hash_token_string("missing")))
+        mock_rebuild.assert_called()
+
+    def test_missing_filter_fails_open_and_schedules_rebuild(self):
+        self._enable("BLOOM_FILTER_ENABLED")
+
+        with patch.object(negative_cache, "schedule_rebuild") as mock_rebuild:
+            self.assertFalse(negative_cache.is_known_miss("anything"))
+        mock_rebuild.assert_called_once()
+
+    def test_bloom_filter_accepts_tokens_stored_under_legacy_scheme(self):
+        self._enable("BLOOM_FILTER_ENABLED")
+        issued = TokenService.generate_header_token(self.user)
+        negative_cache.rebuild()
+
+        with (
+            patch.object(authentify_settings, "SECURE_HASH_ALGORITHM", "sha512"),
+            patch.object(authentify_settings, "LEGACY_HASH_ALGORITHMS", ["sha256"]),
+        ):
+            self.assertIsNotNone(TokenService.verify_token(issued.access_token))
+            # The rehashed token is added to the filter under the new scheme.
+            self.assertIsNotNone(TokenService.verify_token(issued.access_token))
+
+
+def _off_the_event_loop(method):
+    def wrapper(*args, **kwargs):
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return method(*args, **kwargs)
+        raise AssertionError(f"blocking cache.{method.__name__}() on the event loop")
+
+    return wrapper
+
+
+class AsyncCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="async_user", password="pw")
+
+    def setUp(self):
+        self.backend = caches[authentify_settings.CACHE_ALIAS]
+        self.backend.clear()
+        negative_cache.clear()
+        token_cache.local.clear()
+        self.addCleanup(self.backend.clear)
+        self.addCleanup(negative_cache.clear)
+        self.addCleanup(token_cache.local.clear)
+
+        for setting in (
+            "VERIFY_CACHE_ENABLED",
+            "LOCAL_CACHE_ENABLED",
+            "NEGATIVE_CACHE_ENABLED",
+            "BLOOM_FILTER_ENABLED",
+        ):
+            patcher = patch.object(authentify_settings, setting, True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        negative_cache.rebuild()
+        # Another worker issued a token: the next negative answer replays it.
+        self.backend.set(BLOOM_SEQ_KEY, 1, None)
+        self.backend.set(f"{BLOOM_LOG_PREFIX}1", hash_token_string("other"), None)
+
+        for name in (
+            "get",
+            "set",
+            "add",
+            "incr",
+            "get_many",
+            "set_many",
+            "delete_many",
+        ):
+            patcher = patch.object(
+                LocMemCache, name, _off_the_event_loop(getattr(LocMemCache, name))
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_averify_token_does_not_block_the_event_loop(self):
+        issued = await TokenService.agenerate_header_token(self.user)
+
+        self.assertIsNone(await TokenService.averify_token("garbage"))
+        for _ in range(2):
+            token = await TokenService.averify_token(issued.access_token)
+            self.assertEqual(token.pk, issued.token_instance.pk)
+
+        with patch.object(authentify_settings, "BLOOM_FILTER_ENABLED", False):
+            for _ in range(2):
+                self.assertIsNone(await TokenService.averify_token("garbage"))
+
+        await TokenService.arevoke_token(token)
+        self.assertIsNone(await TokenService.averify_token(issued.access_token))
+        stats = negative_cache.stats()
+        self.assertEqual(stats["bloom_rejections"], 1)
+        self.assertEqual(stats["miss_cache_hits"], 1)
+
+
+class RefreshGraceCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="grace_user", password="password")
+
+    def setUp(self):
+        patcher = patch.object(
+            authentify_settings,
+            "REFRESH_GRACE_PERIOD",
+            datetime.timedelta(seconds=30),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.backend = caches[authentify_settings.CACHE_ALIAS]
+        self.backend.clear()
+        self.addCleanup(self.backend.clear)
+
+    def test_disabled_grace_rejects_reused_refresh_token(self):
+        issued = TokenService.generate_header_token(self.user)
+        TokenService.refresh_token(issued.refresh_token)
+
+        with patch.object(authentify_settings, "REFRESH_GRACE_PERIOD", None):
+            self.assertIsNone(TokenService.refresh_token(issued.refresh_token))
+
+    def test_reused_refresh_token_issues_a_sibling(self):
+        issued = TokenService.generate_header_token(self.user, context={"tab": 1})
+        first = TokenService.refresh_token(issued.refresh_token)
+        second = TokenService.refresh_token(issued.refresh_token)
+
+        self.assertNotEqual(second.access_token, first.access_token)
+        self.assertEqual(second.token_instance.user, self.user)
+        self.assertEqual(second.token_instance.context, {"tab": 1})
+        self.assertIsNotNone(TokenService.verify_token(first.access_token))
+        self.assertIsNotNone(TokenService.verify_token(second.access_token))
+
+    def test_sibling_keeps_the_successor_under_single_login(self):
+        issued = TokenService.generate_header_token(self.user)
+        with patch.object(authentify_settings, "ENFORCE_SINGLE_LOGIN", True):
+            first = TokenService.refresh_token(issued.refresh_token)
+            second = TokenService.refresh_token(issued.refresh_token)
+
+        self.assertIsNotNone(TokenService.verify_token(first.access_token))
+        self.assertIsNotNone(TokenService.verify_token(second.access_token))
+
+    def test_revoked_successor_is_not_returned(self):
+        issued = TokenService.generate_header_token(self.user)
+        first = TokenService.refresh_token(issued.refresh_token)
+        TokenService.revoke_token(first.token_instance)
+
+        self.assertIsNone(TokenService.refresh_token(issued.refresh_token))
+
+    def test_entry_expires_with_grace_period(self):
+        issued = TokenService.generate_header_token(self.user)
+
+        with patch.object(refresh_grace.backend, "set") as mock_set:
+            TokenService.refresh_token(issued.refresh_token)
+
+        self.assertEqual(mock_set.call_args[0][2], 30)
+
+    def test_only_the_successor_pk_is_stored(self):
+        issued = TokenService.generate_header_token(self.user)
+        successor = TokenService.refresh_token(issued.refresh_token)
+
+        payload = self.backend.get(refresh_grace.make_key(issued.refresh_token))
+        self.assertEqual(payload, successor.token_instance.pk)
+        self.assertIsNone(refresh_grace.get("some_other_refresh_token"))
@@ -0,0 +1,79 @@
+import datetime
+from io import StringIO
+
+from django.test import TestCase
+from django.utils import timezone
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.contrib.auth import get_user_model
+
+from drf_authentify.models import AuthToken, ArchivedAuthToken
+from drf_authentify.choices import AUTH_TYPES
+
+User = get_user_model()
+
+
+class PurgeTokensCommandTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="command_user", password="pw")
+        for _ in range(3):
+            AuthToken.objects.create_token(cls.user, AUTH_TYPES.HEADER)
+        expired = timezone.now() - datetime.timedelta(hours=1)
+        AuthToken.objects.update(expires_at=expired, refresh_until=expired)
+        AuthToken.objects.create_token(cls.user, AUTH_TYPES.HEADER)
+
+    def _call(self, *args):
+        out = StringIO()
+        call_command("purge_tokens", *args, stdout=out)
+        return out.getvalue()
+
+    def test_purges_expired_tokens(self):
+        output = self._call("--batch-size", "2", "--sleep", "0")
+
+        self.assertIn("Deleted 3 expired tokens in 2 batches", output)
+        self.assertEqual(AuthToken.objects.count(), 1)
+
+    def test_dry_run_reports_count(self):
+        output = self._call("--dry-run")
+
+        self.assertIn("3 expired tokens would be deleted.", output)
+        self.assertEqual(AuthToken.objects.count(), 4)
+
+    def test_verbose_progress(self):
+        output = self._call("--batch-size", "2", "--sleep", "0", "--verbosity", "2")
+        self.assertIn("Batch 1: 2 deleted", output)
+
+    def test_invalid_arguments(self):
+        with self.assertRaisesRegex(CommandError, "--batch-size must be positive"):
+            self._call("--batch-size", "0")
+        with self.assertRaisesRegex(CommandError, "--sleep cannot be negative"):
+            self._call("--sleep", "-1")
+
+    def test_archive(self):
+        output = self._call("--archive", "--sleep", "0")
+
+        self.assertIn("Archived 3 expired tokens in 1 batches", output)
+        self.assertEqual(ArchivedAuthToken.objects.count(), 3)
+        self.assertEqual(AuthToken.objects.count(), 1)
+
+
+class HashBenchmarkCommandTests(TestCase):
+    def test_reports_each_scheme(self):
+        out = StringIO()
+        call_command(
+            "authentify_hash_benchmark",
+            "sha256",
+            "blake2b-keyed",
+            "--number",
+            "10",
+            stdout=out,
+        )
+
+        output = out.getvalue()
+        self.assertIn("sha256", output)
+        self.assertIn("blake2b-keyed", output)
+
+    def test_unknown_scheme(self):
+        with self.assertRaisesRegex(CommandError, "Unknown hash schemes: nope"):
+            call_command("authentify_hash_benchmark", "nope")
@@ -0,0 +1,175 @@
+import threading
+from datetime import timedelta
+from unittest.mock import Mock, patch
+
+from django.db import connection
+from django.core.cache import caches
+from django.test import RequestFactory, TransactionTestCase
+from django.contrib.auth import get_user_model
+
+from drf_authentify.models import AuthToken
+from drf_authentify.auth import AuthorizationHeaderAuthentication
+from drf_authentify.services import TokenService
+from drf_authentify.settings import authentify_settings
+
+User = get_user_model()
+
+
+def run_concurrently(target, count):
+    """Run ``target`` in ``count`` threads released at once; return errors."""
+    barrier = threading.Barrier(count)
+    errors = []
+
+    def worker():
+        try:
+            barrier.wait()
+            target()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=30)
+    return errors
+
+
+class SingleLoginConcurrencyTests(TransactionTestCase):
+    logins = 10
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="storm_user", password="pw")
+        for name in ("ENFORCE_SINGLE_LOGIN", "VERIFY_CACHE_ENABLED"):
+            patcher = patch.object(authentify_settings, name, True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        caches[authentify_settings.CACHE_ALIAS].clear()
+
+    def _login(self):
+        TokenService.generate_header_token(self.user)
+
+    def test_login_storm_leaves_exactly_one_live_token(self):
+        errors = run_concurrently(self._login, self.logins)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(AuthToken.objects.filter(user=self.user).count(), 1)
+
+    def test_login_storm_with_kept_tokens(self):
+        with patch.object(authentify_settings, "KEEP_EXPIRED_TOKENS", True):
+            errors = run_concurrently(self._login, self.logins)
+
+        self.assertEqual(errors, [])
+        tokens = AuthToken.objects.filter(user=self.user)
+        self.assertEqual(tokens.count(), self.logins)
+        self.assertEqual(tokens.active().count(), 1)
+        self.assertEqual(tokens.filter(revoked_at__isnull=True).count(), 1)
+
+
+class RefreshRotationConcurrencyTests(TransactionTestCase):
+    refreshes = 10
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="rotate_user", password="pw")
+        caches[authentify_settings.CACHE_ALIAS].clear()
+        self.issued = TokenService.generate_header_token(self.user)
+
+    def _race(self):
+        results = []
+        errors = run_concurrently(
+            lambda: results.append(
+                TokenService.refresh_token(self.issued.refresh_token)
+            ),
+            self.refreshes,
+        )
+        self.assertEqual(errors, [])
+        winners = [result for result in results if result is not None]
+        self.assertEqual(len(winners), 1)
+        return winners[0]
+
+    def test_concurrent_refreshes_have_exactly_one_winner(self):
+        winner = self._race()
+
+        tokens = AuthToken.objects.filter(user=self.user)
+        self.assertEqual(
+            list(tokens.values_list("pk", flat=True)), [winner.token_instance.pk]
+        )
+
+    def test_concurrent_refreshes_with_kept_tokens(self):
+        with patch.object(authentify_settings, "KEEP_EXPIRED_TOKENS", True):
+            winner = self._race()
+
+        tokens = AuthToken.objects.filter(user=self.user)
+        self.assertEqual(tokens.count(), 2)
+        self.assertEqual(
+            list(tokens.active().values_list("pk", flat=True)),
+            [winner.token_instance.pk],
+        )
+
+    def test_concurrent_refreshes_within_grace_period_all_succeed(self):
+        results = []
+        with patch.object(
+            authentify_settings, "REFRESH_GRACE_PERIOD", timedelta(seconds=30)
+        ):
+            errors = run_concurrently(
+                lambda: results.append(
+                    TokenService.refresh_token(self.issued.refresh_token)
+                ),
+                self.refreshes,
+            )
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(results), self.refreshes)
+        self.assertNotIn(None, results)
+        # One successor, and a sibling of it for every other request.
+        self.assertEqual(
+            len({result.access_token for result in results}), self.refreshes
+        )
+        self.assertEqual(
+            AuthToken.objects.filter(user=self.user).active().count(), self.refreshes
+        )
+
+
+class AutoRefreshConcurrencyTests(TransactionTestCase):
+    requests = 10
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="slide_user", password="pw")
+        self.issued = TokenService.generate_header_token(self.user)
+        for name, value in (
+            ("AUTO_REFRESH", True),
+            ("AUTO_REFRESH_INTERVAL", timedelta(seconds=1)),
+            ("AUTO_REFRESH_MAX_TTL", timedelta(days=30)),
+        ):
+            patcher = patch.object(authentify_settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_concurrent_requests_refresh_once(self):
+        handler = Mock(side_effect=lambda user, token, token_str: (user, token))
+        later = self.issued.token_instance.last_refreshed_at + timedelta(seconds=2)
+        prefix = authentify_settings.AUTH_HEADER_PREFIXES[0]
+        request = RequestFactory().get(
+            "/", HTTP_AUTHORIZATION=f"{prefix} {self.issued.access_token}"
+        )
+
+        with (
+            patch(
+                "drf_authentify.auth.get_handler",
+                side_effect=lambda name, paths: (
+                    handler if name == "POST_AUTO_REFRESH_HANDLER" else None
+                ),
+            ),
+            patch("django.utils.timezone.now", return_value=later),
+        ):
+            errors = run_concurrently(
+                lambda: AuthorizationHeaderAuthentication().authenticate(request),
+                self.requests,
+            )
+
+        self.assertEqual(errors, [])
+        handler.assert_called_once()
+        token = AuthToken.objects.get(pk=self.issued.token_instance.pk)
+        self.assertEqual(token.last_refreshed_at, later)
@@ -0,0 +1,112 @@
+import datetime
+import importlib
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from django.apps import apps
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+
+from drf_authentify.models import AuthToken
+from drf_authentify.choices import AUTH_TYPES
+from drf_authentify.fields import HashDigestField
+from drf_authentify.utils.tokens import hash_token_string
+from drf_authentify.contrib.binary.models import BinaryAuthToken
+
+User = get_user_model()
+
+copy_migration = importlib.import_module(
+    "drf_authentify.contrib.binary.migrations.0002_copy_hex_tokens"
+)
+
+
+class HashDigestFieldTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="binary_user", password="password")
+
+    def test_prep_value_converts_hex_to_bytes(self):
+        field = HashDigestField()
+        self.assertEqual(field.get_prep_value("00ff"), b"\x00\xff")
+        self.assertEqual(field.get_prep_value(b"\x00\xff"), b"\x00\xff")
+        self.assertIsNone(field.get_prep_value(None))
+
+    def test_to_python_returns_hex(self):
+        field = HashDigestField()
+        self.assertEqual(field.to_python(memoryview(b"\x00\xff")), "00ff")
+        self.assertEqual(field.to_python("00ff"), "00ff")
+
+    def test_hashes_are_stored_as_raw_digest_bytes(self):
+        issued = BinaryAuthToken.objects.create_token(self.user, AUTH_TYPES.HEADER)
+        hashed = hash_token_string(issued.access_token)
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT access_token_hash FROM {BinaryAuthToken._meta.db_table}"
+            )
+            stored = bytes(cursor.fetchone()[0])
+
+        self.assertEqual(stored, bytes.fromhex(hashed))
+        self.assertEqual(len(stored), len(hashed) // 2)
+
+    def test_lookups_use_hex_strings(self):
+        issued = BinaryAuthToken.objects.create_token(self.user, AUTH_TYPES.HEADER)
+        hashed = hash_token_string(issued.access_token)
+
+        token = BinaryAuthToken.objects.get(access_token_hash=hashed)
+        self.assertEqual(token.access_token_hash, hashed)
+        self.assertEqual(
+            token.refresh_token_hash, hash_token_string(issued.refresh_token)
+        )
+        self.assertTrue(
+            BinaryAuthToken.objects.filter(access_token_hash__in=[hashed]).exists()
+        )
+
+
+class CopyHexTokensMigrationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="copy_user", password="password")
+
+    def _copy(self):
+        # The function only needs the editor's connection.
+        return copy_migration.copy_hex_tokens(
+            apps, SimpleNamespace(connection=connection)
+        )
+
+    def test_rows_are_copied_in_chunks(self):
+        issued = [
+            AuthToken.objects.create_token(self.user, AUTH_TYPES.HEADER)
+            for _ in range(5)
+        ]
+        created = timezone.now() - datetime.timedelta(days=3)
+        AuthToken.objects.update(created_at=created)
+
+        with patch.object(copy_migration, "BATCH_SIZE", 2):
+            self.assertEqual(self._copy(), (5, 0))
+
+        self.assertEqual(BinaryAuthToken.objects.count(), 5)
+        self.assertTrue(BinaryAuthToken._meta.get_field("created_at").auto_now_add)
+        for tokens in issued:
+            token = BinaryAuthToken.objects.get(
+                access_token_hash=hash_token_string(tokens.access_token)
+            )
+            self.assertEqual(token.pk, tokens.token_instance.pk)
+            self.assertEqual(token.created_at, created)
+
+    def test_non_hex_rows_are_skipped(self):
+        AuthToken.objects.create(
+            user=self.user, access_token_hash="not-a-digest", auth_type="header"
+        )
+        issued = AuthToken.objects.create_token(self.user, AUTH_TYPES.HEADER)
+
+        with self.assertLogs(copy_migration.logger, "WARNING") as logs:
+            self.assertEqual(self._copy(), (1, 1))
+
+        self.assertIn("skipped 1 token(s)", logs.output[0])
+        self.assertEqual(
+            list(BinaryAuthToken.objects.values_list("pk", flat=True)),
+            [issued.token_instance.pk],
+        )
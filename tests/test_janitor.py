@@ -0,0 +1,147 @@
+import datetime
+from unittest.mock import patch
+
+from django.db import close_old_connections
+from django.test import TestCase
+from django.utils import timezone
+from django.core.cache import caches
+from django.core.signals import request_started
+from django.contrib.auth import get_user_model
+
+from drf_authentify.models import AuthToken
+from drf_authentify.choices import AUTH_TYPES
+from drf_authentify.types import PurgeResult
+from drf_authentify.services import TokenService
+from drf_authentify.settings import authentify_settings
+from drf_authentify.janitor import (
+    JANITOR_LOCK_KEY,
+    TokenJanitor,
+    janitor,
+    start_janitor,
+)
+
+User = get_user_model()
+
+
+class TokenJanitorTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="janitor_user", password="pw")
+
+    def setUp(self):
+        self.backend = caches[authentify_settings.CACHE_ALIAS]
+        self.backend.clear()
+        self.addCleanup(self.backend.clear)
+        self.janitor = TokenJanitor()
+
+    def _create(self, count, expires_at):
+        for _ in range(count):
+            token = AuthToken.objects.create_token(self.user, AUTH_TYPES.HEADER)
+            AuthToken.objects.filter(pk=token.token_instance.pk).update(
+                expires_at=expires_at, refresh_until=expires_at
+            )
+
+    def _expired(self, count):
+        self._create(count, timezone.now() - datetime.timedelta(hours=1))
+
+    def _live(self, count):
+        self._create(count, timezone.now() + datetime.timedelta(hours=1))
+
+    def test_sampled_ratio(self):
+        self._expired(3)
+        self._live(1)
+        self.assertEqual(self.janitor.sample_expired_ratio(), 0.75)
+
+    def test_refreshable_tokens_are_not_purgeable(self):
+        self._expired(1)
+        issued = AuthToken.objects.create_token(self.user, AUTH_TYPES.HEADER)
+        AuthToken.objects.filter(pk=issued.token_instance.pk).update(
+            expires_at=timezone.now() - datetime.timedelta(hours=1)
+        )
+        self.assertEqual(self.janitor.sample_expired_ratio(), 0.5)
+
+        result = self.janitor.run_once()
+
+        self.assertEqual(result.deleted, 1)
+        self.assertIsNotNone(TokenService.refresh_token(issued.refresh_token))
+
+    def test_sampled_ratio_of_empty_table(self):
+        self.assertIsNone(self.janitor.sample_expired_ratio())
+
+    def test_sample_is_bounded(self):
+        self._expired(2)
+        self._live(2)
+        with patch.object(authentify_settings, "JANITOR_SAMPLE_SIZE", 2):
+            with patch("drf_authentify.janitor.random.randint", return_value=0):
+                self.assertEqual(self.janitor.sample_expired_ratio(), 1.0)
+
+    def test_purges_when_ratio_crosses_threshold(self):
+        self._expired(3)
+        self._live(1)
+
+        result = self.janitor.run_once()
+
+        self.assertEqual(result.deleted, 3)
+        self.assertEqual(AuthToken.objects.count(), 1)
+        self.assertIsNone(self.backend.get(JANITOR_LOCK_KEY))
+
+    def test_skips_purge_below_threshold(self):
+        self._expired(1)
+        self._live(19)
+
+        self.assertIsNone(self.janitor.run_once())
+        self.assertEqual(AuthToken.objects.count(), 20)
+
+    def test_retention_keeps_recently_expired_tokens(self):
+        self._expired(2)
+
+        with patch.object(
+            authentify_settings, "JANITOR_RETENTION", datetime.timedelta(days=1)
+        ):
+            self.assertIsNone(self.janitor.run_once())
+        self.assertEqual(AuthToken.objects.count(), 2)
+
+    def test_lock_held_by_another_process(self):
+        self._expired(2)
+        self.backend.add(JANITOR_LOCK_KEY, "other", 60)
+
+        self.assertIsNone(self.janitor.run_once())
+        self.assertEqual(AuthToken.objects.count(), 2)
+        self.assertEqual(self.backend.get(JANITOR_LOCK_KEY), "other")
+
+    def test_interval_backs_off_when_idle_and_resets_after_work(self):
+        base = authentify_settings.JANITOR_INTERVAL
+        self.janitor.interval = base
+
+        self.janitor.interval = self.janitor._next_interval(None)
+        self.assertEqual(self.janitor.interval, base * 2)
+
+        with patch.object(authentify_settings, "JANITOR_MAX_INTERVAL", base * 3):
+            self.janitor.interval = self.janitor._next_interval(None)
+            self.assertEqual(self.janitor.interval, base * 3)
+
+        worked = PurgeResult(deleted=5, batches=1, elapsed=0.1, completed=True)
+        self.assertEqual(self.janitor._next_interval(worked), base)
+
+    def test_start_and_stop(self):
+        with patch.object(
+            authentify_settings, "JANITOR_INTERVAL", datetime.timedelta(hours=1)
+        ):
+            self.janitor.start()
+        self.assertTrue(self.janitor.running)
+
+        self.janitor.stop(timeout=5)
+        self.assertFalse(self.janitor.running)
+
+    def test_first_request_starts_janitor_once(self):
+        # As in Django's test client, keep the test database connection open.
+        request_started.disconnect(close_old_connections)
+        self.addCleanup(request_started.connect, close_old_connections)
+        request_started.connect(start_janitor, dispatch_uid=JANITOR_LOCK_KEY)
+        self.addCleanup(request_started.disconnect, dispatch_uid=JANITOR_LOCK_KEY)
+
+        with patch.object(janitor, "start") as mock_start:
+            request_started.send(sender=None)
+            request_started.send(sender=None)
+
+        mock_start.assert_called_once()
@@ -1,15 +1,20 @@
 import datetime
+import itertools
 from unittest.mock import patch
 
+from django.db import connection
+from django.db.models.signals import post_delete
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 
-from drf_authentify.models import AuthToken
+from drf_authentify.models import AuthToken, ArchivedAuthToken
 from drf_authentify.choices import AUTH_TYPES
+from drf_authentify.services import TokenService
+from drf_authentify.settings import authentify_settings
 from drf_authentify.utils.tokens import generate_access_token
 
-
 User = get_user_model()
 
 
@@ -197,16 +202,14 @@ class AuthTokenManagerTests(TestCase):
 
         # Mock queryset returned by self.filter(user=user)
         mock_qs = mock_filter.return_value
-        mock_qs.delete.return_value = (5, {})
+        mock_qs.revoke.return_value = 5
 
         AuthToken.objects.create_token(self.user1, AUTH_TYPES.HEADER)
 
         # Assert filter was called correctly
         mock_filter.assert_called_once_with(user=self.user1)
-        # Assert delete was called
-        mock_qs.delete.assert_called_once()
-        # Assert update was NOT called
-        mock_qs.update.assert_not_called()
+        # Assert the old tokens were revoked in one set-based call
+        mock_qs.revoke.assert_called_once_with()
 
     @patch("drf_authentify.managers.AuthTokenManager.filter")
     @patch("drf_authentify.managers.generate_access_token")
@@ -229,18 +232,215 @@ class AuthTokenManagerTests(TestCase):
 
         # Assert filter was called correctly
         mock_filter.assert_called_once_with(user=self.user2)
-        # Assert delete was NOT called
+        # Soft revocation is decided inside QuerySet.revoke (see RevokeTests)
+        mock_qs.revoke.assert_called_once_with()
         mock_qs.delete.assert_not_called()
 
-        # Assert update was called with correct fields
-        self.assertTrue(mock_qs.update.called)
 
-        # Corrected: Access keyword arguments using call_args[1]
-        update_kwargs = mock_qs.update.call_args[1]
+class PurgeExpiredTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="purge_user", password="pw")
+        now = timezone.now()
+        for _ in range(5):
+            cls._create(now - datetime.timedelta(hours=1))
+        cls.live = cls._create(now + datetime.timedelta(hours=1))
+        cls.eternal = cls._create(None)
+
+    @classmethod
+    def _create(cls, expires_at):
+        token = AuthToken.objects.create_token(cls.user, AUTH_TYPES.HEADER)
+        AuthToken.objects.filter(pk=token.token_instance.pk).update(
+            expires_at=expires_at, refresh_until=expires_at
+        )
+        return token.token_instance
+
+    def test_deletes_only_expired_tokens_in_batches(self):
+        result = AuthToken.objects.purge_expired(batch_size=2)
+
+        self.assertEqual(result.deleted, 5)
+        self.assertEqual(result.batches, 3)
+        self.assertTrue(result.completed)
+        self.assertEqual(
+            set(AuthToken.objects.values_list("pk", flat=True)),
+            {self.live.pk, self.eternal.pk},
+        )
+
+    def test_each_batch_deletes_a_primary_key_range(self):
+        with CaptureQueriesContext(connection) as ctx:
+            AuthToken.objects.purge_expired(batch_size=2)
+
+        deletes = [
+            q["sql"] for q in ctx.captured_queries if q["sql"].startswith("DELETE")
+        ]
+        self.assertEqual(len(deletes), 3)
+        self.assertTrue(all('"id" >=' in sql and '"id" <=' in sql for sql in deletes))
+
+    def test_dry_run_only_counts(self):
+        result = AuthToken.objects.purge_expired(dry_run=True)
+
+        self.assertTrue(result.dry_run)
+        self.assertEqual(result.deleted, 5)
+        self.assertEqual(AuthToken.objects.count(), 7)
+
+    def test_time_budget_stops_early(self):
+        # The clock reads 0 when the purge starts and 10 after that.
+        clock = itertools.chain([0], itertools.repeat(10))
+        with patch("drf_authentify.managers.time.monotonic", side_effect=clock):
+            result = AuthToken.objects.purge_expired(
+                batch_size=2, time_budget=datetime.timedelta(seconds=1)
+            )
+
+        self.assertEqual(result.batches, 1)
+        self.assertEqual(result.deleted, 2)
+        self.assertFalse(result.completed)
+
+    def test_sleeps_between_batches_only(self):
+        with patch("drf_authentify.managers.time.sleep") as mock_sleep:
+            AuthToken.objects.purge_expired(batch_size=2, sleep=0.5)
+
+        self.assertEqual(mock_sleep.call_count, 2)
+        mock_sleep.assert_called_with(0.5)
+
+    def test_keeps_expired_tokens_that_can_be_refreshed(self):
+        issued = AuthToken.objects.create_token(self.user, AUTH_TYPES.HEADER)
+        AuthToken.objects.filter(pk=issued.token_instance.pk).update(
+            expires_at=timezone.now() - datetime.timedelta(hours=1)
+        )
+
+        result = AuthToken.objects.purge_expired()
+
+        self.assertEqual(result.deleted, 5)
+        self.assertTrue(AuthToken.objects.filter(pk=issued.token_instance.pk).exists())
+        self.assertIsNotNone(TokenService.refresh_token(issued.refresh_token))
+
+    def test_older_than_keeps_recently_expired_tokens(self):
+        result = AuthToken.objects.purge_expired(older_than=datetime.timedelta(days=1))
+        self.assertEqual(result.deleted, 0)
+
+    def test_progress_is_reported_per_batch(self):
+        reports = []
+        AuthToken.objects.purge_expired(batch_size=2, progress=reports.append)
+        self.assertEqual([r.deleted for r in reports], [2, 4, 5])
+
+
+class ArchiveExpiredTests(PurgeExpiredTests):
+    def setUp(self):
+        patcher = patch.object(authentify_settings, "ARCHIVE_EXPIRED_TOKENS", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_archive_copies_rows(self):
+        token = AuthToken.objects.expired().order_by("pk").first()
+        token.revoked_at = timezone.now()
+        token.context = {"device": "web"}
+        token.save()
+
+        self.assertEqual(AuthToken.objects.filter(pk=token.pk).archive(), 1)
+
+        archived = ArchivedAuthToken.objects.get()
+        self.assertEqual(archived.token_id, token.pk)
+        self.assertEqual(archived.user_id, self.user.pk)
+        self.assertEqual(archived.context, {"device": "web"})
+        for field in ("access_token_hash", "hash_scheme", "auth_type"):
+            self.assertEqual(getattr(archived, field), getattr(token, field))
+        for field in ("created_at", "last_refreshed_at", "expires_at", "revoked_at"):
+            self.assertEqual(getattr(archived, field), getattr(token, field))
+        self.assertIsNotNone(archived.archived_at)
+
+    def test_purge_moves_expired_tokens(self):
+        expired = set(AuthToken.objects.expired().values_list("pk", flat=True))
+
+        result = AuthToken.objects.purge_expired(batch_size=2)
+
+        self.assertTrue(result.archived)
+        self.assertEqual(result.deleted, 5)
+        self.assertEqual(
+            set(ArchivedAuthToken.objects.values_list("token_id", flat=True)), expired
+        )
+        self.assertEqual(AuthToken.objects.count(), 2)
+
+    def test_each_batch_is_one_insert_select(self):
+        with CaptureQueriesContext(connection) as ctx:
+            AuthToken.objects.purge_expired(batch_size=2)
+
+        inserts = [
+            q["sql"] for q in ctx.captured_queries if q["sql"].startswith("INSERT")
+        ]
+        self.assertEqual(len(inserts), 3)
+        self.assertTrue(all(" SELECT " in sql for sql in inserts))
+
+    def test_archive_can_be_disabled_per_call(self):
+        result = AuthToken.objects.purge_expired(archive=False)
+
+        self.assertFalse(result.archived)
+        self.assertEqual(result.deleted, 5)
+        self.assertFalse(ArchivedAuthToken.objects.exists())
+
+    def test_dry_run_archives_nothing(self):
+        result = AuthToken.objects.purge_expired(dry_run=True)
+
+        self.assertTrue(result.archived)
+        self.assertFalse(ArchivedAuthToken.objects.exists())
+
+
+class RevokeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = User.objects.create_user(username="revoke_user1", password="pw")
+        cls.user2 = User.objects.create_user(username="revoke_user2", password="pw")
+        cls.user3 = User.objects.create_user(username="revoke_user3", password="pw")
+        for user in (cls.user1, cls.user1, cls.user2, cls.user3):
+            AuthToken.objects.create_token(user, AUTH_TYPES.HEADER)
+
+    def test_delete_is_a_single_statement(self):
+        with CaptureQueriesContext(connection) as ctx:
+            count = AuthToken.objects.filter(user=self.user1).revoke()
 
-        self.assertIn("revoked_at", update_kwargs)
-        self.assertIn("expires_at", update_kwargs)
-        self.assertIn("refresh_until", update_kwargs)
+        self.assertEqual(count, 2)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertTrue(ctx.captured_queries[0]["sql"].startswith("DELETE"))
+        self.assertFalse(AuthToken.objects.filter(user=self.user1).exists())
+
+    def test_delete_falls_back_to_collector_for_signal_receivers(self):
+        received = []
+
+        def receiver(sender, instance, **kwargs):
+            received.append(instance.pk)
+
+        post_delete.connect(receiver, sender=AuthToken)
+        self.addCleanup(post_delete.disconnect, receiver, sender=AuthToken)
+
+        count = AuthToken.objects.filter(user=self.user1).revoke()
+
+        self.assertEqual(count, 2)
+        self.assertEqual(len(received), 2)
+
+    def test_keep_expired_tokens_updates_in_one_statement(self):
+        with patch.object(authentify_settings, "KEEP_EXPIRED_TOKENS", True):
+            with CaptureQueriesContext(connection) as ctx:
+                count = AuthToken.objects.filter(user=self.user1).revoke()
+
+        self.assertEqual(count, 2)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertTrue(ctx.captured_queries[0]["sql"].startswith("UPDATE"))
+        revoked = AuthToken.objects.filter(user=self.user1)
+        self.assertEqual(revoked.count(), 2)
+        self.assertFalse(revoked.filter(revoked_at__isnull=True).exists())
+        self.assertEqual(revoked.expired().count(), 2)
+
+    def test_revoke_tokens_by_users_and_ids(self):
+        token_id = AuthToken.objects.get(user=self.user3).pk
+
+        count = AuthToken.objects.revoke_tokens(
+            users=[self.user1], token_ids=[token_id]
+        )
+
+        self.assertEqual(count, 3)
+        self.assertEqual(
+            list(AuthToken.objects.values_list("user", flat=True)), [self.user2.pk]
+        )
 
-        self.assertLess(update_kwargs["expires_at"], timezone.now())
-        self.assertLess(update_kwargs["refresh_until"], timezone.now())
+    def test_revoke_tokens_without_targets_is_a_no_op(self):
+        self.assertEqual(AuthToken.objects.revoke_tokens(), 0)
+        self.assertEqual(AuthToken.objects.count(), 4)
@@ -140,3 +140,19 @@ class GetTokenModelTests(TestCase):
 
             self.assertIs(model, mock_model)
             mock_import_string.assert_called_once_with("path_to_token_model")
+
+
+class AuthTokenIndexTests(TestCase):
+    """Check the query plans of the cleanup queries on the test database."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="index_user", password="pw")
+
+    def test_expired_cleanup_uses_expiry_index(self):
+        plan = AuthToken.objects.expired().explain()
+        self.assertIn("authtoken_exp", plan)
+
+    def test_expired_user_cleanup_uses_user_expiry_index(self):
+        plan = AuthToken.objects.for_user(self.user).expired().explain()
+        self.assertIn("authtoken_user_exp", plan)
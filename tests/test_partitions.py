@@ -0,0 +1,183 @@
+import datetime
+from io import StringIO
+from unittest.mock import patch, PropertyMock
+
+from django.test import TestCase
+from django.utils import timezone
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.contrib.auth import get_user_model
+
+from drf_authentify.models import AuthToken
+from drf_authentify.choices import AUTH_TYPES
+from drf_authentify.settings import authentify_settings
+from drf_authentify.partitions import TokenPartitioner
+
+User = get_user_model()
+
+UTC = datetime.timezone.utc
+
+
+class TokenPartitionerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="partition_user", password="pw")
+
+    def setUp(self):
+        self.partitioner = TokenPartitioner()
+        self.today = self.partitioner.floor(timezone.now())
+
+    def _partitions(self, *offsets):
+        return [
+            self.partitioner.partition_for(self.today + datetime.timedelta(days=days))
+            for days in offsets
+        ]
+
+    def _create(self, created_at, expires_at, refresh_until=None):
+        issued = AuthToken.objects.create_token(self.user, AUTH_TYPES.HEADER)
+        AuthToken.objects.filter(pk=issued.token_instance.pk).update(
+            created_at=created_at,
+            expires_at=expires_at,
+            refresh_until=refresh_until or expires_at,
+        )
+
+    def test_partition_ranges_are_aligned(self):
+        moment = datetime.datetime(2026, 3, 4, 15, 30, tzinfo=UTC)
+        self.assertEqual(
+            self.partitioner.floor(moment), datetime.datetime(2026, 3, 4, tzinfo=UTC)
+        )
+
+        with patch.object(
+            authentify_settings, "TOKEN_PARTITION_INTERVAL", datetime.timedelta(days=7)
+        ):
+            start = self.partitioner.floor(moment)
+            partition = self.partitioner.partition_for(start)
+
+        self.assertEqual(start, datetime.datetime(2026, 2, 26, tzinfo=UTC))
+        self.assertEqual(partition.name, "drf_authentify_authtoken_p20260226")
+        self.assertEqual(partition.end - partition.start, datetime.timedelta(days=7))
+
+    def test_create_table_sql_partitions_by_created_at(self):
+        create_table, default, *indexes = self.partitioner.create_table_sql()
+
+        self.assertTrue(create_table.endswith('PARTITION BY RANGE ("created_at")'))
+        self.assertIn('PRIMARY KEY ("id", "created_at")', create_table)
+        self.assertNotIn("UNIQUE", create_table)
+        self.assertIn("DEFAULT", default)
+        self.assertTrue(any('("access_token_hash")' in sql for sql in indexes), indexes)
+
+    def test_create_table_sql_with_nullable_key_indexes_primary_key(self):
+        with patch.object(authentify_settings, "TOKEN_PARTITION_KEY", "expires_at"):
+            create_table, _, *indexes = self.partitioner.create_table_sql()
+
+        self.assertTrue(create_table.endswith('PARTITION BY RANGE ("expires_at")'))
+        self.assertNotIn("PRIMARY KEY", create_table)
+        self.assertTrue(any('("id")' in sql for sql in indexes), indexes)
+
+    def test_create_partitions_skips_existing(self):
+        with patch.object(
+            self.partitioner, "list_partitions", return_value=self._partitions(0, 2)
+        ):
+            missing = self.partitioner.create_partitions(3, dry_run=True)
+
+        self.assertEqual(missing, self._partitions(1, 3))
+
+    def test_drop_expired_keeps_partitions_with_live_tokens(self):
+        old, older, current = self._partitions(-2, -3, 0)
+        expired = timezone.now() - datetime.timedelta(hours=1)
+        self._create(old.start, expired)
+        self._create(older.start, expired)
+        # A token that never expires keeps its partition.
+        self._create(older.start, None)
+
+        with patch.object(
+            self.partitioner, "list_partitions", return_value=[older, old, current]
+        ):
+            self.assertEqual(self.partitioner.drop_expired(dry_run=True), [old])
+            self.assertEqual(
+                self.partitioner.drop_expired(
+                    older_than=datetime.timedelta(days=2), dry_run=True
+                ),
+                [],
+            )
+
+    def test_drop_expired_keeps_partitions_with_refreshable_tokens(self):
+        old, older, current = self._partitions(-2, -3, 0)
+        expired = timezone.now() - datetime.timedelta(hours=1)
+        self._create(old.start, expired)
+        self._create(older.start, expired, timezone.now() + datetime.timedelta(days=1))
+
+        with patch.object(
+            self.partitioner, "list_partitions", return_value=[older, old, current]
+        ):
+            self.assertEqual(self.partitioner.drop_expired(dry_run=True), [old])
+
+    def test_drop_expired_by_expiry_only_checks_refresh_windows(self):
+        partitions = self._partitions(-2, -3, 1)
+        self._create(partitions[1].start, partitions[1].start, timezone.now())
+        self._create(
+            partitions[0].start,
+            partitions[0].start,
+            timezone.now() + datetime.timedelta(days=1),
+        )
+
+        with (
+            patch.object(authentify_settings, "TOKEN_PARTITION_KEY", "expires_at"),
+            patch.object(self.partitioner, "list_partitions", return_value=partitions),
+            self.assertNumQueries(2),
+        ):
+            dropped = self.partitioner.drop_expired(dry_run=True)
+
+        self.assertEqual(dropped, partitions[1:2])
+
+
+class TokenPartitionsCommandTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="partition_cmd", password="pw")
+        issued = AuthToken.objects.create_token(cls.user, AUTH_TYPES.HEADER)
+        expired = timezone.now() - datetime.timedelta(hours=1)
+        AuthToken.objects.filter(pk=issued.token_instance.pk).update(
+            expires_at=expired, refresh_until=expired
+        )
+
+    def _call(self, *args):
+        out = StringIO()
+        call_command("token_partitions", *args, stdout=out)
+        return out.getvalue()
+
+    def test_falls_back_to_batched_purge(self):
+        output = self._call()
+
+        self.assertIn("requires PostgreSQL", output)
+        self.assertIn("Deleted 1 expired tokens.", output)
+        self.assertFalse(AuthToken.objects.exists())
+
+    def test_sql_requires_postgresql(self):
+        with self.assertRaisesRegex(CommandError, "requires PostgreSQL"):
+            self._call("--sql")
+
+    def test_dry_run_reports_partitions(self):
+        partitioner = TokenPartitioner()
+        today = partitioner.floor(timezone.now())
+        old = partitioner.partition_for(today - datetime.timedelta(days=3))
+
+        with (
+            patch.object(
+                TokenPartitioner, "supported", new_callable=PropertyMock
+            ) as supported,
+            patch.object(TokenPartitioner, "list_partitions", return_value=[old]),
+        ):
+            supported.return_value = True
+            output = self._call("--dry-run", "--premake", "1")
+
+        self.assertIn(
+            f"Would create partition {partitioner.partition_for(today).name}.", output
+        )
+        self.assertIn(f"Would drop partition {old.name}.", output)
+        self.assertEqual(output.count("Would create"), 2)
+        self.assertEqual(AuthToken.objects.count(), 1)
+
+    def test_invalid_arguments(self):
+        with self.assertRaisesRegex(CommandError, "--premake cannot be negative"):
+            self._call("--premake", "-1")
@@ -0,0 +1,121 @@
+import datetime
+from unittest.mock import patch, MagicMock
+
+from django.contrib.admin import site
+from django.core.cache import caches
+from django.test import TestCase, RequestFactory
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+
+from drf_authentify.models import AuthToken
+from drf_authentify.admin import AuthTokenAdmin
+from drf_authentify.services import TokenService
+from drf_authentify.settings import authentify_settings
+
+User = get_user_model()
+
+
+class ReadReplicaTests(TestCase):
+    # "replica" is a separate database: rows are only there once copied.
+    databases = {"default", "replica"}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="replica_user", password="pw")
+        User.objects.get(pk=cls.user.pk).save(using="replica")
+
+    def setUp(self):
+        patcher = patch.object(authentify_settings, "READ_DATABASE_ALIAS", "replica")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        caches[authentify_settings.CACHE_ALIAS].clear()
+
+    def _issue(self, recent=False):
+        # Recently issued hashes are marked when the transaction commits.
+        with self.captureOnCommitCallbacks(execute=recent):
+            return TokenService.generate_header_token(self.user)
+
+    def _replicate(self, issued, **changes):
+        token = AuthToken.objects.get(pk=issued.token_instance.pk)
+        for field, value in changes.items():
+            setattr(token, field, value)
+        token.save(using="replica")
+
+    def test_verification_reads_the_replica(self):
+        issued = self._issue()
+        self._replicate(issued)
+
+        with (
+            self.assertNumQueries(0, using="default"),
+            self.assertNumQueries(1, using="replica"),
+        ):
+            token = TokenService.verify_token(issued.access_token)
+
+        self.assertEqual(token.pk, issued.token_instance.pk)
+        # Writes through the returned objects go to the primary.
+        self.assertEqual(token._state.db, "default")
+        self.assertEqual(token.user._state.db, "default")
+
+    def test_recent_token_missing_on_replica_is_read_from_primary(self):
+        issued = self._issue(recent=True)
+
+        with self.assertNumQueries(1, using="default"):
+            token = TokenService.verify_token(issued.access_token)
+
+        self.assertEqual(token.pk, issued.token_instance.pk)
+
+    def test_old_token_missing_on_replica_is_rejected(self):
+        issued = self._issue()
+
+        with self.assertNumQueries(0, using="default"):
+            self.assertIsNone(TokenService.verify_token(issued.access_token))
+
+    def test_token_lapsed_on_replica_is_rechecked_on_primary(self):
+        # The primary holds a later, auto-refreshed expiry.
+        issued = self._issue()
+        self._replicate(
+            issued, expires_at=timezone.now() - datetime.timedelta(seconds=1)
+        )
+
+        token = TokenService.verify_token(issued.access_token)
+        self.assertEqual(token.pk, issued.token_instance.pk)
+
+    def test_token_expired_beyond_lag_on_replica_is_rejected(self):
+        issued = self._issue()
+        self._replicate(issued, expires_at=timezone.now() - datetime.timedelta(hours=1))
+
+        with self.assertNumQueries(0, using="default"):
+            self.assertIsNone(TokenService.verify_token(issued.access_token))
+
+    async def test_averify_token(self):
+        issued = await TokenService.agenerate_header_token(self.user)
+
+        token = await TokenService.averify_token(issued.access_token)
+        self.assertEqual(token.pk, issued.token_instance.pk)
+
+    def test_on_replica_queryset(self):
+        self.assertEqual(AuthToken.objects.on_replica().db, "replica")
+        with patch.object(authentify_settings, "READ_DATABASE_ALIAS", None):
+            self.assertEqual(AuthToken.objects.on_replica().db, "default")
+
+    def test_admin_changelist_reads_the_replica(self):
+        model_admin = AuthTokenAdmin(AuthToken, site)
+        request = RequestFactory().get("/")
+
+        request.resolver_match = MagicMock(
+            url_name="drf_authentify_authtoken_changelist"
+        )
+        self.assertEqual(model_admin.get_queryset(request).db, "replica")
+
+        request.resolver_match = MagicMock(url_name="drf_authentify_authtoken_change")
+        self.assertEqual(model_admin.get_queryset(request).db, "default")
+
+    def test_admin_changelist_actions_use_the_primary(self):
+        model_admin = AuthTokenAdmin(AuthToken, site)
+        request = RequestFactory().post("/", {"action": "delete_selected"})
+        request.resolver_match = MagicMock(
+            url_name="drf_authentify_authtoken_changelist"
+        )
+
+        self.assertEqual(model_admin.get_queryset(request).db, "default")
@@ -1,15 +1,17 @@
 import datetime
 from unittest.mock import patch
 
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.contrib.auth import get_user_model
 
 from drf_authentify.models import AuthToken
 from drf_authentify.choices import AUTH_TYPES
 from drf_authentify.services import TokenService
-from drf_authentify.utils.tokens import generate_refresh_token
-
+from drf_authentify.settings import authentify_settings
+from drf_authentify.utils.tokens import generate_refresh_token, hash_token_string
 
 User = get_user_model()
 
@@ -89,7 +91,7 @@ class TokenServiceTests(TestCase):
 
     # Patch the hashing utility to return consistent values for testing
     @patch(
-        "drf_authentify.services.hash_token_string", side_effect=mock_hash_token_string
+        "drf_authentify.storage.hash_token_string", side_effect=mock_hash_token_string
     )
     @patch("drf_authentify.models.AuthToken.objects.create_token")
     def test_generate_cookie_token(self, mock_create_token, mock_hash):
@@ -117,7 +119,7 @@ class TokenServiceTests(TestCase):
         self.assertIsNone(kwargs["context"])
 
     @patch(
-        "drf_authentify.services.hash_token_string", side_effect=mock_hash_token_string
+        "drf_authentify.storage.hash_token_string", side_effect=mock_hash_token_string
     )
     @patch("drf_authentify.models.AuthToken.objects.create_token")
     def test_generate_header_token_defaults(self, mock_create_token, mock_hash):
@@ -139,7 +141,7 @@ class TokenServiceTests(TestCase):
     # --- Verification Tests ---
 
     @patch(
-        "drf_authentify.services.hash_token_string", side_effect=mock_hash_token_string
+        "drf_authentify.storage.hash_token_string", side_effect=mock_hash_token_string
     )
     def test_verify_token_valid(self, mock_hash):
         """Should successfully verify an active token and return the instance."""
@@ -152,7 +154,7 @@ class TokenServiceTests(TestCase):
         self.assertEqual(token_instance.pk, self.active_token.pk)
 
     @patch(
-        "drf_authentify.services.hash_token_string", side_effect=mock_hash_token_string
+        "drf_authentify.storage.hash_token_string", side_effect=mock_hash_token_string
     )
     def test_verify_token_expired(self, mock_hash):
         """Should fail to verify an expired token (None returned)."""
@@ -162,7 +164,7 @@ class TokenServiceTests(TestCase):
         self.assertIsNone(token_instance)
 
     @patch(
-        "drf_authentify.services.hash_token_string", side_effect=mock_hash_token_string
+        "drf_authentify.storage.hash_token_string", side_effect=mock_hash_token_string
     )
     def test_verify_token_wrong_auth_type(self, mock_hash):
         """Should fail to verify if the wrong auth type is provided."""
@@ -172,7 +174,7 @@ class TokenServiceTests(TestCase):
         self.assertIsNone(token_instance)
 
     @patch(
-        "drf_authentify.services.hash_token_string", side_effect=mock_hash_token_string
+        "drf_authentify.storage.hash_token_string", side_effect=mock_hash_token_string
     )
     def test_verify_token_no_auth_type(self, mock_hash):
         """Should verify correctly if no auth type is provided (checks both)."""
@@ -222,16 +224,15 @@ class TokenServiceTests(TestCase):
     # --- Refresh Tests ---
 
     @patch(
-        "drf_authentify.services.hash_token_string", side_effect=mock_hash_token_string
+        "drf_authentify.storage.hash_token_string", side_effect=mock_hash_token_string
     )
-    @patch("drf_authentify.services.TokenService._generate_auth_token")
+    @patch("drf_authentify.storage.ORMTokenStorage.issue")
     def test_refresh_token_success_delete(self, mock_generate, mock_hash):
         """Tests successful refresh creates a new token and deletes the old one (default behavior)."""
         initial_pk = self.refreshable_token.pk
 
         # Ensure cleanup setting is OFF (default)
-        with patch("drf_authentify.services.authentify_settings") as mock_settings:
-            mock_settings.KEEP_EXPIRED_TOKENS = False
+        with patch.object(authentify_settings, "KEEP_EXPIRED_TOKENS", False):
 
             # Setup mock return value for the new token
             mock_generate.return_value = "NewIssuedTokens"
@@ -254,7 +255,7 @@ class TokenServiceTests(TestCase):
             )  # Auth type check
 
     @patch(
-        "drf_authentify.services.hash_token_string", side_effect=mock_hash_token_string
+        "drf_authentify.storage.hash_token_string", side_effect=mock_hash_token_string
     )
     def test_refresh_token_invalid_hash(self, mock_hash):
         """Tests refresh fails if refresh token hash doesn't match a token."""
@@ -282,17 +283,13 @@ class TokenServiceTests(TestCase):
         result = TokenService.refresh_token("some_token_that_wont_match_refreshable")
         self.assertIsNone(result)
 
-    @patch("drf_authentify.services.TokenService._generate_auth_token")
-    @patch("drf_authentify.services.authentify_settings")
+    @patch("drf_authentify.storage.ORMTokenStorage.issue")
+    @patch.object(authentify_settings, "KEEP_EXPIRED_TOKENS", True)
     @patch(
-        "drf_authentify.services.hash_token_string", side_effect=mock_hash_token_string
+        "drf_authentify.storage.hash_token_string", side_effect=mock_hash_token_string
     )
-    def test_refresh_token_soft_revoke_cleanup(
-        self, mock_hash, mock_settings, mock_generate
-    ):
+    def test_refresh_token_soft_revoke_cleanup(self, mock_hash, mock_generate):
         """Tests refresh with KEEP_EXPIRED_TOKENS = True soft-revokes the old token."""
-        # Ensure cleanup setting is on
-        mock_settings.KEEP_EXPIRED_TOKENS = True
 
         # Use a fresh, known-valid token for user1
         raw_refresh, hashed_refresh = "soft_revoke_refresh", mock_hash_token_string(
@@ -320,3 +317,313 @@ class TokenServiceTests(TestCase):
         self.assertIsNotNone(old_token.revoked_at)
         self.assertLess(old_token.expires_at, timezone.now())
         self.assertLess(old_token.refresh_until, timezone.now())
+
+
+class AsyncTokenServiceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="async_user", password="password")
+
+    async def test_agenerate_and_averify_header_token(self):
+        issued = await TokenService.agenerate_header_token(
+            self.user, context={"device": "web"}, access_expires_in=3600
+        )
+
+        token = await TokenService.averify_token(issued.access_token, AUTH_TYPES.HEADER)
+        self.assertEqual(token.pk, issued.token_instance.pk)
+        self.assertEqual(token.user, self.user)
+        self.assertEqual(token.context, {"device": "web"})
+
+    async def test_averify_wrong_auth_type(self):
+        issued = await TokenService.agenerate_cookie_token(self.user)
+        self.assertIsNone(
+            await TokenService.averify_token(issued.access_token, AUTH_TYPES.HEADER)
+        )
+
+    async def test_averify_unknown_token(self):
+        self.assertIsNone(await TokenService.averify_token("unknown"))
+
+    async def test_arevoke_token(self):
+        issued = await TokenService.agenerate_header_token(self.user)
+        await TokenService.arevoke_token(issued.token_instance)
+
+        self.assertFalse(
+            await AuthToken.objects.filter(pk=issued.token_instance.pk).aexists()
+        )
+
+    async def test_arevoke_all_user_tokens(self):
+        await TokenService.agenerate_header_token(self.user)
+        await TokenService.agenerate_cookie_token(self.user)
+
+        await TokenService.arevoke_all_user_tokens(self.user)
+        self.assertEqual(await AuthToken.objects.for_user(self.user).acount(), 0)
+
+    async def test_arefresh_token(self):
+        issued = await TokenService.agenerate_header_token(
+            self.user, context={"device": "web"}
+        )
+
+        refreshed = await TokenService.arefresh_token(issued.refresh_token)
+
+        self.assertIsNotNone(refreshed)
+        self.assertNotEqual(refreshed.access_token, issued.access_token)
+        self.assertEqual(refreshed.token_instance.context, {"device": "web"})
+        self.assertFalse(
+            await AuthToken.objects.filter(pk=issued.token_instance.pk).aexists()
+        )
+        self.assertIsNone(await TokenService.arefresh_token(issued.refresh_token))
+
+    async def test_arefresh_token_soft_revoke(self):
+        issued = await TokenService.agenerate_header_token(self.user)
+
+        with patch.object(authentify_settings, "KEEP_EXPIRED_TOKENS", True):
+            await TokenService.arefresh_token(issued.refresh_token)
+
+        old_token = await AuthToken.objects.aget(pk=issued.token_instance.pk)
+        self.assertIsNotNone(old_token.revoked_at)
+        self.assertLess(old_token.expires_at, timezone.now())
+
+    async def test_single_login_uses_transactional_path(self):
+        first = await TokenService.agenerate_header_token(self.user)
+
+        with patch(
+            "drf_authentify.managers.authentify_settings.ENFORCE_SINGLE_LOGIN", True
+        ):
+            await TokenService.agenerate_header_token(self.user)
+
+        self.assertFalse(
+            await AuthToken.objects.filter(pk=first.token_instance.pk).aexists()
+        )
+        self.assertEqual(await AuthToken.objects.for_user(self.user).acount(), 1)
+
+
+class SelectorTokenFormatTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="selector_user", password="pw")
+
+    def setUp(self):
+        patcher = patch.object(authentify_settings, "TOKEN_FORMAT", "selector")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_issued_token_uses_selector_format(self):
+        issued = TokenService.generate_header_token(self.user)
+        selector, _, verifier = issued.access_token.partition(".")
+
+        self.assertTrue(verifier)
+        self.assertEqual(issued.token_instance.access_token_selector, selector)
+
+    def test_verify_looks_up_by_selector(self):
+        issued = TokenService.generate_header_token(self.user)
+
+        with CaptureQueriesContext(connection) as ctx:
+            token = TokenService.verify_token(issued.access_token)
+
+        self.assertEqual(token.pk, issued.token_instance.pk)
+        self.assertIn("access_token_selector", ctx.captured_queries[0]["sql"])
+        self.assertNotIn('"access_token_hash" =', ctx.captured_queries[0]["sql"])
+
+    def test_tampered_verifier_is_rejected(self):
+        issued = TokenService.generate_header_token(self.user)
+        selector = issued.token_instance.access_token_selector
+
+        self.assertIsNone(TokenService.verify_token(f"{selector}.forged-verifier"))
+
+    def test_legacy_opaque_tokens_still_verify(self):
+        with patch.object(authentify_settings, "TOKEN_FORMAT", "opaque"):
+            legacy = TokenService.generate_header_token(self.user)
+
+        self.assertIsNone(legacy.token_instance.access_token_selector)
+        token = TokenService.verify_token(legacy.access_token)
+        self.assertEqual(token.pk, legacy.token_instance.pk)
+
+    async def test_averify_selector_token(self):
+        issued = await TokenService.agenerate_header_token(self.user)
+        token = await TokenService.averify_token(issued.access_token)
+        self.assertEqual(token.pk, issued.token_instance.pk)
+
+
+class HashSchemeMigrationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="scheme_user", password="pw")
+
+    def _switch_scheme(self, legacy):
+        for name, value in (
+            ("SECURE_HASH_ALGORITHM", "blake2b-keyed"),
+            ("LEGACY_HASH_ALGORITHMS", legacy),
+        ):
+            patcher = patch.object(authentify_settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_new_tokens_record_the_current_scheme(self):
+        self._switch_scheme([])
+        issued = TokenService.generate_header_token(self.user)
+
+        self.assertEqual(issued.token_instance.hash_scheme, "blake2b-keyed")
+        self.assertEqual(
+            issued.token_instance.access_token_hash,
+            hash_token_string(issued.access_token, "blake2b-keyed"),
+        )
+
+    def test_legacy_token_is_rejected_without_legacy_scheme(self):
+        issued = TokenService.generate_header_token(self.user)
+        self._switch_scheme([])
+
+        self.assertIsNone(TokenService.verify_token(issued.access_token))
+
+    def test_legacy_token_verifies_in_one_query_and_is_rehashed(self):
+        issued = TokenService.generate_header_token(self.user)
+        self._switch_scheme(["sha256"])
+
+        with CaptureQueriesContext(connection) as ctx:
+            token = TokenService.verify_token(issued.access_token)
+
+        self.assertEqual(token.pk, issued.token_instance.pk)
+        self.assertEqual(len(ctx.captured_queries), 2)  # lookup + rehash
+        self.assertIn(" IN ", ctx.captured_queries[0]["sql"])
+
+        token.refresh_from_db()
+        self.assertEqual(token.hash_scheme, "blake2b-keyed")
+        self.assertEqual(
+            token.access_token_hash,
+            hash_token_string(issued.access_token, "blake2b-keyed"),
+        )
+
+        with self.assertNumQueries(1):
+            self.assertIsNotNone(TokenService.verify_token(issued.access_token))
+
+    def test_hash_under_other_scheme_than_recorded_is_rejected(self):
+        issued = TokenService.generate_header_token(self.user)
+        AuthToken.objects.filter(pk=issued.token_instance.pk).update(
+            hash_scheme="sha512"
+        )
+        self._switch_scheme(["sha256", "sha512"])
+
+        self.assertIsNone(TokenService.verify_token(issued.access_token))
+
+    def test_legacy_refresh_token_rotates_to_current_scheme(self):
+        issued = TokenService.generate_header_token(self.user)
+        self._switch_scheme(["sha256"])
+
+        refreshed = TokenService.refresh_token(issued.refresh_token)
+
+        self.assertIsNotNone(refreshed)
+        self.assertEqual(refreshed.token_instance.hash_scheme, "blake2b-keyed")
+
+    def test_legacy_selector_token_verifies(self):
+        with patch.object(authentify_settings, "TOKEN_FORMAT", "selector"):
+            issued = TokenService.generate_header_token(self.user)
+        self._switch_scheme(["sha256"])
+
+        token = TokenService.verify_token(issued.access_token)
+        self.assertEqual(token.pk, issued.token_instance.pk)
+        self.assertEqual(token.hash_scheme, "blake2b-keyed")
+
+    async def test_averify_rehashes_legacy_token(self):
+        issued = await TokenService.agenerate_header_token(self.user)
+        self._switch_scheme(["sha256"])
+
+        token = await TokenService.averify_token(issued.access_token)
+        self.assertEqual(token.pk, issued.token_instance.pk)
+
+        stored = await AuthToken.objects.aget(pk=token.pk)
+        self.assertEqual(stored.hash_scheme, "blake2b-keyed")
+
+
+class BulkIssuanceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create_user(username=f"bulk_user{i}", password="pw")
+            for i in range(5)
+        ]
+
+    def test_issues_one_verifiable_token_per_user(self):
+        issued = TokenService.generate_tokens_bulk(
+            self.users, AUTH_TYPES.HEADER, context={"role": "service"}
+        )
+
+        self.assertEqual(len(issued), 5)
+        for user, tokens in zip(self.users, issued):
+            token = TokenService.verify_token(tokens.access_token, AUTH_TYPES.HEADER)
+            self.assertEqual(token.user, user)
+            self.assertEqual(token.context, {"role": "service"})
+            self.assertIsNotNone(TokenService.refresh_token(tokens.refresh_token))
+
+    def test_inserts_in_batches(self):
+        with CaptureQueriesContext(connection) as ctx:
+            TokenService.generate_tokens_bulk(
+                self.users, AUTH_TYPES.COOKIE, batch_size=2
+            )
+
+        inserts = [q for q in ctx.captured_queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 3)
+
+    def test_expiry_is_applied(self):
+        issued = TokenService.generate_tokens_bulk(
+            self.users[:1], AUTH_TYPES.HEADER, access_expires_in=60
+        )
+        token = issued[0].token_instance
+        self.assertLessEqual(
+            token.expires_at - token.last_refreshed_at, datetime.timedelta(seconds=60)
+        )
+
+    def test_single_login_revokes_previous_tokens_in_one_statement(self):
+        previous = TokenService.generate_header_token(self.users[0])
+
+        with patch.object(authentify_settings, "ENFORCE_SINGLE_LOGIN", True):
+            with CaptureQueriesContext(connection) as ctx:
+                issued = TokenService.generate_tokens_bulk(
+                    self.users, AUTH_TYPES.HEADER
+                )
+
+        self.assertIsNone(TokenService.verify_token(previous.access_token))
+        self.assertEqual(AuthToken.objects.count(), 5)
+        self.assertEqual(
+            len([q for q in ctx.captured_queries if q["sql"].startswith("DELETE")]),
+            1,
+        )
+        self.assertIsNotNone(TokenService.verify_token(issued[0].access_token))
+
+    def test_single_login_rejects_duplicate_users(self):
+        with patch.object(authentify_settings, "ENFORCE_SINGLE_LOGIN", True):
+            with self.assertRaises(ValueError):
+                TokenService.generate_tokens_bulk(
+                    [self.users[0], self.users[0]], AUTH_TYPES.HEADER
+                )
+        self.assertFalse(AuthToken.objects.exists())
+
+
+class BulkRevocationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = User.objects.create_user(username="bulk_revoke1", password="pw")
+        cls.user2 = User.objects.create_user(username="bulk_revoke2", password="pw")
+
+    def test_revoke_tokens_bulk_returns_count(self):
+        first = TokenService.generate_header_token(self.user1)
+        second = TokenService.generate_header_token(self.user2)
+        third = TokenService.generate_cookie_token(self.user2)
+
+        count = TokenService.revoke_tokens_bulk(
+            users=[self.user1], token_ids=[second.token_instance.pk]
+        )
+
+        self.assertEqual(count, 2)
+        self.assertIsNone(TokenService.verify_token(first.access_token))
+        self.assertIsNone(TokenService.verify_token(second.access_token))
+        self.assertIsNotNone(TokenService.verify_token(third.access_token))
+
+    def test_revoke_token_keeps_row_in_keep_expired_mode(self):
+        issued = TokenService.generate_header_token(self.user1)
+
+        with patch.object(authentify_settings, "KEEP_EXPIRED_TOKENS", True):
+            TokenService.revoke_token(issued.token_instance)
+
+        self.assertIsNone(TokenService.verify_token(issued.access_token))
+        token = AuthToken.objects.get(pk=issued.token_instance.pk)
+        self.assertIsNotNone(token.revoked_at)
+        self.assertIsNone(TokenService.refresh_token(issued.refresh_token))
@@ -2,11 +2,14 @@ from datetime import timedelta
 from unittest.mock import patch
 
 from django.test import TestCase
+from django.utils.module_loading import import_string
 from django.core.exceptions import ImproperlyConfigured
 
+from drf_authentify.storage import get_token_storage
 from drf_authentify.settings import (
     DEFAULTS,
     APISettings,
+    get_handler,
     reload_authentify_settings,
     validate_authentify_settings,
 )
@@ -162,3 +165,227 @@ class SettingsValidationTests(TestCase):
             use_defaults=False,
             custom_data=custom_data,
         )
+
+    def test_unknown_cache_alias_raises_exception(self):
+        """Ensures VERIFY_CACHE_ENABLED requires CACHE_ALIAS to exist in CACHES."""
+        custom_data = DEFAULTS.copy()
+        custom_data.update({"VERIFY_CACHE_ENABLED": True, "CACHE_ALIAS": "missing"})
+        self._test_invalid_setting(
+            setting_key=None,
+            setting_value=None,
+            expected_regex=r"CACHE_ALIAS 'missing' is not defined in CACHES.",
+            use_defaults=False,
+            custom_data=custom_data,
+        )
+
+    def test_auto_refresh_jitter_out_of_range_raises_exception(self):
+        """Ensures AUTO_REFRESH_JITTER is a share of the interval below 1."""
+        self._test_invalid_setting(
+            "AUTO_REFRESH_JITTER",
+            1.0,
+            r"DRF_AUTHENTIFY setting 'AUTO_REFRESH_JITTER' must be at least 0 and below 1.",
+        )
+
+    def test_invalid_token_partition_key_raises_exception(self):
+        """Ensures tokens are partitioned on a supported date column."""
+        self._test_invalid_setting(
+            "TOKEN_PARTITION_KEY",
+            "last_refreshed_at",
+            r"DRF_AUTHENTIFY setting 'TOKEN_PARTITION_KEY' must be one of: created_at, expires_at.",
+        )
+
+    def test_partial_day_partition_interval_raises_exception(self):
+        """Ensures partitions span whole days, as their names are dates."""
+        self._test_invalid_setting(
+            "TOKEN_PARTITION_INTERVAL",
+            timedelta(hours=12),
+            r"DRF_AUTHENTIFY setting 'TOKEN_PARTITION_INTERVAL' must be a whole number of days.",
+        )
+
+    def test_unknown_read_database_alias_raises_exception(self):
+        """Ensures READ_DATABASE_ALIAS names a configured database."""
+        self._test_invalid_setting(
+            "READ_DATABASE_ALIAS",
+            "missing",
+            r"DRF_AUTHENTIFY setting READ_DATABASE_ALIAS 'missing' is not defined in DATABASES.",
+        )
+
+    def test_unknown_token_shard_raises_exception(self):
+        """Ensures TOKEN_SHARDS only names configured databases."""
+        self._test_invalid_setting(
+            "TOKEN_SHARDS",
+            ["default", "missing"],
+            r"DRF_AUTHENTIFY setting 'TOKEN_SHARDS' names databases not defined in DATABASES: missing.",
+        )
+
+    def test_duplicate_token_shard_raises_exception(self):
+        """Ensures a shard index maps to a single database."""
+        self._test_invalid_setting(
+            "TOKEN_SHARDS",
+            ["default", "default"],
+            r"DRF_AUTHENTIFY setting 'TOKEN_SHARDS' cannot list an alias twice.",
+        )
+
+    def test_signed_token_format_requires_token_ttl(self):
+        """Ensures signed tokens always carry an expiry."""
+        custom_data = DEFAULTS.copy()
+        custom_data.update({"TOKEN_FORMAT": "signed", "TOKEN_TTL": None})
+        self._test_invalid_setting(
+            setting_key=None,
+            setting_value=None,
+            expected_regex=r"TOKEN_FORMAT 'signed' requires TOKEN_TTL.",
+            use_defaults=False,
+            custom_data=custom_data,
+        )
+
+    def test_signed_token_format_rejects_auto_refresh(self):
+        """Ensures AUTO_REFRESH is not combined with fixed-expiry signed tokens."""
+        custom_data = DEFAULTS.copy()
+        custom_data.update(
+            {
+                "TOKEN_FORMAT": "signed",
+                "AUTO_REFRESH": True,
+                "AUTO_REFRESH_INTERVAL": timedelta(hours=1),
+                "AUTO_REFRESH_MAX_TTL": timedelta(days=7),
+            }
+        )
+        self._test_invalid_setting(
+            setting_key=None,
+            setting_value=None,
+            expected_regex=r"AUTO_REFRESH cannot be enabled with TOKEN_FORMAT 'signed'",
+            use_defaults=False,
+            custom_data=custom_data,
+        )
+
+    def test_refresh_grace_period_requires_cache_alias(self):
+        """Ensures REFRESH_GRACE_PERIOD requires CACHE_ALIAS to exist in CACHES."""
+        custom_data = DEFAULTS.copy()
+        custom_data.update(
+            {"REFRESH_GRACE_PERIOD": timedelta(seconds=30), "CACHE_ALIAS": "missing"}
+        )
+        self._test_invalid_setting(
+            setting_key=None,
+            setting_value=None,
+            expected_regex=r"CACHE_ALIAS 'missing' is not defined in CACHES.",
+            use_defaults=False,
+            custom_data=custom_data,
+        )
+
+    def test_non_string_handler_in_list_raises_exception(self):
+        """Ensures handler lists may only contain import paths."""
+        self._test_invalid_setting(
+            "POST_AUTH_HANDLER",
+            ["tests.test_util_imports.append_a", 1],
+            r"All items in DRF_AUTHENTIFY setting 'POST_AUTH_HANDLER' must be strings.",
+        )
+
+    def test_unknown_token_format_raises_exception(self):
+        """Ensures TOKEN_FORMAT is one of the supported formats."""
+        self._test_invalid_setting(
+            "TOKEN_FORMAT",
+            "jwt",
+            r"DRF_AUTHENTIFY setting 'TOKEN_FORMAT' must be one of: opaque, selector, signed.",
+        )
+
+    def test_janitor_max_interval_shorter_than_interval_raises_exception(self):
+        """Ensures the janitor back-off ceiling is not below its base interval."""
+        self._test_invalid_setting(
+            "JANITOR_MAX_INTERVAL",
+            timedelta(minutes=1),
+            r"JANITOR_MAX_INTERVAL cannot be shorter than JANITOR_INTERVAL.",
+        )
+
+    def test_keyed_hash_schemes_are_valid(self):
+        """Ensures keyed schemes are accepted as current and legacy algorithms."""
+        temp_settings = APISettings(
+            {
+                "SECURE_HASH_ALGORITHM": "blake2b-keyed",
+                "LEGACY_HASH_ALGORITHMS": ["sha256", "hmac-sha512"],
+            },
+            DEFAULTS,
+        )
+        with patch("drf_authentify.settings.authentify_settings", temp_settings):
+            validate_authentify_settings()
+
+    def test_invalid_legacy_hash_algorithm_raises_exception(self):
+        """Ensures every LEGACY_HASH_ALGORITHMS entry is a supported scheme."""
+        self._test_invalid_setting(
+            "LEGACY_HASH_ALGORITHMS",
+            ["sha256", "hmac-nope"],
+            r"'hmac-nope' is not found in hashlib.",
+        )
+
+    def test_unknown_token_storage_raises_exception(self):
+        """Ensures TOKEN_STORAGE names an importable engine."""
+        self._test_invalid_setting(
+            "TOKEN_STORAGE",
+            "drf_authentify.storage.MissingTokenStorage",
+            r"TOKEN_STORAGE 'drf_authentify.storage.MissingTokenStorage' cannot be imported.",
+        )
+
+    def test_record_token_storage_rejects_table_features(self):
+        """Ensures engines without the token table refuse the features built on it."""
+        for storage in ("MemoryTokenStorage", "CacheTokenStorage"):
+            for key, value in (
+                ("AUTO_REFRESH", True),
+                ("KEEP_EXPIRED_TOKENS", True),
+                ("VERIFY_CACHE_ENABLED", True),
+                ("BLOOM_FILTER_ENABLED", True),
+                ("TOKEN_FORMAT", "signed"),
+            ):
+                with self.subTest(storage=storage, setting=key):
+                    self._test_invalid_setting(
+                        None,
+                        None,
+                        rf"TOKEN_STORAGE '.*{storage}' cannot be combined with: {key}",
+                        use_defaults=False,
+                        custom_data={
+                            "TOKEN_STORAGE": f"drf_authentify.storage.{storage}",
+                            key: value,
+                        },
+                    )
+
+    def test_reload_drops_storage_engines(self):
+        """Ensures engines built for the previous settings are not reused."""
+        engine = get_token_storage()
+
+        reload_authentify_settings(setting="DRF_AUTHENTIFY", value=None)
+
+        self.assertIsNot(get_token_storage(), engine)
+
+
+class HandlerResolutionTests(TestCase):
+    def setUp(self):
+        reload_authentify_settings(setting="DRF_AUTHENTIFY", value=None)
+
+    def tearDown(self):
+        reload_authentify_settings(setting="DRF_AUTHENTIFY", value=None)
+
+    def test_handler_is_imported_once(self):
+        path = "tests.test_util_imports.append_b"
+        with patch(
+            "drf_authentify.utils.imports.import_string", wraps=import_string
+        ) as mock_import:
+            for _ in range(3):
+                handler = get_handler("POST_AUTO_REFRESH_HANDLER", path)
+
+        mock_import.assert_called_once_with(path)
+        self.assertEqual(handler([], "t", "raw"), (["b"], "t"))
+
+    def test_reload_resolves_handlers_eagerly(self):
+        with self.assertRaises(ImproperlyConfigured):
+            reload_authentify_settings(
+                setting="DRF_AUTHENTIFY",
+                value={"POST_AUTH_HANDLER": "missing.module.handler"},
+            )
+
+    def test_chain_is_cached_per_value(self):
+        paths = [
+            "tests.test_util_imports.append_a",
+            "tests.test_util_imports.append_b",
+        ]
+        first = get_handler("POST_AUTH_HANDLER", paths)
+        second = get_handler("POST_AUTH_HANDLER", list(paths))
+
+        self.assertIs(first, second)
+        self.assertEqual(first(user=[], token="t", token_str="raw"), (["a", "b"], "t"))
@@ -0,0 +1,223 @@
+import datetime
+import threading
+from unittest.mock import patch
+
+from django.test import TestCase, TransactionTestCase
+from django.core.cache import caches
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+
+from drf_authentify.models import AuthToken
+from drf_authentify.choices import AUTH_TYPES
+from drf_authentify.services import TokenService
+from drf_authentify.cache import negative_cache
+from drf_authentify.sharding import token_shards
+from drf_authentify.settings import authentify_settings
+
+User = get_user_model()
+
+SHARDS = ["default", "shard"]
+
+
+def _shard_users(prefix):
+    """Create one user per shard, with the user rows copied to every shard."""
+    users = {}
+    index = 0
+    with patch.object(authentify_settings, "TOKEN_SHARDS", SHARDS):
+        while len(users) < len(SHARDS):
+            user = User.objects.create_user(username=f"{prefix}{index}", password="pw")
+            User.objects.get(pk=user.pk).save(using="shard")
+            users.setdefault(token_shards.for_user(user), user)
+            index += 1
+    return users
+
+
+class TokenShardsTests(TestCase):
+    databases = {"default", "shard"}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = _shard_users("sharded_user")
+        cls.user = cls.users["shard"]
+
+    def setUp(self):
+        patcher = patch.object(authentify_settings, "TOKEN_SHARDS", SHARDS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_tokens_are_stored_on_the_users_shard(self):
+        for alias, user in self.users.items():
+            issued = TokenService.generate_header_token(user)
+
+            self.assertEqual(issued.token_instance._state.db, alias)
+            self.assertTrue(issued.access_token.startswith(f"{SHARDS.index(alias)}~"))
+            self.assertTrue(AuthToken.objects.using(alias).filter(user=user).exists())
+
+    def test_verification_reads_the_embedded_shard(self):
+        issued = TokenService.generate_header_token(self.user)
+
+        with self.assertNumQueries(0, using="default"):
+            token = TokenService.verify_token(issued.access_token)
+
+        self.assertEqual(token.pk, issued.token_instance.pk)
+        self.assertEqual(token._state.db, "shard")
+        self.assertEqual(token.user._state.db, "default")
+
+    def test_token_issued_before_sharding_is_read_from_the_default_database(self):
+        with patch.object(authentify_settings, "TOKEN_SHARDS", []):
+            issued = TokenService.generate_header_token(self.user)
+
+        self.assertNotIn("~", issued.access_token)
+        token = TokenService.verify_token(issued.access_token)
+        self.assertEqual(token.pk, issued.token_instance.pk)
+        self.assertEqual(token._state.db, "default")
+
+    def test_unknown_shard_is_rejected(self):
+        issued = TokenService.generate_header_token(self.user)
+        forged = "9~" + issued.access_token.partition("~")[2]
+
+        with self.assertNumQueries(0, using="default"):
+            self.assertIsNone(TokenService.verify_token(forged))
+
+    def test_revoke_token_on_its_shard(self):
+        issued = TokenService.generate_header_token(self.user)
+        token = TokenService.verify_token(issued.access_token)
+
+        TokenService.revoke_token(token)
+
+        self.assertIsNone(TokenService.verify_token(issued.access_token))
+
+    def test_revoke_all_user_tokens_covers_every_shard(self):
+        sharded = TokenService.generate_header_token(self.user)
+        # A token stored on another shard, e.g. before a shard was added.
+        legacy = AuthToken.objects.db_manager("default").create_token(
+            self.user, AUTH_TYPES.HEADER
+        )
+
+        TokenService.revoke_all_user_tokens(self.user)
+
+        self.assertIsNone(TokenService.verify_token(sharded.access_token))
+        self.assertIsNone(TokenService.verify_token(legacy.access_token))
+
+    def test_revoke_tokens_bulk_sums_shards(self):
+        for user in self.users.values():
+            TokenService.generate_header_token(user)
+
+        self.assertEqual(
+            TokenService.revoke_tokens_bulk(users=list(self.users.values())), 2
+        )
+        with self.assertRaisesRegex(ValueError, "TOKEN_SHARDS"):
+            TokenService.revoke_tokens_bulk(token_ids=[1])
+
+    def test_single_login_revokes_tokens_on_other_shards(self):
+        legacy = AuthToken.objects.db_manager("default").create_token(
+            self.user, AUTH_TYPES.HEADER
+        )
+
+        with patch.object(authentify_settings, "ENFORCE_SINGLE_LOGIN", True):
+            issued = TokenService.generate_header_token(self.user)
+
+        self.assertIsNone(TokenService.verify_token(legacy.access_token))
+        self.assertIsNotNone(TokenService.verify_token(issued.access_token))
+
+    def test_refresh_keeps_the_shard(self):
+        issued = TokenService.generate_header_token(self.user)
+
+        refreshed = TokenService.refresh_token(issued.refresh_token)
+
+        self.assertEqual(refreshed.token_instance._state.db, "shard")
+        self.assertTrue(refreshed.access_token.startswith("1~"))
+        self.assertIsNone(TokenService.refresh_token(issued.refresh_token))
+        self.assertEqual(
+            TokenService.verify_token(refreshed.access_token).pk,
+            refreshed.token_instance.pk,
+        )
+
+    def test_bulk_generation_preserves_order(self):
+        users = [self.users["shard"], self.users["default"]]
+
+        issued = TokenService.generate_tokens_bulk(users, AUTH_TYPES.HEADER)
+
+        self.assertEqual([i.token_instance.user for i in issued], users)
+        self.assertEqual(
+            [i.token_instance._state.db for i in issued], ["shard", "default"]
+        )
+
+    def test_purge_merges_shard_results(self):
+        expired = timezone.now() - datetime.timedelta(hours=1)
+        for alias, user in self.users.items():
+            issued = TokenService.generate_header_token(user)
+            AuthToken.objects.using(alias).filter(pk=issued.token_instance.pk).update(
+                expires_at=expired, refresh_until=expired
+            )
+
+        result = TokenService.purge_expired_tokens()
+
+        self.assertEqual(result.deleted, 2)
+        self.assertTrue(result.completed)
+        for alias in SHARDS:
+            self.assertFalse(AuthToken.objects.using(alias).exists())
+
+    def test_bloom_filter_rebuild_covers_every_shard(self):
+        caches[authentify_settings.CACHE_ALIAS].clear()
+        negative_cache.clear()
+        self.addCleanup(negative_cache.clear)
+        patcher = patch.object(authentify_settings, "BLOOM_FILTER_ENABLED", True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        issued = TokenService.generate_header_token(self.user)
+        self.assertEqual(issued.token_instance._state.db, "shard")
+        negative_cache.rebuild()
+
+        self.assertIsNotNone(TokenService.verify_token(issued.access_token))
+        self.assertEqual(negative_cache.stats()["bloom_rejections"], 0)
+
+    async def test_async_api(self):
+        issued = await TokenService.agenerate_header_token(self.user)
+        self.assertEqual(issued.token_instance._state.db, "shard")
+
+        token = await TokenService.averify_token(issued.access_token)
+        self.assertEqual(token.pk, issued.token_instance.pk)
+
+        await TokenService.arevoke_all_user_tokens(self.user)
+        self.assertIsNone(await TokenService.averify_token(issued.access_token))
+
+
+class TokenShardsFanOutTests(TransactionTestCase):
+    databases = {"default", "shard"}
+
+    def setUp(self):
+        patcher = patch.object(authentify_settings, "TOKEN_SHARDS", SHARDS)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.users = _shard_users("fan_out_user")
+
+    def test_shards_are_handled_in_parallel(self):
+        def count(alias):
+            return (
+                threading.current_thread().name,
+                AuthToken.objects.using(alias).count(),
+            )
+
+        for user in self.users.values():
+            TokenService.generate_header_token(user)
+
+        results = token_shards.fan_out(count)
+
+        self.assertEqual([tokens for _, tokens in results], [1, 1])
+        for thread_name, _ in results:
+            self.assertTrue(thread_name.startswith("drf-authentify-shard"))
+
+    def test_revoke_all_user_tokens(self):
+        user = self.users["shard"]
+        sharded = TokenService.generate_header_token(user)
+        legacy = AuthToken.objects.db_manager("default").create_token(
+            user, AUTH_TYPES.HEADER
+        )
+
+        TokenService.revoke_all_user_tokens(user)
+
+        self.assertIsNone(TokenService.verify_token(sharded.access_token))
+        self.assertIsNone(TokenService.verify_token(legacy.access_token))
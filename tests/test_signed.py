@@ -0,0 +1,176 @@
+import datetime
+from unittest.mock import patch
+
+from django.test import TestCase, RequestFactory
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+
+from drf_authentify.choices import AUTH_TYPES
+from drf_authentify.services import TokenService
+from drf_authentify.models import AuthToken, RevokedToken
+from drf_authentify.denylist import signed_token_denylist
+from drf_authentify.auth import AuthorizationHeaderAuthentication
+from drf_authentify.settings import authentify_settings
+from drf_authentify.utils.tokens import get_context_digest, load_signed_token
+
+User = get_user_model()
+
+
+class SignedTokenTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="signed_user", password="pw")
+
+    def setUp(self):
+        patcher = patch.object(authentify_settings, "TOKEN_FORMAT", "signed")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        signed_token_denylist.clear()
+        self.addCleanup(signed_token_denylist.clear)
+
+    def _issue(self, **kwargs):
+        return TokenService.generate_header_token(self.user, **kwargs)
+
+    def test_token_carries_signed_claims(self):
+        issued = self._issue(context={"device": "web"})
+        payload = load_signed_token(issued.access_token)
+
+        self.assertEqual(payload["s"], issued.token_instance.access_token_selector)
+        self.assertEqual(payload["u"], self.user.pk)
+        self.assertEqual(payload["a"], AUTH_TYPES.HEADER)
+        self.assertEqual(
+            payload["e"], int(issued.token_instance.expires_at.timestamp())
+        )
+        self.assertEqual(payload["c"], get_context_digest({"device": "web"}))
+
+    def test_verification_skips_token_table(self):
+        issued = self._issue()
+        signed_token_denylist.sync()
+
+        # Only the user is loaded.
+        with self.assertNumQueries(1):
+            token = TokenService.verify_token(issued.access_token, AUTH_TYPES.HEADER)
+
+        self.assertIsNone(token.pk)
+        self.assertEqual(token.user, self.user)
+        self.assertEqual(
+            token.access_token_selector, issued.token_instance.access_token_selector
+        )
+
+    def test_header_authentication(self):
+        issued = self._issue()
+        request = RequestFactory().get(
+            "/", HTTP_AUTHORIZATION=f"Bearer {issued.access_token}"
+        )
+
+        user, token = AuthorizationHeaderAuthentication().authenticate(request)
+        self.assertEqual(user, self.user)
+        self.assertEqual(token.auth_type, AUTH_TYPES.HEADER)
+
+    def test_tampered_token_is_rejected(self):
+        issued = self._issue()
+        payload, signature = issued.access_token.rsplit(":", 1)
+
+        self.assertIsNone(TokenService.verify_token(f"{payload}:{signature[::-1]}"))
+
+    def test_auth_type_is_enforced(self):
+        issued = self._issue()
+        self.assertIsNone(
+            TokenService.verify_token(issued.access_token, AUTH_TYPES.COOKIE)
+        )
+
+    def test_expired_token_is_rejected(self):
+        issued = self._issue()
+
+        later = timezone.now() + datetime.timedelta(days=2)
+        with patch("django.utils.timezone.now", return_value=later):
+            self.assertIsNone(TokenService.verify_token(issued.access_token))
+
+    def test_revoked_token_is_denied_immediately(self):
+        issued = self._issue()
+        token = TokenService.verify_token(issued.access_token)
+
+        TokenService.revoke_token(token)
+
+        self.assertIsNone(TokenService.verify_token(issued.access_token))
+        self.assertFalse(AuthToken.objects.filter(pk=issued.token_instance.pk).exists())
+
+    def test_deleted_tokens_are_denied(self):
+        instance = self._issue()
+        queryset = self._issue()
+        expired = self._issue(access_expires_in=-60)
+
+        instance.token_instance.delete()
+        AuthToken.objects.filter(
+            pk__in=[queryset.token_instance.pk, expired.token_instance.pk]
+        ).delete()
+
+        self.assertIsNone(TokenService.verify_token(instance.access_token))
+        self.assertIsNone(TokenService.verify_token(queryset.access_token))
+        # Expired tokens are rejected anyway and need no entry.
+        self.assertEqual(RevokedToken.objects.count(), 2)
+
+    def test_revocation_in_other_process_applies_after_sync(self):
+        issued = self._issue()
+        signed_token_denylist.sync()
+
+        # Another process revokes the token: only the table is updated.
+        RevokedToken.objects.create(
+            selector=issued.token_instance.access_token_selector,
+            expires_at=issued.token_instance.expires_at,
+        )
+        self.assertIsNotNone(TokenService.verify_token(issued.access_token))
+
+        with patch.object(
+            authentify_settings,
+            "SIGNED_TOKEN_DENYLIST_SYNC_INTERVAL",
+            datetime.timedelta(seconds=0),
+        ):
+            self.assertIsNone(TokenService.verify_token(issued.access_token))
+
+    def test_refresh_denies_previous_access_token(self):
+        for keep in (False, True):
+            with (
+                self.subTest(keep=keep),
+                patch.object(authentify_settings, "KEEP_EXPIRED_TOKENS", keep),
+            ):
+                issued = self._issue()
+                refreshed = TokenService.refresh_token(issued.refresh_token)
+
+                self.assertIsNone(TokenService.verify_token(issued.access_token))
+                self.assertIsNotNone(TokenService.verify_token(refreshed.access_token))
+
+    def test_single_login_denies_previous_tokens(self):
+        first = self._issue()
+        with patch.object(authentify_settings, "ENFORCE_SINGLE_LOGIN", True):
+            self._issue()
+
+        self.assertIsNone(TokenService.verify_token(first.access_token))
+
+    def test_purge_prunes_expired_entries(self):
+        now = timezone.now()
+        RevokedToken.objects.create(selector="a" * 12, expires_at=now)
+        RevokedToken.objects.create(
+            selector="b" * 12, expires_at=now + datetime.timedelta(hours=1)
+        )
+
+        TokenService.purge_expired_tokens()
+
+        self.assertEqual(
+            list(RevokedToken.objects.values_list("selector", flat=True)),
+            ["b" * 12],
+        )
+
+    def test_opaque_tokens_still_verify(self):
+        with patch.object(authentify_settings, "TOKEN_FORMAT", "opaque"):
+            issued = self._issue()
+
+        token = TokenService.verify_token(issued.access_token)
+        self.assertEqual(token.pk, issued.token_instance.pk)
+
+    async def test_averify_token(self):
+        issued = await TokenService.agenerate_header_token(self.user)
+
+        token = await TokenService.averify_token(issued.access_token)
+        self.assertEqual(token.user, self.user)
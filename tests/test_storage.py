@@ -0,0 +1,285 @@
+import datetime
+import pickle
+from unittest.mock import MagicMock, patch
+
+from django.core.cache import caches
+from django.test import TestCase
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+
+from drf_authentify.models import AuthToken
+from drf_authentify.choices import AUTH_TYPES
+from drf_authentify.services import TokenService
+from drf_authentify.settings import authentify_settings
+from drf_authentify.storage import (
+    TokenRecord,
+    BaseTokenStorage,
+    CacheTokenStorage,
+    MemoryTokenStorage,
+    get_token_storage,
+)
+
+User = get_user_model()
+
+
+class TokenStorageContract:
+    """Behaviour every TOKEN_STORAGE engine shares, exercised via TokenService."""
+
+    storage_path = None
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="storage_user", password="pw")
+        cls.other = User.objects.create_user(username="storage_other", password="pw")
+
+    def setUp(self):
+        patcher = patch.object(authentify_settings, "TOKEN_STORAGE", self.storage_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        caches[authentify_settings.CACHE_ALIAS].clear()
+        self.storage = get_token_storage()
+        if isinstance(self.storage, MemoryTokenStorage):
+            self.storage.clear()
+            self.addCleanup(self.storage.clear)
+
+    def test_issue_and_verify(self):
+        issued = TokenService.generate_header_token(self.user, context={"a": 1})
+
+        token = TokenService.verify_token(issued.access_token)
+
+        self.assertEqual(token.user, self.user)
+        self.assertEqual(token.auth_type, AUTH_TYPES.HEADER)
+        self.assertEqual(token.context, {"a": 1})
+        self.assertIsNone(TokenService.verify_token(issued.access_token, "cookie"))
+        self.assertIsNone(TokenService.verify_token("unknown"))
+
+    def test_expired_token_is_rejected(self):
+        issued = TokenService.generate_header_token(self.user, access_expires_in=60)
+
+        with patch(
+            "django.utils.timezone.now",
+            return_value=timezone.now() + datetime.timedelta(minutes=2),
+        ):
+            self.assertIsNone(TokenService.verify_token(issued.access_token))
+
+    def test_revoke(self):
+        issued = TokenService.generate_header_token(self.user)
+        kept = TokenService.generate_header_token(self.other)
+
+        TokenService.revoke_token(TokenService.verify_token(issued.access_token))
+
+        self.assertIsNone(TokenService.verify_token(issued.access_token))
+        self.assertIsNotNone(TokenService.verify_token(kept.access_token))
+
+    def test_revoke_user(self):
+        first = TokenService.generate_header_token(self.user)
+        second = TokenService.generate_cookie_token(self.user)
+        kept = TokenService.generate_header_token(self.other)
+
+        TokenService.revoke_all_user_tokens(self.user)
+
+        self.assertIsNone(TokenService.verify_token(first.access_token))
+        self.assertIsNone(TokenService.verify_token(second.access_token))
+        self.assertIsNotNone(TokenService.verify_token(kept.access_token))
+        # Tokens issued afterwards are unaffected.
+        later = TokenService.generate_header_token(self.user)
+        self.assertIsNotNone(TokenService.verify_token(later.access_token))
+
+    def test_refresh_claim_succeeds_once(self):
+        issued = TokenService.generate_header_token(self.user)
+
+        refreshed = TokenService.refresh_token(issued.refresh_token)
+
+        self.assertEqual(refreshed.token_instance.user, self.user)
+        self.assertIsNone(TokenService.refresh_token(issued.refresh_token))
+        self.assertIsNone(TokenService.verify_token(issued.access_token))
+        self.assertIsNotNone(TokenService.verify_token(refreshed.access_token))
+
+    async def test_async_api(self):
+        issued = await TokenService.agenerate_header_token(self.user)
+
+        token = await TokenService.averify_token(issued.access_token)
+        self.assertEqual(token.user_id, self.user.pk)
+
+        await TokenService.arevoke_all_user_tokens(self.user)
+        self.assertIsNone(await TokenService.averify_token(issued.access_token))
+
+
+class PurgeContract:
+    """Behaviour of the engines that purge tokens (cache entries expire alone)."""
+
+    def test_revoke_expired_user_tokens_spares_other_users(self):
+        for user in (self.user, self.user, self.other):
+            TokenService.generate_header_token(
+                user, access_expires_in=60, refresh_expires_in=60
+            )
+        live = TokenService.generate_header_token(self.user)
+
+        later = timezone.now() + datetime.timedelta(minutes=2)
+        with patch("django.utils.timezone.now", return_value=later):
+            self.assertEqual(
+                TokenService.purge_expired_tokens(dry_run=True, user=self.user).deleted,
+                2,
+            )
+            TokenService.revoke_all_expired_user_tokens(self.user)
+
+            self.assertEqual(TokenService.purge_expired_tokens(dry_run=True).deleted, 1)
+            self.assertIsNotNone(TokenService.verify_token(live.access_token))
+
+
+class ORMTokenStorageTests(TokenStorageContract, PurgeContract, TestCase):
+    storage_path = "drf_authentify.storage.ORMTokenStorage"
+
+    def test_claim_refresh(self):
+        issued = TokenService.generate_header_token(self.user)
+
+        token = self.storage.claim_refresh(issued.refresh_token)
+
+        self.assertEqual(token.pk, issued.token_instance.pk)
+        self.assertIsNone(self.storage.claim_refresh(issued.refresh_token))
+
+
+class MemoryTokenStorageTests(TokenStorageContract, PurgeContract, TestCase):
+    storage_path = "drf_authentify.storage.MemoryTokenStorage"
+
+    def test_tokens_stay_out_of_the_database(self):
+        TokenService.generate_header_token(self.user)
+
+        self.assertFalse(AuthToken.objects.exists())
+        self.assertEqual(len(self.storage), 1)
+
+    def test_single_login(self):
+        first = TokenService.generate_header_token(self.user)
+        with patch.object(authentify_settings, "ENFORCE_SINGLE_LOGIN", True):
+            second = TokenService.generate_header_token(self.user)
+
+        self.assertIsNone(TokenService.verify_token(first.access_token))
+        self.assertIsNotNone(TokenService.verify_token(second.access_token))
+
+    def test_purge_drops_dead_tokens_in_expiry_order(self):
+        TokenService.generate_header_token(
+            self.user, access_expires_in=60, refresh_expires_in=60
+        )
+        live = TokenService.generate_header_token(self.other)
+        revoked = TokenService.generate_header_token(
+            self.other, access_expires_in=60, refresh_expires_in=60
+        )
+        TokenService.revoke_token(TokenService.verify_token(revoked.access_token))
+
+        later = timezone.now() + datetime.timedelta(minutes=2)
+        with patch("django.utils.timezone.now", return_value=later):
+            self.assertEqual(TokenService.purge_expired_tokens(dry_run=True).deleted, 1)
+            result = TokenService.purge_expired_tokens()
+
+        self.assertEqual(result.deleted, 1)
+        self.assertEqual(len(self.storage), 1)
+        self.assertIsNotNone(TokenService.verify_token(live.access_token))
+
+    def test_token_ids_need_the_orm(self):
+        with self.assertRaisesRegex(ValueError, "ORM token storage"):
+            TokenService.revoke_tokens_bulk(token_ids=[1])
+        TokenService.generate_header_token(self.user)
+        self.assertEqual(TokenService.revoke_tokens_bulk(users=[self.user]), 1)
+
+
+class CacheTokenStorageTests(TokenStorageContract, TestCase):
+    storage_path = "drf_authentify.storage.CacheTokenStorage"
+
+    def test_verification_needs_no_queries_for_the_token(self):
+        issued = TokenService.generate_header_token(self.user)
+
+        # Only the user is loaded from the database.
+        with self.assertNumQueries(1):
+            TokenService.verify_token(issued.access_token)
+        self.assertFalse(AuthToken.objects.exists())
+
+    def test_single_login(self):
+        first = TokenService.generate_header_token(self.user)
+        with patch.object(authentify_settings, "ENFORCE_SINGLE_LOGIN", True):
+            second = TokenService.generate_header_token(self.user)
+
+        self.assertIsNone(TokenService.verify_token(first.access_token))
+        self.assertIsNotNone(TokenService.verify_token(second.access_token))
+
+    def test_entries_expire_with_the_token(self):
+        with patch.object(CacheTokenStorage, "backend") as backend:
+            TokenService.generate_header_token(
+                self.user, access_expires_in=60, refresh_expires_in=120
+            )
+
+        entries, timeout = backend.set_many.call_args.args
+        self.assertEqual(len(entries), 2)
+        self.assertAlmostEqual(timeout, 120, delta=1)
+
+
+class DelegationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="delegation_user", password="pw")
+
+    def setUp(self):
+        self.engine = MagicMock(spec=BaseTokenStorage)
+        patcher = patch(
+            "drf_authentify.services.get_token_storage", return_value=self.engine
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_every_operation_goes_through_the_engine(self):
+        token = AuthToken(user=self.user, auth_type=AUTH_TYPES.HEADER)
+        calls = [
+            (lambda: TokenService.generate_header_token(self.user), "issue"),
+            (
+                lambda: TokenService.generate_tokens_bulk([self.user], "header"),
+                "issue_many",
+            ),
+            (lambda: TokenService.verify_token("raw"), "verify"),
+            (
+                lambda: TokenService.refresh_token("raw", access_expires_in=60),
+                "refresh",
+            ),
+            (lambda: TokenService.revoke_token(token), "revoke"),
+            (lambda: TokenService.revoke_all_user_tokens(self.user), "revoke_user"),
+            (lambda: TokenService.revoke_tokens_bulk(users=[self.user]), "revoke_many"),
+            (lambda: TokenService.revoke_all_expired_user_tokens(self.user), "purge"),
+            (lambda: TokenService.revoke_expired_tokens(), "delete_expired"),
+            (lambda: TokenService.purge_expired_tokens(batch_size=10), "purge"),
+        ]
+        for call, method in calls:
+            with self.subTest(method=method):
+                self.engine.reset_mock()
+                call()
+                getattr(self.engine, method).assert_called_once()
+
+    def test_expiry_seconds_reach_the_engine_as_timedeltas(self):
+        TokenService.refresh_token("raw", access_expires_in=60)
+
+        self.engine.refresh.assert_called_once_with(
+            "raw",
+            access_expires_in=datetime.timedelta(seconds=60),
+            refresh_expires_in=None,
+        )
+
+    async def test_async_operations_go_through_the_engine(self):
+        token = AuthToken(user=self.user, auth_type=AUTH_TYPES.HEADER)
+
+        await TokenService.agenerate_header_token(self.user)
+        await TokenService.averify_token("raw")
+        await TokenService.arevoke_token(token)
+        await TokenService.arevoke_all_user_tokens(self.user)
+
+        self.engine.aissue.assert_awaited_once()
+        self.engine.averify.assert_awaited_once()
+        self.engine.arevoke.assert_awaited_once_with(token)
+        self.engine.arevoke_user.assert_awaited_once_with(self.user)
+
+
+class TokenRecordTests(TestCase):
+    def test_record_is_slotted_and_picklable(self):
+        now = timezone.now()
+        record = TokenRecord(pk=1, user_id=2, expires_at=now, refresh_until=None)
+
+        self.assertFalse(hasattr(record, "__dict__"))
+        copy = pickle.loads(pickle.dumps(record))
+        self.assertEqual((copy.pk, copy.dead_at), (1, now))
@@ -0,0 +1,35 @@
+from django.test import SimpleTestCase
+
+from drf_authentify.utils.bloom import BloomFilter
+from drf_authentify.utils.tokens import generate_access_token
+
+
+class BloomFilterTests(SimpleTestCase):
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        hashes = [generate_access_token()[1] for _ in range(1000)]
+        for hashed in hashes:
+            bloom.add(hashed)
+
+        self.assertTrue(all(hashed in bloom for hashed in hashes))
+
+    def test_false_positive_rate_is_bounded(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for _ in range(1000):
+            bloom.add(generate_access_token()[1])
+
+        probes = [generate_access_token()[1] for _ in range(5000)]
+        false_positives = sum(hashed in bloom for hashed in probes)
+
+        # Generous bound to keep the test deterministic enough.
+        self.assertLess(false_positives / len(probes), 0.03)
+
+    def test_empty_filter_contains_nothing(self):
+        bloom = BloomFilter(capacity=10, error_rate=0.01)
+        self.assertNotIn("anything", bloom)
+
+    def test_sizing(self):
+        bloom = BloomFilter(capacity=1_000_000, error_rate=0.01)
+        # ~9.6 bits per item and ~7 hash functions for a 1% error rate.
+        self.assertAlmostEqual(bloom.num_bits / 1_000_000, 9.59, places=1)
+        self.assertEqual(bloom.num_hashes, 7)
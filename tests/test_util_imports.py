@@ -1,9 +1,14 @@
 import inspect
-from unittest import TestCase, mock
+from unittest import TestCase, IsolatedAsyncioTestCase, mock
 
 from django.core.exceptions import ImproperlyConfigured
 
-from drf_authentify.utils.imports import load_handler
+from drf_authentify.utils.imports import (
+    HandlerChain,
+    load_handler,
+    acall_handler,
+    compile_handlers,
+)
 
 
 # --- Mock Handler Functions ---
@@ -112,3 +117,62 @@ class LoadHandlerTests(TestCase):
         custom_params_fewer = ["user", "token"]
         handler = load_handler(self.MOCK_PATH, self.HANDLER_NAME, custom_params_fewer)
         self.assertEqual(handler, success_handler)
+
+
+def append_a(user, token, token_str):
+    return user + ["a"], token
+
+
+def append_b(user, token, token_str):
+    return user + ["b"], token
+
+
+async def append_async(user, token, token_str):
+    return user + ["async"], token
+
+
+class CompileHandlersTests(TestCase):
+    MODULE = "tests.test_util_imports"
+
+    def test_nothing_configured(self):
+        self.assertIsNone(compile_handlers(None, "TEST_HANDLER"))
+        self.assertIsNone(compile_handlers([], "TEST_HANDLER"))
+
+    def test_single_path_returns_handler_itself(self):
+        handler = compile_handlers(f"{self.MODULE}.append_a", "TEST_HANDLER")
+        self.assertIs(handler, append_a)
+
+    def test_list_builds_ordered_chain(self):
+        chain = compile_handlers(
+            [f"{self.MODULE}.append_a", f"{self.MODULE}.append_b"], "TEST_HANDLER"
+        )
+        self.assertIsInstance(chain, HandlerChain)
+        self.assertEqual(chain([], "token", "raw"), (["a", "b"], "token"))
+
+    def test_keyword_chain(self):
+        chain = compile_handlers(
+            [f"{self.MODULE}.append_b", f"{self.MODULE}.append_a"],
+            "TEST_HANDLER",
+            keywords=True,
+        )
+        self.assertEqual(
+            chain(user=[], token="token", token_str="raw"), (["b", "a"], "token")
+        )
+
+    def test_invalid_path_in_list_raises(self):
+        with self.assertRaises(ImproperlyConfigured):
+            compile_handlers([f"{self.MODULE}.append_a", "missing.path"], "TEST")
+
+
+class AcallHandlerTests(IsolatedAsyncioTestCase):
+    async def test_sync_and_async_handlers(self):
+        self.assertEqual(await acall_handler(append_a, [], "t", "raw"), (["a"], "t"))
+        self.assertEqual(
+            await acall_handler(append_async, [], "t", "raw"), (["async"], "t")
+        )
+
+    async def test_mixed_chain(self):
+        chain = HandlerChain([append_a, append_async, append_b])
+        self.assertEqual(
+            await acall_handler(chain, [], "t", "raw"), (["a", "async", "b"], "t")
+        )
@@ -1,14 +1,22 @@
+import hmac
 import hashlib
 from unittest.mock import patch
 
+from django.conf import settings
 from django.test import SimpleTestCase
 
 from drf_authentify.utils.tokens import (
+    _get_hasher,
     _hash_token,
     _generate_token,
+    SELECTOR_LENGTH,
+    get_hash_scheme,
+    get_hash_schemes,
     hash_token_string,
+    get_token_selector,
     generate_access_token,
     generate_refresh_token,
+    generate_selector_access_token,
 )
 
 
@@ -73,3 +81,76 @@ class TokenUtilityTests(SimpleTestCase):
         raw1, _ = generate_access_token()
         raw2, _ = generate_access_token()
         self.assertNotEqual(raw1, raw2)
+
+    def test_generate_selector_access_token(self):
+        raw, selector, hashed = generate_selector_access_token()
+
+        self.assertEqual(len(selector), SELECTOR_LENGTH)
+        self.assertTrue(raw.startswith(f"{selector}."))
+        self.assertEqual(hashed, _hash_token(raw))
+
+    def test_get_token_selector(self):
+        raw, selector, _ = generate_selector_access_token()
+        self.assertEqual(get_token_selector(raw), selector)
+
+        # Opaque tokens never contain the separator.
+        self.assertIsNone(get_token_selector(generate_access_token()[0]))
+
+        # Malformed selector tokens fall back to opaque handling.
+        self.assertIsNone(get_token_selector("short.verifier"))
+        self.assertIsNone(get_token_selector(f"{selector}."))
+
+
+class HashSchemeTests(SimpleTestCase):
+    def setUp(self):
+        patcher = patch("drf_authentify.utils.tokens.authentify_settings")
+        self.mock_settings = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.mock_settings.SECURE_HASH_ALGORITHM = "sha256"
+        self.mock_settings.LEGACY_HASH_ALGORITHMS = []
+        self.mock_settings.TOKEN_HASH_PEPPER = "pepper"
+        self.token = "test_raw_token_value"
+
+    def test_keyed_blake2b(self):
+        expected = hashlib.blake2b(
+            self.token.encode("utf-8"), key=b"pepper", digest_size=32
+        ).hexdigest()
+        self.assertEqual(hash_token_string(self.token, "blake2b-keyed"), expected)
+
+    def test_hmac(self):
+        expected = hmac.new(
+            b"pepper", self.token.encode("utf-8"), hashlib.sha256
+        ).hexdigest()
+        self.assertEqual(hash_token_string(self.token, "hmac-sha256"), expected)
+
+    def test_pepper_falls_back_to_secret_key(self):
+        self.mock_settings.TOKEN_HASH_PEPPER = None
+        expected = hmac.new(
+            settings.SECRET_KEY.encode("utf-8"),
+            self.token.encode("utf-8"),
+            hashlib.sha256,
+        ).hexdigest()
+        self.assertEqual(hash_token_string(self.token, "hmac-sha256"), expected)
+
+    def test_long_pepper_is_compressed_for_blake2b(self):
+        self.mock_settings.TOKEN_HASH_PEPPER = "p" * 100
+        self.assertEqual(len(hash_token_string(self.token, "blake2b-keyed")), 64)
+
+    def test_configured_scheme_is_used_by_default(self):
+        self.mock_settings.SECURE_HASH_ALGORITHM = "HMAC-SHA256"
+        self.assertEqual(get_hash_scheme(), "hmac-sha256")
+        self.assertEqual(
+            _hash_token(self.token), hash_token_string(self.token, "hmac-sha256")
+        )
+
+    def test_hasher_is_built_once_per_scheme(self):
+        _get_hasher.cache_clear()
+        hash_token_string(self.token, "blake2b-keyed")
+        hash_token_string("another", "blake2b-keyed")
+        self.assertEqual(_get_hasher.cache_info().misses, 1)
+
+    def test_get_hash_schemes_puts_current_first_without_duplicates(self):
+        self.mock_settings.SECURE_HASH_ALGORITHM = "blake2b-keyed"
+        self.mock_settings.LEGACY_HASH_ALGORITHMS = ["sha256", "BLAKE2B-KEYED"]
+        self.assertEqual(get_hash_schemes(), ["blake2b-keyed", "sha256"])
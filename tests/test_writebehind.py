@@ -0,0 +1,159 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.test import TestCase, RequestFactory
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+
+from drf_authentify.models import AuthToken
+from drf_authentify.services import TokenService
+from drf_authentify.settings import authentify_settings
+from drf_authentify.auth import AuthorizationHeaderAuthentication
+from drf_authentify.writebehind import auto_refresh_buffer
+
+User = get_user_model()
+
+
+class AutoRefreshWriteBehindTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="behind_user", password="pw")
+
+    def setUp(self):
+        for name, value in (
+            ("AUTO_REFRESH", True),
+            ("AUTO_REFRESH_WRITE_BEHIND", True),
+            ("AUTO_REFRESH_INTERVAL", timedelta(seconds=1)),
+            ("AUTO_REFRESH_MAX_TTL", timedelta(days=30)),
+        ):
+            patcher = patch.object(authentify_settings, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        # Keep the background flusher out of the tests.
+        patcher = patch.object(auto_refresh_buffer, "_ensure_thread")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        auto_refresh_buffer.clear()
+        self.addCleanup(auto_refresh_buffer.clear)
+
+    def _authenticate(self, raw_token, at):
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {raw_token}")
+        with patch("django.utils.timezone.now", return_value=at):
+            return AuthorizationHeaderAuthentication().authenticate(request)
+
+    def test_refresh_is_buffered_instead_of_written(self):
+        issued = TokenService.generate_header_token(self.user)
+        later = issued.token_instance.last_refreshed_at + timedelta(seconds=2)
+
+        # Only the verification query runs.
+        with self.assertNumQueries(1):
+            _, token = self._authenticate(issued.access_token, later)
+
+        self.assertEqual(token.last_refreshed_at, later)
+        self.assertEqual(len(auto_refresh_buffer), 1)
+
+        stored = AuthToken.objects.get(pk=token.pk)
+        self.assertLess(stored.last_refreshed_at, later)
+
+    def test_flush_writes_batches_in_one_update(self):
+        tokens = [TokenService.generate_header_token(self.user) for _ in range(3)]
+        later = timezone.now() + timedelta(seconds=2)
+        for issued in tokens:
+            self._authenticate(issued.access_token, later)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(auto_refresh_buffer.flush(), 3)
+
+        self.assertEqual(len(auto_refresh_buffer), 0)
+        for issued in tokens:
+            stored = AuthToken.objects.get(pk=issued.token_instance.pk)
+            self.assertEqual(stored.last_refreshed_at, later)
+            self.assertEqual(stored.expires_at, later + authentify_settings.TOKEN_TTL)
+
+    def test_pending_refresh_is_applied_to_later_requests(self):
+        issued = TokenService.generate_header_token(self.user)
+        later = issued.token_instance.last_refreshed_at + timedelta(seconds=2)
+        self._authenticate(issued.access_token, later)
+
+        _, token = self._authenticate(issued.access_token, later)
+        self.assertEqual(token.last_refreshed_at, later)
+        self.assertEqual(token.expires_at, later + authentify_settings.TOKEN_TTL)
+
+    def test_flush_skips_revoked_tokens(self):
+        issued = TokenService.generate_header_token(self.user)
+        later = issued.token_instance.last_refreshed_at + timedelta(seconds=2)
+        self._authenticate(issued.access_token, later)
+
+        with patch.object(authentify_settings, "KEEP_EXPIRED_TOKENS", True):
+            TokenService.revoke_token(issued.token_instance)
+
+        self.assertEqual(auto_refresh_buffer.flush(), 0)
+        stored = AuthToken.objects.get(pk=issued.token_instance.pk)
+        self.assertTrue(stored.is_expired)
+
+    def test_token_close_to_expiry_is_written_immediately(self):
+        issued = TokenService.generate_header_token(self.user, access_expires_in=30)
+        later = issued.token_instance.last_refreshed_at + timedelta(seconds=25)
+
+        self._authenticate(issued.access_token, later)
+
+        self.assertEqual(len(auto_refresh_buffer), 0)
+        stored = AuthToken.objects.get(pk=issued.token_instance.pk)
+        self.assertEqual(stored.last_refreshed_at, later)
+
+    def test_flush_size_wakes_flusher(self):
+        issued = TokenService.generate_header_token(self.user)
+        later = issued.token_instance.last_refreshed_at + timedelta(seconds=2)
+
+        with (
+            patch.object(authentify_settings, "AUTO_REFRESH_FLUSH_SIZE", 1),
+            patch.object(auto_refresh_buffer, "_wake") as mock_wake,
+        ):
+            self._authenticate(issued.access_token, later)
+
+        mock_wake.set.assert_called_once()
+
+    def test_flush_never_moves_a_newer_refresh_back(self):
+        issued = TokenService.generate_header_token(self.user)
+        later = issued.token_instance.last_refreshed_at + timedelta(seconds=2)
+        self._authenticate(issued.access_token, later)
+
+        # Another process wrote a newer refresh meanwhile.
+        newer = later + timedelta(seconds=5)
+        AuthToken.objects.filter(pk=issued.token_instance.pk).update(
+            last_refreshed_at=newer, expires_at=newer + authentify_settings.TOKEN_TTL
+        )
+
+        self.assertEqual(auto_refresh_buffer.flush(), 0)
+        stored = AuthToken.objects.get(pk=issued.token_instance.pk)
+        self.assertEqual(stored.last_refreshed_at, newer)
+
+    def test_failed_flush_keeps_unwritten_refreshes(self):
+        tokens = [TokenService.generate_header_token(self.user) for _ in range(3)]
+        later = timezone.now() + timedelta(seconds=2)
+        for issued in tokens:
+            self._authenticate(issued.access_token, later)
+
+        write = auto_refresh_buffer._write
+        calls = []
+
+        def fail_second(db, batch):
+            calls.append(batch)
+            if len(calls) == 2:
+                raise RuntimeError("database unavailable")
+            return write(db, batch)
+
+        with (
+            patch.object(authentify_settings, "AUTO_REFRESH_FLUSH_SIZE", 1),
+            patch.object(auto_refresh_buffer, "_write", side_effect=fail_second),
+            self.assertRaises(RuntimeError),
+        ):
+            auto_refresh_buffer.flush()
+
+        self.assertEqual(len(auto_refresh_buffer), 2)
+        self.assertEqual(auto_refresh_buffer.flush(), 2)
+        for issued in tokens:
+            stored = AuthToken.objects.get(pk=issued.token_instance.pk)
+            self.assertEqual(stored.last_refreshed_at, later)